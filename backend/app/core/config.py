@@ -1,7 +1,104 @@
 from dotenv import load_dotenv
+import json
 import os
 
 load_dotenv()
+
+# Default grading limits per task difficulty; GRADING_LIMITS may override them with JSON,
+# e.g. {"hard": {"statement_timeout_ms": 30000}}
+def _grading_limits():
+    limits = {
+        "easy": {"statement_timeout_ms": 2000, "max_rows": 10000, "max_bytes": 5 * 1024 * 1024},
+        "medium": {"statement_timeout_ms": 5000, "max_rows": 100000, "max_bytes": 20 * 1024 * 1024},
+        "hard": {"statement_timeout_ms": 15000, "max_rows": 1000000, "max_bytes": 100 * 1024 * 1024},
+    }
+    for difficulty, overrides in json.loads(os.getenv("GRADING_LIMITS", "{}")).items():
+        limits.setdefault(difficulty, {}).update(overrides)
+    return limits
+
 class Config:
     DATABASE_URL = os.getenv("DATABASE_URL")
     SECRET_KEY = os.getenv("SECRET_KEY")
+    # Upper bound (in bytes) for cached reference-answer result sets
+    REFERENCE_CACHE_MAX_BYTES = int(os.getenv("REFERENCE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    # Compare submitted and reference results inside Postgres when the queries allow it
+    SERVER_SIDE_COMPARE = os.getenv("SERVER_SIDE_COMPARE", "true").lower() == "true"
+    # Grading worker threads; each grading run holds up to two database connections
+    GRADING_WORKERS = int(os.getenv("GRADING_WORKERS", 4))
+    # Submissions waiting for a worker before new ones are rejected
+    GRADING_QUEUE_SIZE = int(os.getenv("GRADING_QUEUE_SIZE", 500))
+    # Seconds after which a submission still pending is reported as failed, e.g. because the
+    # process that had it queued was restarted
+    GRADING_PENDING_TIMEOUT_SECONDS = int(os.getenv("GRADING_PENDING_TIMEOUT_SECONDS", 300))
+    # Resource limits for graded student queries, per task difficulty
+    GRADING_LIMITS = _grading_limits()
+    # Worker threads shared by bulk regrade jobs
+    REGRADE_WORKERS = int(os.getenv("REGRADE_WORKERS", 2))
+    # Seconds a regrade job's progress is kept once it has finished (or since it started, if it never does)
+    REGRADE_JOB_TTL_SECONDS = int(os.getenv("REGRADE_JOB_TTL_SECONDS", 24 * 3600))
+    # Number of memoized grading verdicts (one per task and normalized query)
+    VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("VERDICT_CACHE_MAX_ENTRIES", 50000))
+    # Optional EXPLAIN pre-flight: reject submissions whose estimated cost or row count is a
+    # multiple of the reference answer's (never below the MIN floors)
+    ADMISSION_CHECK = os.getenv("ADMISSION_CHECK", "false").lower() == "true"
+    ADMISSION_COST_FACTOR = float(os.getenv("ADMISSION_COST_FACTOR", 50))
+    ADMISSION_ROWS_FACTOR = float(os.getenv("ADMISSION_ROWS_FACTOR", 50))
+    ADMISSION_MIN_COST = float(os.getenv("ADMISSION_MIN_COST", 100000))
+    ADMISSION_MIN_ROWS = float(os.getenv("ADMISSION_MIN_ROWS", 100000))
+    # Connection pool for ORM sessions and schema management
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # Bulk row loading: rows per multi-row INSERT, and the group size from which COPY is used
+    BULK_INSERT_PAGE_SIZE = int(os.getenv("BULK_INSERT_PAGE_SIZE", 1000))
+    COPY_THRESHOLD = int(os.getenv("COPY_THRESHOLD", 5000))
+    # Bytes handed to COPY per read when streaming rows
+    COPY_CHUNK_SIZE = int(os.getenv("COPY_CHUNK_SIZE", 64 * 1024))
+    # Rows read from an uploaded CSV or JSON Lines file to infer its column types
+    IMPORT_SAMPLE_ROWS = int(os.getenv("IMPORT_SAMPLE_ROWS", 1000))
+    # Table browser: default and maximum rows per page, and rows per fetch when exporting
+    TABLE_PAGE_SIZE = int(os.getenv("TABLE_PAGE_SIZE", 100))
+    TABLE_PAGE_SIZE_MAX = int(os.getenv("TABLE_PAGE_SIZE_MAX", 1000))
+    TABLE_STREAM_CHUNK_SIZE = int(os.getenv("TABLE_STREAM_CHUNK_SIZE", 1000))
+    # An NDJSON export holds a database connection while the client reads, so it is capped in rows and time
+    TABLE_EXPORT_MAX_ROWS = int(os.getenv("TABLE_EXPORT_MAX_ROWS", 1000000))
+    TABLE_EXPORT_TIMEOUT_SECONDS = int(os.getenv("TABLE_EXPORT_TIMEOUT_SECONDS", 300))
+    # Seconds a cached schema catalog is trusted if no DDL through the API invalidates it first
+    CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", 300))
+    # Parallel COPY connections used when restoring a schema archive
+    SCHEMA_IMPORT_WORKERS = int(os.getenv("SCHEMA_IMPORT_WORKERS", 4))
+    # Synthetic data generation: rows drawn per NumPy block, and the most rows one request may generate
+    DATA_GENERATOR_BLOCK_ROWS = int(os.getenv("DATA_GENERATOR_BLOCK_ROWS", 100000))
+    DATA_GENERATOR_MAX_ROWS = int(os.getenv("DATA_GENERATOR_MAX_ROWS", 50000000))
+    # Index advisor: smallest table (by planner estimate) worth indexing, and most columns per proposed index
+    INDEX_ADVISOR_MIN_ROWS = int(os.getenv("INDEX_ADVISOR_MIN_ROWS", 10000))
+    INDEX_ADVISOR_MAX_COLUMNS = int(os.getenv("INDEX_ADVISOR_MAX_COLUMNS", 3))
+    # Task listing: default and maximum tasks per page
+    TASK_PAGE_SIZE = int(os.getenv("TASK_PAGE_SIZE", 100))
+    TASK_PAGE_SIZE_MAX = int(os.getenv("TASK_PAGE_SIZE_MAX", 500))
+    # Response cache for read-heavy GET endpoints: "memory" (entries per process), "sqlite" (entries
+    # shared by the worker processes of one host through RESPONSE_CACHE_PATH) or "none". Invalidation
+    # goes through version counters in the database, so it reaches every process with either backend
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+    RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+    # Bulk task import: most tasks per request, and reference answers verified in parallel
+    TASK_IMPORT_MAX_TASKS = int(os.getenv("TASK_IMPORT_MAX_TASKS", 500))
+    TASK_IMPORT_WORKERS = int(os.getenv("TASK_IMPORT_WORKERS", 4))
+    # Requests that use the grading pool directly at the same time: synchronous evaluations,
+    # reference answers run when tasks are saved, and the index advisor's EXPLAINs
+    GRADING_REQUEST_CONCURRENCY = int(os.getenv("GRADING_REQUEST_CONCURRENCY", 4))
+    # Dedicated pool for graded queries. A grading run holds two connections (the submitted and the
+    # reference query; cancelling the reference opens a short-lived server connection outside the
+    # pool), a task import worker holds one
+    GRADING_POOL_SIZE = int(os.getenv(
+        "GRADING_POOL_SIZE",
+        2 * (GRADING_WORKERS + REGRADE_WORKERS + GRADING_REQUEST_CONCURRENCY) + TASK_IMPORT_WORKERS,
+    ))
+    GRADING_MAX_OVERFLOW = int(os.getenv("GRADING_MAX_OVERFLOW", 4))
+    # Retries, with doubling waits starting at the backoff, of a queued submission that found the grading pool busy
+    GRADING_BUSY_RETRIES = int(os.getenv("GRADING_BUSY_RETRIES", 3))
+    GRADING_BUSY_BACKOFF_SECONDS = float(os.getenv("GRADING_BUSY_BACKOFF_SECONDS", 2))
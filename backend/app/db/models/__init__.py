@@ -11,3 +11,5 @@ from app.db.models.submission import Submission
 from app.db.models.assignment import Assignment
 from app.db.models.task_time_tracking import TaskTimeTracking
 from app.db.models.schema import Schema
+from app.db.models.cache_version import CacheVersion
+from app.db.models.regrade_job import RegradeJob
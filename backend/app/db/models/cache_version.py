@@ -0,0 +1,9 @@
+from sqlalchemy import BigInteger, Column, String
+from app.db.session import Base
+
+class CacheVersion(Base):
+    """Version counter behind a family of cached values, shared by every worker process."""
+    __tablename__ = "cache_versions"
+
+    cache_key = Column(String(255), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
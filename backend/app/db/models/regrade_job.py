@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, DateTime, Enum, Integer, JSON, String, Text
+from app.db.session import Base
+
+class RegradeJob(Base):
+    """Progress of a bulk regrade, kept in the database so any worker can report on it."""
+    __tablename__ = "regrade_jobs"
+
+    job_id = Column(String(32), primary_key=True)
+    task_id = Column(Integer, nullable=False, index=True)
+    status = Column(Enum("running", "completed", "failed", name="regrade_job_status"), default="running", nullable=False)
+    total_submissions = Column(Integer, default=0, nullable=False)
+    distinct_queries = Column(Integer, default=0, nullable=False)
+    graded_queries = Column(Integer, default=0, nullable=False)
+    updated_submissions = Column(Integer, default=0, nullable=False)
+    # Submissions left as they were because their new verdict was a limit hit or an internal error
+    failed_submission_ids = Column(JSON, nullable=True)
+    started_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "task_id": self.task_id,
+            "status": self.status,
+            "total_submissions": self.total_submissions,
+            "distinct_queries": self.distinct_queries,
+            "graded_queries": self.graded_queries,
+            "updated_submissions": self.updated_submissions,
+            "failed_submissions": len(self.failed_submission_ids or []),
+            "failed_submission_ids": self.failed_submission_ids or [],
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+        }
@@ -1,5 +1,5 @@
 # app/db/models/submission.py
-from sqlalchemy import Column, DateTime, Integer, Text, Boolean, ForeignKey, TIMESTAMP, func
+from sqlalchemy import Column, DateTime, Enum, Integer, Text, Boolean, ForeignKey, TIMESTAMP, func
 from sqlalchemy.orm import relationship
 from app.db.session import Base
 from datetime import datetime, timezone
@@ -11,6 +11,10 @@ class Submission(Base):
     assignment_id = Column(Integer, ForeignKey("assignments.assignment_id"), nullable=False)
     submitted_query = Column(Text, nullable=False)
     is_correct = Column(Boolean, nullable=False)
+    time_taken = Column(Integer, nullable=True)
+    # Submissions are graded asynchronously; clients poll until the status leaves "pending"
+    status = Column(Enum("pending", "graded", "failed", name="submission_status"), default="graded", nullable=False)
+    feedback = Column(Text, nullable=True)
     submitted_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     # Relationships
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, Date, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, BigInteger, Float, JSON, String, Enum, Date, ForeignKey, Text, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.db.session import Base
@@ -18,6 +18,13 @@ class Task(Base):
     deadline = Column(Date, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     published = Column(Boolean, default=False)  # New column to track published status
+    # Fingerprint of the reference answer's result, computed when the answer is saved and
+    # cleared whenever the schema's structure or data changes through the API
+    reference_row_count = Column(BigInteger, nullable=True)
+    reference_columns = Column(JSON, nullable=True)
+    reference_digest = Column(String(32), nullable=True)  # Order-insensitive
+    reference_ordered_digest = Column(String(32), nullable=True)
+    reference_execution_ms = Column(Float, nullable=True)
 
     # Relationships
     course = relationship("Course", back_populates="tasks")
@@ -41,4 +48,20 @@ class Task(Base):
         }
         if not hide_correct_answer:
             task_dict["correct_answer"] = self.correct_answer
-        return task_dict
\ No newline at end of file
+            task_dict["reference_result"] = {
+                "row_count": self.reference_row_count,
+                "columns": self.reference_columns,
+                "execution_ms": self.reference_execution_ms,
+            } if self.reference_row_count is not None else None
+        return task_dict
+
+    def reference_fingerprint(self):
+        """The stored reference fingerprint in the form produced by fingerprint_query, or None."""
+        if self.reference_row_count is None:
+            return None
+        return {
+            "columns": self.reference_columns,
+            "row_count": self.reference_row_count,
+            "ordered_digest": self.reference_ordered_digest,
+            "unordered_digest": self.reference_digest,
+        }
\ No newline at end of file
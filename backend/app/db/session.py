@@ -1,12 +1,132 @@
+import time
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 from app.core.config import Config
+from app.utils.metrics import metrics
 
-# Engine for the main database
-engine = create_engine(Config.DATABASE_URL)
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection."""
+
+    label = "default"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("pool_checkout_wait", (time.perf_counter() - start) * 1000, self.label)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.label = self.label
+        return pool
+
+# Build an engine with the shared pool settings
+def create_pooled_engine(label, pool_size, max_overflow):
+    """
+    Create an engine backed by an instrumented connection pool.
+    :param label: Name under which the pool's metrics are reported.
+    :param pool_size: Connections kept open in the pool.
+    :param max_overflow: Extra connections allowed at peak load.
+    :return: The SQLAlchemy engine.
+    """
+    pooled_engine = create_engine(
+        Config.DATABASE_URL,
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_pre_ping=Config.DB_POOL_PRE_PING,
+    )
+    pooled_engine.pool.label = label
+    return pooled_engine
+
+# Engine for the main database (ORM sessions and schema management)
+engine = create_pooled_engine("orm", Config.DB_POOL_SIZE, Config.DB_MAX_OVERFLOW)
+# Separate pool for running graded student and reference queries, so a lab rush
+# cannot starve the API's own queries
+grading_engine = create_pooled_engine("grading", Config.GRADING_POOL_SIZE, Config.GRADING_MAX_OVERFLOW)
 # Base class for models
 Base = declarative_base()
-# SessionLocal class for the database session
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# SessionLocal class for the database session. Objects stay loaded after commit so
+# services can build their responses without another round trip.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+# One session per request (or worker thread), removed when the app context tears down
+db_session = scoped_session(SessionLocal)
+
+def get_session():
+    """Return the session shared by everything running in the current request or thread."""
+    return db_session()
+
+def remove_session(exception=None):
+    """Close the current session and return its connection to the pool."""
+    db_session.remove()
+
+# Unit of work on the shared session
+@contextmanager
+def transaction():
+    """
+    Commit the block's changes, or roll them back if it raises.
+    The outermost block commits; a block opened inside another one runs in a SAVEPOINT,
+    so its failure only undoes its own work and the enclosing transaction decides the rest.
+    :return: The shared session.
+    """
+    session = db_session()
+    depth = session.info.get("transaction_depth", 0)
+    session.info["transaction_depth"] = depth + 1
+    try:
+        if depth:
+            pending = len(session.info.get("after_commit", []))
+            try:
+                with session.begin_nested():
+                    yield session
+            except Exception:
+                # Side effects queued by the rolled-back block must not run
+                del session.info.get("after_commit", [])[pending:]
+                raise
+        else:
+            try:
+                yield session
+                session.commit()
+            except Exception:
+                session.rollback()
+                session.info.pop("after_commit", None)
+                raise
+    finally:
+        session.info["transaction_depth"] = depth
+
+    if not depth:
+        for callback, args in session.info.pop("after_commit", []):
+            callback(*args)
+
+def run_after_commit(callback, *args):
+    """
+    Run a side effect (such as a cache invalidation) once the outermost transaction has
+    committed, or straight away when no transaction is open.
+    :param callback: Function to call.
+    :param args: Positional arguments for the callback.
+    """
+    session = db_session()
+    if session.info.get("transaction_depth"):
+        session.info.setdefault("after_commit", []).append((callback, args))
+    else:
+        callback(*args)
 
+# Current usage of both pools
+def pool_stats():
+    stats = {}
+    for pooled_engine, max_overflow in ((engine, Config.DB_MAX_OVERFLOW), (grading_engine, Config.GRADING_MAX_OVERFLOW)):
+        pool = pooled_engine.pool
+        capacity = pool.size() + max_overflow
+        stats[pool.label] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "capacity": capacity,
+            "saturation": round(pool.checkedout() / capacity, 4) if capacity else 0.0,
+        }
+    return stats
@@ -0,0 +1,47 @@
+import logging
+from sqlalchemy import Enum, inspect, text
+from app.db.models.submission import Submission
+from app.db.models.task import Task
+
+# Columns added to tables that already existed, with the SQL default existing rows get.
+# Base.metadata.create_all only creates missing tables, so upgrade_database adds these
+# to databases created before them.
+ADDED_COLUMNS = [
+    (Task.__table__.c.reference_row_count, None),
+    (Task.__table__.c.reference_columns, None),
+    (Task.__table__.c.reference_digest, None),
+    (Task.__table__.c.reference_ordered_digest, None),
+    (Task.__table__.c.reference_execution_ms, None),
+    (Submission.__table__.c.status, "'graded'"),
+    (Submission.__table__.c.feedback, None),
+]
+
+# Bring an existing database up to the current models
+def upgrade_database(bind):
+    """
+    Add every column of ADDED_COLUMNS that its table does not have yet. Safe to run on
+    every start; tables that do not exist yet are left to create_all.
+    :param bind: Engine of the main database.
+    :return: List of "table.column" names that were added.
+    """
+    added = []
+    with bind.begin() as connection:
+        inspector = inspect(connection)
+        for column, default in ADDED_COLUMNS:
+            table_name = column.table.name
+            if not inspector.has_table(table_name):
+                continue
+            if column.name in {existing["name"] for existing in inspector.get_columns(table_name)}:
+                continue
+            # Enum types are created along with their table, so a column added later creates its own
+            if isinstance(column.type, Enum):
+                column.type.create(connection, checkfirst=True)
+            ddl = f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column.type.compile(dialect=connection.dialect)}"
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            connection.execute(text(ddl))
+            added.append(f"{table_name}.{column.name}")
+            logging.info(f"Added column {table_name}.{column.name}")
+    return added
@@ -1,7 +1,7 @@
 import logging
 from flask import Flask
 from flask_cors import CORS
-from app.db.session import Base, engine
+from app.db.session import Base, engine, remove_session
 from app.routes.users import user_blueprint
 from app.routes.courses import course_blueprint
 from app.routes.tasks import tasks_blueprint
@@ -10,8 +10,12 @@ from app.routes.submissions import submissions_blueprint
 from app.routes.schemas import schemas_blueprint
 from app.routes.sessions import session_blueprint
 from app.routes.auth import auth_blueprint
+from app.routes.metrics import metrics_blueprint
 from flask_jwt_extended import JWTManager
 from app.core.config import Config
+from app.db.upgrade import upgrade_database
+from app.services.task_service import backfill_reference_results
+from app.services.grading_service import requeue_pending_submissions
 from logging.handlers import RotatingFileHandler
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}})
@@ -22,6 +26,18 @@ jwt = JWTManager(app)
 # Set Flask logger to debug mode
 app.logger.setLevel(logging.DEBUG)
 
+# Release the request's database session once the response is sent
+app.teardown_appcontext(remove_session)
+
+# Fill in the reference fingerprints of tasks that have none: flask --app app.main backfill-references
+@app.cli.command("backfill-references")
+def backfill_references():
+    upgrade_database(engine)
+    updated, failures = backfill_reference_results()
+    print(f"Stored the reference result of {updated} tasks")
+    for failure in failures:
+        print(f"Task {failure['task_id']}: {failure['error']}")
+
 # Home route
 @app.route("/")
 def home():
@@ -36,12 +52,15 @@ app.register_blueprint(schemas_blueprint)
 app.register_blueprint(session_blueprint)
 app.register_blueprint(assignment_blueprint)
 app.register_blueprint(auth_blueprint)
+app.register_blueprint(metrics_blueprint)
 
 # Initialize database and run server
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     try:
         Base.metadata.create_all(bind=engine)
+        upgrade_database(engine)
+        logging.info(f"Queued {requeue_pending_submissions()} pending submissions for grading")
         logging.info("Database initialized successfully")
         app.run(debug=True)
     except Exception as e:
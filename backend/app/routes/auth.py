@@ -10,7 +10,7 @@ from flask_jwt_extended import (
     set_refresh_cookies,
     unset_jwt_cookies,
 )
-from app.db.session import SessionLocal
+from app.db.session import get_session, transaction
 from app.db.models.user import User
 import logging
 import json
@@ -31,19 +31,18 @@ def register():
     if not all([name, email, password, role]):
         return jsonify({"error": "All fields are required"}), 400
 
-    session = SessionLocal()
     try:
-        # Check if user exists
-        existing_user = session.query(User).filter_by(email=email).first()
-        if existing_user:
-            logging.warning(f"Registration failed: Email {email} already exists.")
-            return jsonify({"error": "Email already exists"}), 409
-
-        # Hash the password and create the user
-        hashed_password = generate_password_hash(password)
-        new_user = User(name=name, email=email, password_hash=hashed_password, role=role)
-        session.add(new_user)
-        session.commit()
+        with transaction() as session:
+            # Check if user exists
+            existing_user = session.query(User).filter_by(email=email).first()
+            if existing_user:
+                logging.warning(f"Registration failed: Email {email} already exists.")
+                return jsonify({"error": "Email already exists"}), 409
+
+            # Hash the password and create the user
+            hashed_password = generate_password_hash(password)
+            new_user = User(name=name, email=email, password_hash=hashed_password, role=role)
+            session.add(new_user)
 
         logging.info(f"User registered: {email} with role {role}.")
         return jsonify({"message": "User registered successfully!"}), 201
@@ -52,9 +51,6 @@ def register():
         logging.error(f"Error during registration: {e}")
         return jsonify({"error": str(e)}), 500
 
-    finally:
-        session.close()
-
 # ---------------------- LOGIN USER ----------------------
 @auth_blueprint.route("/login", methods=["POST"])
 def login():
@@ -65,7 +61,7 @@ def login():
     if not all([email, password]):
         return jsonify({"error": "Email and password are required"}), 400
 
-    session = SessionLocal()
+    session = get_session()
     try:
         user = session.query(User).filter_by(email=email).first()
         if not user:
@@ -78,9 +74,6 @@ def login():
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-
-    finally:
-        session.close()
 # ---------------------- GET USER INFO ----------------------
 @auth_blueprint.route("/user", methods=["GET"])
 @jwt_required()
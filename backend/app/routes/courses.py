@@ -8,6 +8,7 @@ from app.services.course_service import (
     delete_course, 
     get_enrolled_courses
 )
+from app.utils.response_cache import response_cache
 import logging
 import json
 
@@ -54,6 +55,7 @@ def create():
 # ---------------------- LIST COURSES (PROFESSORS SEE THEIR COURSES, STUDENTS SEE ENROLLED) ----------------------
 @course_blueprint.route("/courses", methods=["GET"])
 @jwt_required()
+@response_cache.cached(["courses"], per_user=True)
 def list_courses():
     current_user = get_current_user()
 
@@ -73,6 +75,7 @@ def list_courses():
 # ---------------------- FETCH COURSE DETAILS ----------------------
 @course_blueprint.route("/courses/<int:course_id>", methods=["GET"])
 @jwt_required()
+@response_cache.cached(lambda course_id: [f"course:{course_id}"])
 def get_course(course_id):
     try:
         course = get_course_by_id(course_id)
@@ -123,6 +126,7 @@ def delete(course_id):
 # ---------------------- FETCH ENROLLED COURSES (STUDENTS ONLY) ----------------------
 @course_blueprint.route("/courses/enrolled", methods=["GET"])
 @jwt_required()
+@response_cache.cached(["courses"], per_user=True)
 def get_enrolled_courses_route():
     current_user = get_current_user()
 
@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.metrics import metrics
+from app.utils.result_cache import verdict_cache, catalog_cache
+from app.utils.response_cache import response_cache
+from app.db.session import pool_stats
+import json
+
+metrics_blueprint = Blueprint("metrics", __name__)
+
+# ✅ Utility function for extracting JWT user
+def get_current_user():
+    identity = get_jwt_identity()
+    try:
+        identity = json.loads(identity)
+    except json.JSONDecodeError:
+        pass
+    return identity
+
+# ---------------------- GRADING METRICS (PROFESSORS ONLY) ----------------------
+@metrics_blueprint.route("/metrics", methods=["GET"])
+@jwt_required()
+def get_metrics():
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can view metrics"}), 403
+
+    return jsonify({
+        "metrics": metrics.snapshot(),
+        "verdict_cache": verdict_cache.stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "pools": pool_stats(),
+    }), 200
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.services.schema_service import (
     create_schema,
@@ -8,8 +8,19 @@ from app.services.schema_service import (
     create_table_in_schema,
     alter_table_in_schema,
     delete_table_from_schema,
-    insert_into_table
+    insert_into_table,
+    import_table_data,
+    generate_table_data,
+    fetch_table_data,
+    stream_table_data,
+    get_schema_catalog,
+    apply_schema_batch,
+    BatchValidationError,
 )
+from app.services.schema_transfer_service import export_schema, import_schema, clone_schema
+from app.services.index_advisor_service import advise_indexes, apply_indexes
+from app.utils.dataset_reader import detect_format
+from app.utils.query_executor import GradingBusy, BUSY_FEEDBACK
 from sqlalchemy import text
 import json
 import logging
@@ -44,6 +55,62 @@ def create_schema_route():
         logging.error(f"Error creating schema: {str(e)}")
         return jsonify({"error": str(e)}), 400
 
+# ---------------------- EXPORT SCHEMA ARCHIVE (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/<int:schema_id>/export", methods=["GET"])
+@jwt_required()
+def export_schema_route(schema_id):
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can export schemas"}), 403
+
+    try:
+        schema_name, archive = export_schema(schema_id)
+        return send_file(archive, mimetype="application/gzip", as_attachment=True,
+                         download_name=f"{schema_name}.tar.gz")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        logging.error(f"Error exporting schema {schema_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------- IMPORT SCHEMA ARCHIVE (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/import", methods=["POST"])
+@jwt_required()
+def import_schema_route():
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can import schemas"}), 403
+
+    upload = request.files.get("file")
+    if not upload:
+        return jsonify({"error": "Invalid payload. Upload the archive as multipart field 'file'"}), 400
+
+    try:
+        result = import_schema(upload.stream, current_user["user_id"], request.form.get("schema_name"))
+        return jsonify({"message": "Schema imported successfully", "schema": result}), 201
+    except Exception as e:
+        logging.error(f"Error importing schema: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
+# ---------------------- CLONE SCHEMA (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/<int:schema_id>/clone", methods=["POST"])
+@jwt_required()
+def clone_schema_route(schema_id):
+    data = request.json or {}
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can clone schemas"}), 403
+
+    try:
+        result = clone_schema(schema_id, data.get("schema_name"), current_user["user_id"])
+        return jsonify({"message": "Schema cloned successfully", "schema": result}), 201
+    except Exception as e:
+        logging.error(f"Error cloning schema {schema_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
 # ---------------------- LIST SCHEMAS (PROFESSORS & STUDENTS) ----------------------
 @schemas_blueprint.route("/schemas", methods=["GET"])
 @jwt_required()
@@ -128,6 +195,61 @@ def execute_sql(schema_id):
         logging.error(f"Error executing SQL command: {str(e)}")
         return jsonify({"error": str(e)}), 400
 
+# ---------------------- BATCH OF SCHEMA CHANGES IN ONE TRANSACTION (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/<int:schema_id>/batch", methods=["POST"])
+@jwt_required()
+def apply_batch_route(schema_id):
+    data = request.json or {}
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can modify schemas"}), 403
+
+    try:
+        result = apply_schema_batch(schema_id, data.get("operations"))
+        return jsonify(result), 200
+    except BatchValidationError as e:
+        return jsonify({"error": "Invalid batch, no changes were applied", "errors": e.errors}), 400
+    except Exception as e:
+        logging.error(f"Error applying batch to schema {schema_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
+# ---------------------- INDEX ADVISOR (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/<int:schema_id>/index-advice", methods=["GET"])
+@jwt_required()
+def index_advice_route(schema_id):
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can view index advice"}), 403
+
+    try:
+        verify = request.args.get("verify", "false").lower() == "true"
+        return jsonify(advise_indexes(schema_id, verify)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    except GradingBusy:
+        return jsonify({"error": BUSY_FEEDBACK}), 503
+    except Exception as e:
+        logging.error(f"Error advising indexes for schema {schema_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@schemas_blueprint.route("/schemas/<int:schema_id>/indexes", methods=["POST"])
+@jwt_required()
+def apply_indexes_route(schema_id):
+    data = request.json or {}
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can create indexes"}), 403
+
+    try:
+        result = apply_indexes(schema_id, data.get("indexes"))
+        return jsonify(result), 201
+    except Exception as e:
+        logging.error(f"Error creating indexes on schema {schema_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
 # ---------------------- INSERT ROWS INTO TABLE (PROFESSORS ONLY) ----------------------
 @schemas_blueprint.route("/schemas/<int:schema_id>/tables/<string:table_name>/rows", methods=["POST"])
 @jwt_required()
@@ -149,6 +271,45 @@ def insert_rows(schema_id, table_name):
         logging.error(f"Error inserting rows into table: {str(e)}")
         return jsonify({"error": str(e)}), 400
 
+# ---------------------- IMPORT DATASET FILE INTO TABLE (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/<int:schema_id>/tables/<string:table_name>/import", methods=["POST"])
+@jwt_required()
+def import_table_route(schema_id, table_name):
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can import data"}), 403
+
+    upload = request.files.get("file")
+    if not upload:
+        return jsonify({"error": "Invalid payload. Upload the dataset as multipart field 'file'"}), 400
+
+    try:
+        file_format = detect_format(upload.filename, request.form.get("format"))
+        create_table = request.form.get("create_table", "false").lower() == "true"
+        delimiter = request.form.get("delimiter", ",")
+        result = import_table_data(schema_id, table_name, upload.stream, file_format, create_table, delimiter)
+        return jsonify(result), 201
+    except Exception as e:
+        logging.error(f"Error importing dataset into table: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+
+# ---------------------- GENERATE SYNTHETIC DATA (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/<int:schema_id>/tables/<string:table_name>/generate", methods=["POST"])
+@jwt_required()
+def generate_table_route(schema_id, table_name):
+    data = request.json or {}
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can generate data"}), 403
+
+    try:
+        result = generate_table_data(schema_id, table_name, data)
+        return jsonify(result), 201
+    except Exception as e:
+        logging.error(f"Error generating data for table: {str(e)}")
+        return jsonify({"error": str(e)}), 400
 
 # ---------------------- UPDATE ROW IN TABLE (PROFESSORS ONLY) ----------------------
 @schemas_blueprint.route("/schemas/<int:schema_id>/tables/<string:table_name>/rows/<int:row_id>", methods=["PUT"])
@@ -204,6 +365,53 @@ def fetch_tables(schema_id):
         logging.error(f"Error fetching tables for schema {schema_id}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# ---------------------- SCHEMA CATALOG (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/<int:schema_id>/catalog", methods=["GET"])
+@jwt_required()
+def fetch_catalog(schema_id):
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can view the schema catalog"}), 403
+
+    try:
+        schema = get_schema_by_id(schema_id)
+        if not schema:
+            return jsonify({"error": "Schema not found"}), 404
+
+        catalog = get_schema_catalog(schema["schema_name"])
+        return jsonify({"schema_id": schema_id, "schema_name": schema["schema_name"], **catalog}), 200
+    except Exception as e:
+        logging.error(f"Error fetching catalog for schema {schema_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------- BROWSE OR EXPORT TABLE DATA (PROFESSORS ONLY) ----------------------
+@schemas_blueprint.route("/schemas/<int:schema_id>/tables/<string:table_name>/data", methods=["GET"])
+@jwt_required()
+def fetch_table_data_route(schema_id, table_name):
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can browse or export table data"}), 403
+
+    columns = request.args.get("columns")
+    columns = [column.strip() for column in columns.split(",") if column.strip()] if columns else None
+
+    try:
+        # format=ndjson exports the whole table as a chunked stream instead of one page
+        if request.args.get("format") == "ndjson":
+            chunks = stream_table_data(schema_id, table_name, columns)
+            return Response(chunks, mimetype="application/x-ndjson"), 200
+
+        result = fetch_table_data(schema_id, table_name, after=request.args.get("after"),
+                                  limit=request.args.get("limit"), columns=columns)
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error fetching data for table {table_name}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @schemas_blueprint.route("/schemas/<int:schema_id>/tables/<string:table_name>/columns", methods=["POST"])
 @jwt_required()
 def add_column(schema_id, table_name):
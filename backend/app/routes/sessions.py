@@ -7,6 +7,7 @@ from app.services.session_service import (
     update_session,
     delete_session,
 )
+from app.utils.response_cache import response_cache
 import json
 import logging
 
@@ -42,6 +43,7 @@ def create_session_route():
 # ---------------------- LIST SESSIONS (STUDENTS & PROFESSORS) ----------------------
 @session_blueprint.route("/sessions", methods=["GET"])
 @jwt_required()
+@response_cache.cached(["sessions"])
 def list_sessions_route():
     course_id = request.args.get("course_id")
     current_user = get_current_user()
@@ -56,6 +58,7 @@ def list_sessions_route():
 # ---------------------- GET SESSION DETAILS (STUDENTS & PROFESSORS) ----------------------
 @session_blueprint.route("/sessions/<int:session_id>", methods=["GET"])
 @jwt_required()
+@response_cache.cached(lambda session_id: [f"session:{session_id}"])
 def get_session_details(session_id):
     try:
         session = get_session_by_id(session_id)
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from app.db.models import Submission, Assignment
-from app.db.session import SessionLocal
+from app.db.session import get_session
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import logging
 from app.services.submission_service import (
@@ -11,7 +11,7 @@ from app.services.submission_service import (
     update_submission_correctness,
     get_task_by_id
 )
-from app.services.task_service import get_task_by_id
+from app.services.grading_service import enqueue_submission, GradingQueueFull
 from app.utils.query_executor import validate_query
 
 submissions_blueprint = Blueprint("submissions", __name__)
@@ -35,34 +35,31 @@ def submit():
         if not task:
             return jsonify({"error": "Task not found"}), 404
 
-        correct_answer = task["correct_answer"]
         schema_name = task["schema_name"]  # Use the schema_name from the task object
 
         if not schema_name:
             return jsonify({"error": "Schema not found for the task"}), 400
 
-        # Validate the query
-        validation_result = validate_query(submitted_query, correct_answer, schema_name)
-
-        # If the query is correct, save the submission and stop the timer
-        is_correct = validation_result["is_correct"]
-        feedback = validation_result["feedback"]
-
-        # Save the submission
+        # Save the submission right away; the grading workers fill in the verdict
         new_submission = create_submission({
             "assignment_id": assignment_id,
             "submitted_query": submitted_query,
-            "time_taken": time_taken if is_correct else None,  # Only save time if correct
-            "is_correct": is_correct,
+            "time_taken": time_taken,  # Cleared by the grader if the query is incorrect
+            "is_correct": False,
+            "status": "pending",
         })
 
-        # Return the validation result and feedback
+        try:
+            enqueue_submission(new_submission["submission_id"], task, submitted_query)
+        except GradingQueueFull as e:
+            return jsonify({"error": str(e), "submission_id": new_submission["submission_id"]}), 503
+
+        # Clients poll GET /submissions/<id> until the status is no longer "pending"
         return jsonify({
-            "message": "Submission evaluated successfully",
+            "message": "Submission queued for grading",
             "submission": new_submission,
-            "is_correct": is_correct,
-            "feedback": feedback,
-        }), 200
+            "status": "pending",
+        }), 202
     except Exception as e:
         logging.error(f"Error in submit endpoint: {e}")  # Debugging: Log the error
         return jsonify({"error": str(e)}), 400
@@ -109,7 +106,13 @@ def evaluate(submission_id):
         schema_name = task["schema_name"]
 
         # Validate the query
-        validation_result = validate_query(submitted_query, correct_answer, schema_name)
+        validation_result = validate_query(submitted_query, correct_answer, schema_name,
+                                           task_id=task["task_id"], difficulty=task["difficulty"],
+                                           reference_fingerprint=task["reference_fingerprint"])
+
+        if validation_result.get("busy"):
+            # Nothing was graded; the client may try again shortly
+            return jsonify({"error": validation_result["feedback"]}), 503
 
         # Update the submission's correctness in the database
         update_submission_correctness(submission_id, validation_result["is_correct"])
@@ -129,7 +132,7 @@ def get_leaderboard():
         if not task_id:
             return jsonify({"error": "task_id is required"}), 400
 
-        session = SessionLocal()
+        session = get_session()
         leaderboard = (
             session.query(Submission.assignment_id, Submission.time_taken, Submission.is_correct)
             .join(Assignment, Submission.assignment_id == Assignment.assignment_id)
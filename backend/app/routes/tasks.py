@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.db.models import Task
-from app.db.session import SessionLocal
+from app.db.session import transaction, run_after_commit
 from app.services.task_service import (
     create_task,
     list_tasks,
@@ -10,7 +10,12 @@ from app.services.task_service import (
     delete_task,
     professor_owns_course,
     publish_task,
+    parse_task_document,
+    import_tasks,
 )
+from app.services.grading_service import start_regrade, get_regrade_job
+from app.utils.query_executor import warm_reference_result
+from app.utils.response_cache import response_cache
 import logging
 import json
 
@@ -59,9 +64,56 @@ def create_task_route():
         logging.error(f"Error creating task: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+# ---------------------- BULK IMPORT TASKS (PROFESSORS ONLY) ----------------------
+@tasks_blueprint.route("/tasks/import", methods=["POST"])
+@jwt_required()
+def import_tasks_route():
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can import tasks"}), 403
+
+    # JSON or YAML, as the request body or as multipart field "file"
+    upload = request.files.get("file")
+    if upload:
+        raw = upload.read()
+        is_yaml = (upload.filename or "").lower().endswith((".yaml", ".yml"))
+    else:
+        raw = request.get_data()
+        is_yaml = request.mimetype in ("application/yaml", "application/x-yaml", "text/yaml", "text/x-yaml")
+
+    try:
+        tasks = parse_task_document(raw, "yaml" if is_yaml else "json")
+        imported, report = import_tasks(tasks, current_user["user_id"])
+        if not imported:
+            return jsonify({"error": "Some tasks are invalid, no tasks were imported", **report}), 400
+        return jsonify({"message": f"{len(tasks)} tasks imported successfully", **report}), 201
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        logging.error(f"Error importing tasks: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred"}), 500
+
+# Listing parameters shared by the task list routes
+def get_listing_args():
+    def split(name):
+        value = request.args.get(name)
+        return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+    return {
+        "difficulty": split("difficulty"),
+        "tags": split("tags"),
+        "deadline_from": request.args.get("deadline_from"),
+        "deadline_to": request.args.get("deadline_to"),
+        "fields": split("fields"),
+        "after": request.args.get("after"),
+        "limit": request.args.get("limit", type=int),
+    }
+
 # ---------------------- LIST TASKS (STUDENTS & PROFESSORS) ----------------------
 @tasks_blueprint.route("/tasks", methods=["GET"])
 @jwt_required()
+@response_cache.cached(["tasks"])
 def list_all_tasks():
     course_id = request.args.get("course_id")
     session_id = request.args.get("session_id")
@@ -69,21 +121,13 @@ def list_all_tasks():
     current_user = get_current_user()
 
     try:
-        # Professors can see unpublished tasks, students cannot
+        # Professors can see unpublished tasks, students cannot; correct_answer is never listed
         include_unpublished = current_user["role"] == "professor" and not published_only
 
-        tasks = list_tasks(course_id, session_id, include_unpublished=include_unpublished)
-
-        # Filter out unpublished tasks for students or if `published=true` is specified
-        if published_only or current_user["role"] == "student":
-            tasks = [task for task in tasks if task.get("published")]
-
-        # Hide correct_answer for students
-        if current_user["role"] == "student":
-            for task in tasks:
-                task.pop("correct_answer", None)
-
-        return jsonify({"tasks": tasks}), 200
+        result = list_tasks(course_id, session_id, include_unpublished=include_unpublished, **get_listing_args())
+        return jsonify(result), 200
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         logging.error(f"Error listing tasks: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -91,6 +135,7 @@ def list_all_tasks():
 # ---------------------- FETCH TASK DETAILS (STUDENTS & PROFESSORS) ----------------------
 @tasks_blueprint.route("/tasks/<int:task_id>", methods=["GET"])
 @jwt_required()
+@response_cache.cached(lambda task_id: [f"task:{task_id}"])
 def get_task_details(task_id):
     current_user = get_current_user()
 
@@ -102,6 +147,7 @@ def get_task_details(task_id):
         # Hide correct_answer for students
         if current_user["role"] == "student":
             task.pop("correct_answer", None)
+            task.pop("reference_result", None)
 
         return jsonify({"task": task}), 200
     except Exception as e:
@@ -128,6 +174,8 @@ def update_task_route(task_id):
     try:
         updated_task = update_task(task_id, data)
         return jsonify({"message": "Task updated successfully", "task": updated_task}), 200
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         logging.error(f"Error updating task: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -168,42 +216,74 @@ def toggle_publish_task(task_id):
     if "published" not in data:
         return jsonify({"error": "Missing 'published' field in request body"}), 400
 
-    session = SessionLocal()
     try:
-        # Fetch the task by ID
-        task = session.query(Task).get(task_id)
-        if not task:
-            return jsonify({"error": "Task not found"}), 404
+        with transaction() as session:
+            # Fetch the task by ID
+            task = session.query(Task).get(task_id)
+            if not task:
+                return jsonify({"error": "Task not found"}), 404
+
+            # Update the published status
+            task.published = data["published"]
+            run_after_commit(response_cache.invalidate, "tasks", f"task:{task_id}")
 
-        # Update the published status
-        task.published = data["published"]
-        session.commit()
+            if task.published and task.reference_row_count is None:
+                run_after_commit(warm_reference_result, task.task_id, task.schema.schema_name, task.correct_answer)
 
         return jsonify({"message": f"Task {'published' if task.published else 'unpublished'} successfully", "task": task.to_dict()}), 200
     except Exception as e:
-        session.rollback()
         logging.error(f"Error toggling publish status: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
-    finally:
-        session.close()
 
 @tasks_blueprint.route("/tasks/published", methods=["GET"])
 @jwt_required()
+@response_cache.cached(["tasks"])
 def list_published_tasks():
     course_id = request.args.get("course_id")
     session_id = request.args.get("session_id")
+
+    try:
+        result = list_tasks(course_id, session_id, include_unpublished=False, **get_listing_args())
+        return jsonify(result), 200
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        logging.error(f"Error listing published tasks: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# ---------------------- BULK REGRADE (PROFESSORS ONLY) ----------------------
+@tasks_blueprint.route("/tasks/<int:task_id>/regrade", methods=["POST"])
+@jwt_required()
+def regrade_task_route(task_id):
     current_user = get_current_user()
 
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can regrade tasks"}), 403
+
     try:
-        tasks = list_tasks(course_id, session_id, include_unpublished=False)
-        tasks = [task for task in tasks if task.get("published")]
+        task = get_task_by_id(task_id)
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 404
 
-        # Hide correct_answer for students
-        if current_user["role"] == "student":
-            for task in tasks:
-                task.pop("correct_answer", None)
+    if not professor_owns_course(current_user["user_id"], task["course_id"]):
+        return jsonify({"error": "Unauthorized - You do not own this course"}), 403
 
-        return jsonify({"tasks": tasks}), 200
+    try:
+        job = start_regrade(task_id)
+        return jsonify({"message": "Regrade started", "job": job}), 202
     except Exception as e:
-        logging.error(f"Error listing published tasks: {str(e)}")
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        logging.error(f"Error starting regrade: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@tasks_blueprint.route("/tasks/regrade-jobs/<string:job_id>", methods=["GET"])
+@jwt_required()
+def regrade_job_status(job_id):
+    current_user = get_current_user()
+
+    if current_user["role"] != "professor":
+        return jsonify({"error": "Unauthorized - Only professors can view regrade jobs"}), 403
+
+    job = get_regrade_job(job_id)
+    if not job:
+        return jsonify({"error": "Regrade job not found"}), 404
+    return jsonify({"job": job}), 200
@@ -0,0 +1,192 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from app.core.config import Config
+from app.db.models.regrade_job import RegradeJob
+from app.db.session import get_session, remove_session, transaction
+from app.services.submission_service import (
+    record_grading_result,
+    list_task_submission_queries,
+    bulk_update_verdicts,
+    get_task_by_id,
+    list_pending_submissions,
+)
+from app.utils.query_executor import validate_query, is_transient, INTERNAL_ERROR_FEEDBACK
+from app.utils.sql_normalizer import normalize_sql
+import threading
+import logging
+import time
+import uuid
+
+class GradingQueueFull(Exception):
+    """Raised when more submissions are waiting than GRADING_QUEUE_SIZE allows."""
+
+class GradingQueue:
+    """
+    In-process grading queue. A fixed number of worker threads run validate_query, which
+    caps how many grading connections are in use at once; the semaphore bounds how many
+    submissions may wait for a worker.
+    """
+
+    def __init__(self, workers, max_pending):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grader")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def submit(self, submission_id, submitted_query, task):
+        if not self._slots.acquire(blocking=False):
+            raise GradingQueueFull("Too many submissions are waiting to be graded, please try again shortly")
+        try:
+            self._executor.submit(self._grade, submission_id, submitted_query, task)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _grade(self, submission_id, submitted_query, task):
+        try:
+            for attempt in range(Config.GRADING_BUSY_RETRIES + 1):
+                result = validate_query(submitted_query, task["correct_answer"], task["schema_name"],
+                                        task_id=task["task_id"], difficulty=task["difficulty"],
+                                        reference_fingerprint=task["reference_fingerprint"])
+                if not result.get("busy") or attempt == Config.GRADING_BUSY_RETRIES:
+                    break
+                # The grading pool is exhausted; waiting here also holds back this worker's next job
+                time.sleep(Config.GRADING_BUSY_BACKOFF_SECONDS * 2 ** attempt)
+            # A submission that never got a connection is failed, so the student can submit it again
+            record_grading_result(submission_id, result["is_correct"], result["feedback"],
+                                  status="failed" if result.get("busy") else "graded")
+            logging.info(f"Graded submission {submission_id}: is_correct={result['is_correct']}")
+        except Exception as e:
+            logging.error(f"Error grading submission {submission_id}: {e}")
+            try:
+                record_grading_result(submission_id, False, "An internal error occurred during grading.", status="failed")
+            except Exception as inner:
+                logging.error(f"Could not mark submission {submission_id} as failed: {inner}")
+        finally:
+            # Worker threads outlive the job, so drop the thread's session explicitly
+            remove_session()
+            self._slots.release()
+
+grading_queue = GradingQueue(Config.GRADING_WORKERS, Config.GRADING_QUEUE_SIZE)
+
+# Queue a saved submission for grading
+def enqueue_submission(submission_id, task, submitted_query):
+    """
+    Hand a pending submission to the grading workers.
+    :param submission_id: ID of the submission saved with status "pending".
+    :param task: Task dictionary including correct_answer, schema_name and difficulty.
+    :param submitted_query: The SQL query submitted by the student.
+    :raises GradingQueueFull: If the queue is at capacity; the submission is marked failed.
+    """
+    try:
+        grading_queue.submit(submission_id, submitted_query, task)
+    except GradingQueueFull as e:
+        record_grading_result(submission_id, False, str(e), status="failed")
+        raise
+
+# Queue again the submissions a previous process accepted but never graded
+def requeue_pending_submissions():
+    """
+    Hand every submission still pending to the grading workers, e.g. after a restart
+    dropped the in-memory queue. Run it at startup; a verdict written twice is the same.
+    :return: Number of submissions queued.
+    """
+    tasks = {}
+    queued = 0
+    for submission_id, assignment_id, submitted_query in list_pending_submissions():
+        if assignment_id not in tasks:
+            tasks[assignment_id] = get_task_by_id(assignment_id)
+        task = tasks[assignment_id]
+        try:
+            if not task or not task["schema_name"]:
+                record_grading_result(submission_id, False, "Task not found for the submission", status="failed")
+                continue
+            enqueue_submission(submission_id, task, submitted_query)
+            queued += 1
+        except GradingQueueFull:
+            # enqueue_submission has marked it failed
+            continue
+    return queued
+
+# ---------------------- BULK REGRADE ----------------------
+
+# Bounded pool shared by all regrade jobs, separate from the live grading workers
+_regrade_executor = ThreadPoolExecutor(max_workers=Config.REGRADE_WORKERS, thread_name_prefix="regrade")
+
+def _update_job(job_id, **fields):
+    with transaction() as session:
+        session.query(RegradeJob).filter(RegradeJob.job_id == job_id).update(fields, synchronize_session=False)
+
+def _prune_jobs(session):
+    # Jobs whose process died never finish, so they expire from their start
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=Config.REGRADE_JOB_TTL_SECONDS)
+    session.query(RegradeJob).filter(
+        func.coalesce(RegradeJob.finished_at, RegradeJob.started_at) < cutoff
+    ).delete(synchronize_session=False)
+
+# Start regrading every submission of a task in the background
+def start_regrade(task_id):
+    """
+    Queue a bulk regrade job for a task.
+    :param task_id: ID of the task whose submissions should be regraded.
+    :return: The job dictionary; poll get_regrade_job for progress.
+    """
+    task = get_task_by_id(task_id)
+    if not task:
+        raise ValueError("Task not found")
+
+    job_id = uuid.uuid4().hex
+    with transaction() as session:
+        _prune_jobs(session)
+        job = RegradeJob(job_id=job_id, task_id=task_id, status="running")
+        session.add(job)
+    threading.Thread(target=_run_regrade, args=(job_id, task), daemon=True).start()
+    return job.to_dict()
+
+def get_regrade_job(job_id):
+    job = get_session().query(RegradeJob).get(job_id)
+    return job.to_dict() if job else None
+
+def _run_regrade(job_id, task):
+    try:
+        # Group submissions by normalized text so each distinct query runs once
+        groups = {}
+        submissions = list_task_submission_queries(task["task_id"])
+        for submission_id, submitted_query in submissions:
+            groups.setdefault(normalize_sql(submitted_query), []).append((submission_id, submitted_query))
+        _update_job(job_id, total_submissions=len(submissions), distinct_queries=len(groups))
+
+        futures = {
+            _regrade_executor.submit(
+                validate_query, members[0][1], task["correct_answer"], task["schema_name"],
+                task_id=task["task_id"], difficulty=task["difficulty"],
+                reference_fingerprint=task["reference_fingerprint"], refresh=True,
+            ): members
+            for members in groups.values()
+        }
+        verdicts = {}
+        failed = []
+        for graded, future in enumerate(as_completed(futures), start=1):
+            submission_ids = [submission_id for submission_id, _ in futures[future]]
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Regrade job {job_id} could not grade a query: {e}")
+                result = {"is_correct": False, "feedback": INTERNAL_ERROR_FEEDBACK}
+            if is_transient(result):
+                # Keep the previous verdict rather than overwrite it with a failure that says nothing
+                failed.extend(submission_ids)
+            else:
+                for submission_id in submission_ids:
+                    verdicts[submission_id] = {"is_correct": result["is_correct"], "feedback": result["feedback"]}
+            _update_job(job_id, graded_queries=graded)
+
+        updated = bulk_update_verdicts(verdicts)
+        _update_job(job_id, status="completed", updated_submissions=updated, failed_submission_ids=sorted(failed),
+                    finished_at=datetime.now(timezone.utc))
+        logging.info(f"Regrade job {job_id} for task {task['task_id']} updated {updated} submissions, "
+                     f"{len(failed)} left unchanged")
+    except Exception as e:
+        logging.error(f"Regrade job {job_id} failed: {e}")
+        _update_job(job_id, status="failed", error=str(e), finished_at=datetime.now(timezone.utc))
+    finally:
+        remove_session()
@@ -0,0 +1,271 @@
+from hashlib import blake2b
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from app.core.config import Config
+from app.db.models.schema import Schema
+from app.db.models.task import Task
+from app.db.session import engine, get_session
+from app.services.schema_service import get_schema_catalog
+from app.utils.query_executor import explain_plan, strip_trailing_semicolons, QueryExecutionError
+from app.utils.result_cache import bump_plan_version, catalog_cache
+from app.utils.sql_normalizer import quote_identifier
+import logging
+import re
+import time
+
+# Columns of every index in a schema, in index order; expression columns have attnum 0 and are left out
+_INDEXES_SQL = """
+SELECT c.relname AS table_name, array_agg(a.attname ORDER BY k.ord) AS columns
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+WHERE n.nspname = :schema_name AND i.indisvalid
+GROUP BY i.indexrelid, c.relname
+"""
+
+_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_CAST_PATTERN = re.compile(r'::\s*("[^"]*"|\w+)')
+_COLUMN = r'("(?:[^"]|"")+"|[A-Za-z_][A-Za-z0-9_$]*)'
+_IDENTIFIER_PATTERN = re.compile(_COLUMN)
+# "=" also covers "= ANY (...)", which is what IN lists are planned as
+_EQUALITY_PATTERN = re.compile(_COLUMN + r"\s*=")
+_PLAIN_IDENTIFIER = re.compile(r"^[a-z_][a-z0-9_$]*$")
+_JOIN_KEYS = ("Hash Cond", "Merge Cond", "Join Filter")
+
+def _identifier(token):
+    return token[1:-1].replace('""', '"') if token.startswith('"') else token
+
+def _strip_expression(expression):
+    # Literals and type names would otherwise be read as column references
+    return _CAST_PATTERN.sub("", _LITERAL_PATTERN.sub("''", expression))
+
+def _filter_columns(expression, columns):
+    """Columns referenced by a scan filter, split into equality comparisons and the rest."""
+    expression = _strip_expression(expression)
+    equality = [c for c in dict.fromkeys(map(_identifier, _EQUALITY_PATTERN.findall(expression))) if c in columns]
+    referenced = dict.fromkeys(map(_identifier, _IDENTIFIER_PATTERN.findall(expression)))
+    return equality, [c for c in referenced if c in columns and c not in equality]
+
+def _join_columns(conditions, alias, columns):
+    """Columns of the scanned relation that appear as alias.column in the enclosing join conditions."""
+    # EXPLAIN prints aliases the way quote_ident does
+    prefix = alias if _PLAIN_IDENTIFIER.match(alias) else quote_identifier(alias)
+    pattern = re.compile(r'(?<![\w"$])' + re.escape(prefix) + r"\." + _COLUMN)
+    found = []
+    for condition in conditions:
+        for column in map(_identifier, pattern.findall(_strip_expression(condition))):
+            if column in columns and column not in found:
+                found.append(column)
+    return found
+
+def _sequential_scans(node, conditions=(), loops=1):
+    """
+    Yield every sequential scan in a plan with the join conditions above it and the
+    number of times it runs (more than once on the inner side of a nested loop).
+    """
+    if node["Node Type"] == "Seq Scan":
+        yield node, conditions, loops
+    conditions = conditions + tuple(node[key] for key in _JOIN_KEYS if key in node)
+    children = node.get("Plans", [])
+    if node["Node Type"] == "Nested Loop" and len(children) == 2:
+        yield from _sequential_scans(children[0], conditions, loops)
+        yield from _sequential_scans(children[1], conditions, loops * max(children[0]["Plan Rows"], 1))
+    else:
+        for child in children:
+            yield from _sequential_scans(child, conditions, loops)
+
+def _index_name(table_name, columns):
+    name = "_".join([table_name] + list(columns) + ["idx"])
+    if len(name) <= 63:
+        return name
+    # Postgres truncates longer names, which could make two proposals collide
+    return name[:54] + "_" + blake2b(name.encode("utf-8"), digest_size=4).hexdigest()
+
+def _index_statement(schema_name, table_name, columns, concurrently=True):
+    return (f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{quote_identifier(_index_name(table_name, columns))} "
+            f"ON {quote_identifier(schema_name)}.{quote_identifier(table_name)} "
+            f"({', '.join(quote_identifier(column) for column in columns)})")
+
+def _existing_indexes(session, schema_name):
+    indexes = {}
+    for row in session.execute(text(_INDEXES_SQL), {"schema_name": schema_name}):
+        indexes.setdefault(row.table_name, []).append(list(row.columns))
+    return indexes
+
+def _candidate(scan, conditions, loops, table):
+    """Columns worth indexing for one sequential scan, and a rough saving in planner cost units."""
+    columns = {column["name"] for column in table["columns"]}
+    equality, others = _filter_columns(scan.get("Filter", ""), columns)
+    # An index on the join key only pays off when the scan is repeated for every outer row
+    join = _join_columns(conditions, scan.get("Alias", scan["Relation Name"]), columns) if loops > 1 else []
+    leading = list(dict.fromkeys(join + equality))
+    # Only the first range column of a btree index can be used after the equality columns
+    index_columns = (leading + [column for column in others if column not in leading][:1])[:Config.INDEX_ADVISOR_MAX_COLUMNS]
+    if not index_columns:
+        return None, 0, []
+
+    table_rows = table["approximate_row_count"]
+    # With a join key, each lookup is assumed to find about one row
+    matched = 1 if join else max(scan["Plan Rows"], 1)
+    selectivity = min(matched / table_rows, 1)
+    saving = scan["Total Cost"] * loops * (1 - selectivity)
+    reasons = (["join"] if join else []) + (["filter"] if equality or others else [])
+    return index_columns, saving, reasons
+
+def _plan_cost(connection, query):
+    return connection.execute(text(f"EXPLAIN (FORMAT JSON) {strip_trailing_semicolons(query)}")).scalar()[0]["Plan"]["Total Cost"]
+
+def _verify(schema_name, recommendation, answers, baseline):
+    # Build the index in a transaction that is rolled back and let the planner re-cost the affected tasks
+    with engine.connect() as connection:
+        connection.begin()
+        connection.execute(text("SELECT set_config('search_path', :search_path, true)"),
+                           {"search_path": quote_identifier(schema_name)})
+        connection.execute(text(_index_statement(schema_name, recommendation["table"], recommendation["columns"],
+                                                 concurrently=False)))
+        return sum(baseline[task_id] - _plan_cost(connection, answers[task_id]) for task_id in recommendation["task_ids"])
+
+# Propose indexes for the reference answers of a schema's tasks
+def advise_indexes(schema_id, verify=False):
+    """
+    EXPLAIN the reference answer of every task on a schema, find sequential scans of
+    tables with at least INDEX_ADVISOR_MIN_ROWS rows and propose an index on the filter
+    and join columns they evaluate.
+    :param schema_id: ID of the schema.
+    :param verify: Also measure each proposal by building it in a rolled-back transaction
+                   and re-planning the affected tasks. This takes as long as the index build
+                   and blocks writes to the table meanwhile.
+    :return: Dictionary with the recommendations, ordered by estimated saving, the tasks
+             that could not be planned and the scanned tables that have no statistics yet.
+    """
+    session = get_session()
+    schema = session.query(Schema).get(schema_id)
+    if not schema:
+        raise ValueError("Schema not found")
+
+    schema_name = schema.schema_name
+    catalog = get_schema_catalog(schema_name, session)
+    existing = _existing_indexes(session, schema_name)
+    tasks = session.query(Task.task_id, Task.correct_answer).filter(Task.schema_id == schema_id).all()
+
+    recommendations = {}
+    answers = {}
+    baseline = {}
+    skipped_tasks = []
+    unanalyzed = set()
+    for task_id, correct_answer in tasks:
+        try:
+            plan = explain_plan(schema_name, correct_answer)
+        except QueryExecutionError as e:
+            skipped_tasks.append({"task_id": task_id, "error": str(e)})
+            continue
+        answers[task_id] = correct_answer
+        baseline[task_id] = plan["Total Cost"]
+
+        for scan, conditions, loops in _sequential_scans(plan):
+            table_name = scan["Relation Name"]
+            table = catalog["tables"].get(table_name)
+            if scan.get("Schema", schema_name) != schema_name or not table:
+                continue
+            if table["approximate_row_count"] is None:
+                unanalyzed.add(table_name)
+                continue
+            if table["approximate_row_count"] < Config.INDEX_ADVISOR_MIN_ROWS:
+                continue
+            columns, saving, reasons = _candidate(scan, conditions, loops, table)
+            if not columns:
+                continue
+            # A usable index already leads with the same column; the planner chose not to use it
+            if any(index[0] == columns[0] for index in existing.get(table_name, [])):
+                continue
+
+            recommendation = recommendations.setdefault((table_name, tuple(columns)), {
+                "table": table_name,
+                "columns": columns,
+                "index_name": _index_name(table_name, columns),
+                "statement": _index_statement(schema_name, table_name, columns),
+                "table_rows": table["approximate_row_count"],
+                "reasons": [],
+                "task_ids": [],
+                "estimated_cost_saving": 0.0,
+            })
+            recommendation["reasons"] = sorted(set(recommendation["reasons"]) | set(reasons))
+            if task_id not in recommendation["task_ids"]:
+                recommendation["task_ids"].append(task_id)
+            recommendation["estimated_cost_saving"] += saving
+
+    results = sorted(recommendations.values(), key=lambda r: r["estimated_cost_saving"], reverse=True)
+    for recommendation in results:
+        recommendation["estimated_cost_saving"] = round(recommendation["estimated_cost_saving"], 2)
+        if verify:
+            try:
+                recommendation["planner_cost_saving"] = round(_verify(schema_name, recommendation, answers, baseline), 2)
+            except SQLAlchemyError as e:
+                logging.warning(f"Could not verify index on {schema_name}.{recommendation['table']}: {e}")
+                recommendation["planner_cost_saving"] = None
+
+    return {
+        "schema_id": schema_id,
+        "tasks_analyzed": len(answers),
+        "recommendations": results,
+        "skipped_tasks": skipped_tasks,
+        "tables_without_statistics": sorted(unanalyzed),
+    }
+
+# Build approved indexes without blocking writes or grading
+def apply_indexes(schema_id, indexes):
+    """
+    Create indexes with CREATE INDEX CONCURRENTLY, one at a time on an autocommit
+    connection, so the tables stay readable and writable while they are built.
+    :param schema_id: ID of the schema.
+    :param indexes: List of {"table": ..., "columns": [...]} entries, as proposed by advise_indexes.
+    :return: Dictionary with the outcome and build time of each index.
+    """
+    if not isinstance(indexes, list) or not indexes:
+        raise ValueError("'indexes' must be a non-empty list of {table, columns} objects")
+
+    session = get_session()
+    schema = session.query(Schema).get(schema_id)
+    if not schema:
+        raise ValueError("Schema not found")
+    schema_name = schema.schema_name
+    catalog = get_schema_catalog(schema_name, session)
+
+    # Validate everything before building anything
+    for index in indexes:
+        table = catalog["tables"].get(index.get("table")) if isinstance(index, dict) else None
+        if not table:
+            raise ValueError(f"Table not found: {index.get('table') if isinstance(index, dict) else index}")
+        columns = index.get("columns")
+        known = {column["name"] for column in table["columns"]}
+        if not isinstance(columns, list) or not columns or any(column not in known for column in columns):
+            raise ValueError(f"Invalid columns for table {index['table']}: {columns}")
+    # Release the request's transaction, CREATE INDEX CONCURRENTLY waits for every open one on the table
+    session.rollback()
+
+    results = []
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        for index in indexes:
+            statement = _index_statement(schema_name, index["table"], index["columns"])
+            start = time.perf_counter()
+            try:
+                connection.execute(text(statement))
+                results.append({"table": index["table"], "columns": index["columns"], "status": "created"})
+            except SQLAlchemyError as e:
+                logging.error(f"Failed to build index on {schema_name}.{index['table']}: {e}")
+                # A failed concurrent build leaves an invalid index behind
+                connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS "
+                                        f"{quote_identifier(schema_name)}.{quote_identifier(_index_name(index['table'], index['columns']))}"))
+                results.append({"table": index["table"], "columns": index["columns"], "status": "failed", "error": str(e)})
+            results[-1]["statement"] = statement
+            results[-1]["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    # New indexes change plans but not results: cached reference results and verdicts stay valid
+    if any(result["status"] == "created" for result in results):
+        bump_plan_version(schema_name)
+        catalog_cache.invalidate_schema(schema_name)
+    return {"schema_id": schema_id, "indexes": results}
@@ -1,17 +1,28 @@
 from app.db.models.schema import Schema
-from app.db.session import SessionLocal
+from app.db.models.task import Task
+from app.core.config import Config
+from app.db.session import engine, get_session, transaction, run_after_commit
+from app.utils.result_cache import invalidate_schema, bump_schema_version, catalog_cache, get_schema_version
+from app.utils.response_cache import response_cache
+from app.utils.bulk_load import load_rows, copy_rows, copy_text
+from app.utils.data_generator import validate_spec, generate_blocks, encode_keys
+from app.utils.dataset_reader import open_dataset
+from app.utils.sql_normalizer import quote_identifier
+import base64
+import json
 import logging
+import re
+import time
 from sqlalchemy import Table, text
 # Create a new schema
 def create_schema(data):
-    session = SessionLocal()
-    try:
-        schema_name = data.get("schema_name")
-        professor_id = data.get("professor_id")
+    schema_name = data.get("schema_name")
+    professor_id = data.get("professor_id")
 
-        if not schema_name or not professor_id:
-            raise ValueError("schema_name and professor_id are required")
+    if not schema_name or not professor_id:
+        raise ValueError("schema_name and professor_id are required")
 
+    with transaction() as session:
         # Create schema model in the database
         new_schema = Schema(schema_name=schema_name, created_by=professor_id)
         session.add(new_schema)
@@ -19,38 +30,105 @@ def create_schema(data):
         # Dynamically create the schema using raw SQL
         create_schema_sql = text(f"CREATE SCHEMA IF NOT EXISTS {schema_name};")
         session.execute(create_schema_sql)
-        session.commit()
 
-        return {"schema_id": new_schema.schema_id, "schema_name": schema_name, "created_by": professor_id}
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+    return {"schema_id": new_schema.schema_id, "schema_name": schema_name, "created_by": professor_id}
 
 # List all schemas created by a professor
 def list_schemas(professor_id):
-    session = SessionLocal()
-    try:
-        schemas = session.query(Schema).filter_by(created_by=professor_id).all()
-        return [{"schema_id": schema.schema_id, "schema_name": schema.schema_name} for schema in schemas]
-    finally:
-        session.close()
+    session = get_session()
+    schemas = session.query(Schema).filter_by(created_by=professor_id).all()
+    return [{"schema_id": schema.schema_id, "schema_name": schema.schema_name} for schema in schemas]
+
+# Structure of every table in a schema, read from pg_catalog in a single query
+_CATALOG_SQL = """
+SELECT
+    c.relname AS table_name,
+    c.relkind AS kind,
+    c.reltuples::bigint AS reltuples,
+    (
+        SELECT json_agg(json_build_object(
+            'name', a.attname,
+            'type', format_type(a.atttypid, a.atttypmod),
+            'nullable', NOT a.attnotnull
+        ) ORDER BY a.attnum)
+        FROM pg_attribute a
+        WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    ) AS columns,
+    (
+        SELECT json_agg(a.attname ORDER BY array_position(i.indkey::int2[], a.attnum))
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = c.oid AND i.indisprimary
+    ) AS primary_key,
+    (
+        SELECT json_agg(json_build_object(
+            'name', con.conname,
+            'columns', (
+                SELECT json_agg(a.attname ORDER BY k.ord)
+                FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+            ),
+            'references_schema', fn.nspname,
+            'references_table', fc.relname,
+            'references_columns', (
+                SELECT json_agg(a.attname ORDER BY k.ord)
+                FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+            )
+        ))
+        FROM pg_constraint con
+        JOIN pg_class fc ON fc.oid = con.confrelid
+        JOIN pg_namespace fn ON fn.oid = fc.relnamespace
+        WHERE con.conrelid = c.oid AND con.contype = 'f'
+    ) AS foreign_keys
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = :schema_name AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+ORDER BY c.relname
+"""
+
+_RELATION_KINDS = {"r": "table", "p": "table", "v": "view", "m": "materialized view", "f": "foreign table"}
+
+# Cached catalog of a schema's tables, columns and keys
+def get_schema_catalog(schema_name, session=None):
+    """
+    Get the introspected structure of a schema, from the catalog cache when possible.
+    :param schema_name: Name of the schema.
+    :param session: Session to query with on a cache miss; defaults to the request's session.
+    :return: Dictionary with "tables", mapping each table name to its kind, columns
+             (name, type, nullable), primary_key, foreign_keys and approximate_row_count.
+    """
+    # Read the version first, so a concurrent DDL change leaves this entry stale
+    version = get_schema_version(schema_name)
+    catalog = catalog_cache.get(schema_name, version)
+    if catalog is not None:
+        return catalog
+
+    session = session or get_session()
+    rows = session.execute(text(_CATALOG_SQL), {"schema_name": schema_name}).fetchall()
+    catalog = {"tables": {}}
+    for row in rows:
+        catalog["tables"][row.table_name] = {
+            "kind": _RELATION_KINDS[row.kind],
+            "columns": row.columns or [],
+            "primary_key": row.primary_key or [],
+            "foreign_keys": row.foreign_keys or [],
+            # reltuples is -1 (or 0 on older servers) until the table has been vacuumed or analyzed
+            "approximate_row_count": row.reltuples if row.reltuples > 0 else None,
+        }
+    catalog_cache.put(schema_name, version, catalog)
+    return catalog
 
 # Get schema details by ID
 def get_schema_by_id(schema_id):
-    session = SessionLocal()
+    session = get_session()
     try:
         schema = session.query(Schema).get(schema_id)
         if not schema:
             raise ValueError("Schema not found")
 
-        # ✅ Fetch tables belonging to this schema
-        tables = session.execute(
-            text(f"SELECT table_name FROM information_schema.tables WHERE table_schema = '{schema.schema_name}'")
-        ).fetchall()
-
-        table_names = [table[0] for table in tables]  # Extract table names
+        # ✅ Tables come from the cached catalog instead of information_schema on every call
+        table_names = list(get_schema_catalog(schema.schema_name, session)["tables"])
 
         return {
             "schema_id": schema.schema_id,
@@ -58,15 +136,32 @@ def get_schema_by_id(schema_id):
             "tables": table_names,  # ✅ Return tables list
         }
     except Exception as e:
+        # Keep the shared session usable for the rest of the request
+        session.rollback()
         logging.error(f"Error fetching schema: {str(e)}")
         return None
-    finally:
-        session.close()
+
+# Drop everything derived from a schema's contents once a change to it commits
+def _schema_changed(session, schema):
+    # Stored reference fingerprints go stale with the data; grading falls back to running the reference
+    task_tags = [f"task:{task_id}" for (task_id,) in
+                 session.query(Task.task_id).filter(Task.schema_id == schema.schema_id)]
+    session.query(Task).filter(Task.schema_id == schema.schema_id).update({
+        Task.reference_row_count: None,
+        Task.reference_columns: None,
+        Task.reference_digest: None,
+        Task.reference_ordered_digest: None,
+        Task.reference_execution_ms: None,
+    }, synchronize_session=False)
+    # Committed with the change, so every worker stops serving results for the old contents at once
+    bump_schema_version(schema.schema_name, session)
+    run_after_commit(invalidate_schema, schema.schema_name)
+    # Professors see the reference fingerprint in the task details
+    run_after_commit(response_cache.invalidate, *task_tags)
 
 # Create a table in a specific schema
 def create_table_in_schema(schema_id, data):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         schema = session.query(Schema).get(schema_id)
         if not schema:
             raise ValueError("Schema not found")
@@ -97,19 +192,13 @@ def create_table_in_schema(schema_id, data):
 
         # Execute queries
         session.execute(create_table_sql)
-        session.commit()
+        _schema_changed(session, schema)
 
-        return {"schema_id": schema_id, "table_name": table_name}
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+    return {"schema_id": schema_id, "table_name": table_name}
 
 # Alter an existing table in the schema
 def alter_table_in_schema(schema_id, table_name, data):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         schema = session.query(Schema).get(schema_id)
         if not schema:
             raise ValueError("Schema not found")
@@ -130,19 +219,13 @@ def alter_table_in_schema(schema_id, table_name, data):
             alter_table_query = text(f"ALTER TABLE {schema_name}.{table_name} {column_changes};")
 
         session.execute(alter_table_query)
-        session.commit()
+        _schema_changed(session, schema)
 
-        return {"message": "Table updated successfully", "schema_id": schema_id, "table_name": table_name}
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+    return {"message": "Table updated successfully", "schema_id": schema_id, "table_name": table_name}
 
 # Delete a table from the schema
 def delete_table_from_schema(schema_id, table_name):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         schema = session.query(Schema).get(schema_id)
         if not schema:
             raise ValueError("Schema not found")
@@ -152,18 +235,12 @@ def delete_table_from_schema(schema_id, table_name):
         delete_table_sql = text(f"DROP TABLE IF EXISTS {schema_name}.{table_name};")
 
         session.execute(delete_table_sql)
-        session.commit()
+        _schema_changed(session, schema)
 
-        return {"message": "Table deleted successfully", "schema_id": schema_id}
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+    return {"message": "Table deleted successfully", "schema_id": schema_id}
 
 def execute_sql_on_schema(schema_id, sql_command):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         schema = session.query(Schema).get(schema_id)
         if not schema:
             raise ValueError("Schema not found")
@@ -173,58 +250,494 @@ def execute_sql_on_schema(schema_id, sql_command):
         # ✅ Ensure command is properly formatted
         safe_sql = text(sql_command.replace("SCHEMA_NAME", schema_name))
 
+        # Before the command, which may move search_path away from the application tables
+        _schema_changed(session, schema)
         session.execute(safe_sql)
-        session.commit()
 
-        return {"message": "SQL command executed successfully"}
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+    return {"message": "SQL command executed successfully"}
 
 def insert_into_table(schema_id, table_name, rows):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         schema = session.query(Schema).get(schema_id)
         if not schema:
             raise ValueError("Schema not found")
 
         schema_name = schema.schema_name
 
-        # Construct the INSERT query dynamically
-        for row in rows:
-            columns = ", ".join(row.keys())
-            values = ", ".join([f":{key}" for key in row.keys()])
-            insert_sql = text(f"INSERT INTO {schema_name}.{table_name} ({columns}) VALUES ({values});")
-            session.execute(insert_sql, row)
-
-        session.commit()
-        return {"message": "Rows inserted successfully", "schema_id": schema_id, "table_name": table_name}
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
-# Fetch data from a table in a schema
-def fetch_table_data(schema_id, table_name):
-    session = SessionLocal()
-    try:
+        # Batched INSERTs for small payloads, COPY for large ones, on the session's own connection
+        stats = load_rows(session.connection().connection, f"{schema_name}.{table_name}", rows)
+
+        _schema_changed(session, schema)
+    logging.info(f"Loaded {stats['rows_loaded']} rows into {schema_name}.{table_name} "
+                 f"via {stats['method']} in {stats['elapsed_ms']} ms")
+    return {"message": "Rows inserted successfully", "schema_id": schema_id, "table_name": table_name, **stats}
+
+def _match_columns(table_columns, names):
+    """
+    Resolve the column names of a file header against an existing table: an exact match
+    first, then a case-insensitive one, as unquoted names like Name resolve to name.
+    """
+    folded = {}
+    for column in table_columns:
+        folded.setdefault(column.lower(), []).append(column)
+    matched = []
+    for name in names:
+        candidates = folded.get(name.lower(), [])
+        if name in table_columns:
+            matched.append(name)
+        elif len(candidates) == 1:
+            matched.append(candidates[0])
+        elif candidates:
+            raise ValueError(f"Column {name} matches several columns: {', '.join(candidates)}")
+        else:
+            raise ValueError(f"Unknown column: {name}")
+    return matched
+
+# Stream an uploaded dataset file into a table
+def import_table_data(schema_id, table_name, stream, file_format, create_table=False, delimiter=","):
+    """
+    Load a CSV, JSON Lines or Parquet file into a table with COPY, reading the file in
+    chunks so memory use does not grow with its size.
+    :param schema_id: ID of the schema that holds the table.
+    :param table_name: Name of the target table.
+    :param stream: Binary file-like object with the uploaded file.
+    :param file_format: "csv", "jsonl" or "parquet" (see detect_format).
+    :param create_table: Create the table from the file's columns and inferred types first.
+    :param delimiter: Field delimiter for CSV files.
+    :return: Dictionary with the columns, rows_loaded, elapsed_ms and rows_per_second. The column
+             types are the inferred ones for a created table and the table's own otherwise.
+    """
+    start = time.perf_counter()
+    columns, column_types, rows = open_dataset(stream, file_format, delimiter)
+
+    with transaction() as session:
         schema = session.query(Schema).get(schema_id)
         if not schema:
             raise ValueError("Schema not found")
 
         schema_name = schema.schema_name
+        table = f"{schema_name}.{table_name}"
+        if not create_table:
+            metadata = _table_metadata(session, schema_name, table_name)
+            columns = _match_columns(metadata["columns"], columns)
+            # COPY coerces the values to the table's own types, so those are what gets reported
+            column_types = [metadata["column_types"][column] for column in columns]
+        quoted_columns = [quote_identifier(column) for column in columns]
+        if create_table:
+            column_definitions = ", ".join(f"{column} {column_type}" for column, column_type in zip(quoted_columns, column_types))
+            session.execute(text(f"CREATE TABLE {table} ({column_definitions});"))
+
+        with session.connection().connection.cursor() as cursor:
+            rows_loaded = copy_rows(cursor, table, quoted_columns, rows)
+
+        _schema_changed(session, schema)
+
+    elapsed = time.perf_counter() - start
+    logging.info(f"Imported {rows_loaded} rows from a {file_format} file into {table} in {elapsed:.2f} s")
+    return {
+        "message": "Dataset imported successfully",
+        "schema_id": schema_id,
+        "table_name": table_name,
+        "table_created": bool(create_table),
+        "columns": [{"name": column, "type": column_type} for column, column_type in zip(columns, column_types)],
+        "rows_loaded": rows_loaded,
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "rows_per_second": round(rows_loaded / elapsed, 1) if elapsed > 0 else None,
+    }
+
+# ---------------------- SYNTHETIC DATA ----------------------
+
+_INTEGER_TYPES = ("smallint", "integer", "bigint")
+
+def _reference_keys(session, schema_name, catalog, spec):
+    keys = {}
+    for column, options in spec["columns"].items():
+        if options["generator"] != "reference" or (options["table"], options["column"]) in keys:
+            continue
+        table = catalog["tables"].get(options["table"])
+        column_types = {c["name"]: c["type"] for c in table["columns"]} if table else {}
+        if options["column"] not in column_types:
+            raise ValueError(f"Column {column}: referenced column {options['table']}.{options['column']} not found")
+
+        qualified = f"{schema_name}.{quote_identifier(options['table'])}"
+        key = quote_identifier(options["column"])
+        # A gap-free integer key is sampled as a range instead of being loaded into memory
+        if column_types[options["column"]] in _INTEGER_TYPES:
+            low, high, count = session.execute(text(
+                f"SELECT min({key}), max({key}), count(DISTINCT {key}) FROM {qualified}"
+            )).fetchone()
+            if count and high - low + 1 == count:
+                keys[(options["table"], options["column"])] = (low, high)
+                continue
+        values = [row[0] for row in session.execute(text(
+            f"SELECT DISTINCT {key} FROM {qualified} WHERE {key} IS NOT NULL ORDER BY 1"
+        ))]
+        if not values:
+            raise ValueError(f"Column {column}: referenced table {options['table']} has no rows")
+        keys[(options["table"], options["column"])] = encode_keys(values)
+    return keys
+
+# Fill a table with generated rows for performance exercises
+def generate_table_data(schema_id, table_name, spec):
+    """
+    Generate synthetic rows from a per-column spec and stream them into a table with COPY.
+    Rows are produced in NumPy blocks of DATA_GENERATOR_BLOCK_ROWS, so memory use does not
+    grow with the row count, and the same seed reproduces the same data.
+    :param schema_id: ID of the schema that holds the table.
+    :param table_name: Name of the target table.
+    :param spec: Dictionary with "rows", an optional "seed" and per-column generators
+                 (see data_generator.validate_spec).
+    :return: Dictionary with the seed, rows_loaded, elapsed_ms and rows_per_second.
+    """
+    start = time.perf_counter()
+    with transaction() as session:
+        schema = session.query(Schema).get(schema_id)
+        if not schema:
+            raise ValueError("Schema not found")
 
-        # Fetch all rows from the table
-        fetch_sql = text(f"SELECT * FROM {schema_name}.{table_name};")
-        result = session.execute(fetch_sql).fetchall()
-
-        # Convert rows to a list of dictionaries
-        rows = [dict(row) for row in result]
+        schema_name = schema.schema_name
+        table = f"{schema_name}.{table_name}"
+        spec = validate_spec(spec, _table_metadata(session, schema_name, table_name)["columns"])
+        keys = _reference_keys(session, schema_name, get_schema_catalog(schema_name, session), spec)
+
+        with session.connection().connection.cursor() as cursor:
+            copy_text(cursor, table, [quote_identifier(column) for column in spec["columns"]],
+                      generate_blocks(spec, keys))
+
+        _schema_changed(session, schema)
+
+    elapsed = time.perf_counter() - start
+    logging.info(f"Generated {spec['rows']} rows into {table} with seed {spec['seed']} in {elapsed:.2f} s")
+    return {
+        "message": "Data generated successfully",
+        "schema_id": schema_id,
+        "table_name": table_name,
+        "seed": spec["seed"],
+        "rows_loaded": spec["rows"],
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "rows_per_second": round(spec["rows"] / elapsed, 1) if elapsed > 0 else None,
+    }
+
+# ---------------------- BATCH DDL ----------------------
+
+_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,62}$")
+# Type names such as "integer", "varchar(20)", "numeric(10, 2)", "text[]" or "timestamp with time zone"
+_TYPE_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9_ ]*(\(\s*\d+\s*(,\s*\d+\s*)?\))?(\[\])*$")
+
+BATCH_OPERATIONS = ("create_table", "add_column", "drop_column", "alter_column_type", "create_index", "insert_rows")
+
+class BatchValidationError(ValueError):
+    """Raised with every problem found in a batch before any of it is applied."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+def _check_identifier(errors, label, name):
+    if not isinstance(name, str) or not _IDENTIFIER_PATTERN.match(name):
+        errors.append(f"{label}: '{name}' is not a valid identifier")
+        return False
+    return True
+
+def _check_type(errors, label, column_type):
+    if not isinstance(column_type, str) or not _TYPE_PATTERN.match(column_type.strip()):
+        errors.append(f"{label}: '{column_type}' is not a valid column type")
+
+# Check a whole batch against the schema as it will look when each operation runs
+def _validate_batch(operations, tables):
+    """
+    :param operations: The batch's operation dictionaries.
+    :param tables: Dictionary of existing table name -> set of column names (lower case).
+    :return: List of error messages; empty if the batch is valid.
+    """
+    errors = []
+    tables = {name: set(columns) for name, columns in tables.items()}
+    for index, operation in enumerate(operations):
+        label = f"Operation {index}"
+        if not isinstance(operation, dict) or operation.get("op") not in BATCH_OPERATIONS:
+            errors.append(f"{label}: 'op' must be one of {', '.join(BATCH_OPERATIONS)}")
+            continue
+        op = operation["op"]
+        label = f"{label} ({op})"
+        if not _check_identifier(errors, label, operation.get("table")):
+            continue
+        table = operation["table"].lower()
+
+        if op == "create_table":
+            columns = operation.get("columns")
+            if table in tables:
+                errors.append(f"{label}: table {table} already exists")
+            if not columns or not isinstance(columns, list):
+                errors.append(f"{label}: 'columns' must be a non-empty list")
+                continue
+            names = set()
+            for column in columns:
+                if not isinstance(column, dict):
+                    errors.append(f"{label}: every column needs a name and a type")
+                    continue
+                if _check_identifier(errors, label, column.get("name")):
+                    names.add(column["name"].lower())
+                _check_type(errors, label, column.get("type"))
+            for key in operation.get("primary_key") or []:
+                if not isinstance(key, str) or key.lower() not in names:
+                    errors.append(f"{label}: primary key column '{key}' is not in the table")
+            tables[table] = names
+            continue
+
+        if table not in tables:
+            errors.append(f"{label}: table {table} does not exist")
+            continue
+        columns = tables[table]
+
+        if op == "add_column":
+            if _check_identifier(errors, label, operation.get("column")):
+                if operation["column"].lower() in columns:
+                    errors.append(f"{label}: column {operation['column']} already exists")
+                columns.add(operation["column"].lower())
+            _check_type(errors, label, operation.get("type"))
+        elif op in ("drop_column", "alter_column_type"):
+            if _check_identifier(errors, label, operation.get("column")):
+                if operation["column"].lower() not in columns:
+                    errors.append(f"{label}: column {operation['column']} does not exist")
+                elif op == "drop_column":
+                    columns.discard(operation["column"].lower())
+            if op == "alter_column_type":
+                _check_type(errors, label, operation.get("type"))
+        elif op == "create_index":
+            index_columns = operation.get("columns")
+            if not index_columns or not isinstance(index_columns, list):
+                errors.append(f"{label}: 'columns' must be a non-empty list")
+                continue
+            for column in index_columns:
+                if _check_identifier(errors, label, column) and column.lower() not in columns:
+                    errors.append(f"{label}: column {column} does not exist")
+            if operation.get("name") is not None:
+                _check_identifier(errors, label, operation["name"])
+        elif op == "insert_rows":
+            rows = operation.get("rows")
+            if not rows or not isinstance(rows, list) or not all(isinstance(row, dict) and row for row in rows):
+                errors.append(f"{label}: 'rows' must be a non-empty list of dictionaries")
+                continue
+            unknown = {key for row in rows for key in row if str(key).lower() not in columns}
+            if unknown:
+                errors.append(f"{label}: unknown columns {', '.join(sorted(map(str, unknown)))}")
+    return errors
+
+def _batch_statement(schema_name, operation):
+    table = f"{schema_name}.{operation['table']}"
+    op = operation["op"]
+    if op == "create_table":
+        definitions = [f"{column['name']} {column['type']}" for column in operation["columns"]]
+        if operation.get("primary_key"):
+            definitions.append(f"PRIMARY KEY ({', '.join(operation['primary_key'])})")
+        return f"CREATE TABLE {table} ({', '.join(definitions)})"
+    if op == "add_column":
+        return f"ALTER TABLE {table} ADD COLUMN {operation['column']} {operation['type']}"
+    if op == "drop_column":
+        return f"ALTER TABLE {table} DROP COLUMN {operation['column']}"
+    if op == "alter_column_type":
+        return f"ALTER TABLE {table} ALTER COLUMN {operation['column']} TYPE {operation['type']}"
+    if op == "create_index":
+        name = operation.get("name") or f"{operation['table']}_{'_'.join(operation['columns'])}_idx"[:63]
+        unique = "UNIQUE " if operation.get("unique") else ""
+        return f"CREATE {unique}INDEX {name} ON {table} ({', '.join(operation['columns'])})"
+    raise ValueError(f"Unsupported operation {op}")
+
+# Apply many structural changes and inserts as one unit
+def apply_schema_batch(schema_id, operations):
+    """
+    Validate a list of operations against the schema, then apply all of them in a
+    single transaction: either every operation takes effect or none does.
+    Supported operations (key "op"): create_table (table, columns, optional primary_key),
+    add_column (table, column, type), drop_column (table, column), alter_column_type
+    (table, column, type), create_index (table, columns, optional name and unique) and
+    insert_rows (table, rows).
+    :param schema_id: ID of the schema to change.
+    :param operations: List of operation dictionaries, applied in order.
+    :return: Dictionary with per-operation timings and the total time.
+    :raises BatchValidationError: If any operation is invalid; nothing is applied.
+    """
+    if not operations or not isinstance(operations, list):
+        raise BatchValidationError(["'operations' must be a non-empty list"])
+
+    start = time.perf_counter()
+    with transaction() as session:
+        schema = session.query(Schema).get(schema_id)
+        if not schema:
+            raise ValueError("Schema not found")
+        schema_name = schema.schema_name
 
-        return {"schema_id": schema_id, "table_name": table_name, "rows": rows}
-    except Exception as e:
-        raise e
-    finally:
-        session.close()
\ No newline at end of file
+        catalog = get_schema_catalog(schema_name, session)
+        existing = {
+            name.lower(): {column["name"].lower() for column in table["columns"]}
+            for name, table in catalog["tables"].items()
+        }
+        errors = _validate_batch(operations, existing)
+        if errors:
+            raise BatchValidationError(errors)
+
+        results = []
+        connection = session.connection().connection
+        for index, operation in enumerate(operations):
+            operation_start = time.perf_counter()
+            result = {"index": index, "op": operation["op"], "table": operation["table"]}
+            try:
+                if operation["op"] == "insert_rows":
+                    result["rows_loaded"] = load_rows(connection, f"{schema_name}.{operation['table']}", operation["rows"])["rows_loaded"]
+                else:
+                    with connection.cursor() as cursor:
+                        cursor.execute(_batch_statement(schema_name, operation))
+            except Exception as e:
+                raise ValueError(f"Operation {index} ({operation['op']}) failed, no changes were applied: {e}")
+            result["elapsed_ms"] = round((time.perf_counter() - operation_start) * 1000, 3)
+            results.append(result)
+
+        _schema_changed(session, schema)
+
+    return {
+        "message": "Batch applied successfully",
+        "schema_id": schema_id,
+        "operations": results,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+def _table_metadata(session, schema_name, table_name):
+    catalog = get_schema_catalog(schema_name, session)
+    # Unquoted names are folded to lower case by Postgres
+    table = catalog["tables"].get(table_name) or catalog["tables"].get(table_name.lower())
+    if not table:
+        raise ValueError(f"Table {schema_name}.{table_name} not found")
+    return {
+        "columns": [column["name"] for column in table["columns"]],
+        "column_types": {column["name"]: column["type"] for column in table["columns"]},
+        "key_columns": table["primary_key"],
+        "approximate_row_count": table["approximate_row_count"],
+    }
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor, key_count):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != key_count:
+        raise ValueError("Invalid cursor")
+    return values
+
+def _table_query(session, schema_id, table_name, columns):
+    schema = session.query(Schema).get(schema_id)
+    if not schema:
+        raise ValueError("Schema not found")
+
+    table = f"{schema.schema_name}.{table_name}"
+    metadata = _table_metadata(session, schema.schema_name, table_name)
+    if columns:
+        unknown = [column for column in columns if column not in metadata["columns"]]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    else:
+        columns = metadata["columns"]
+
+    # Seek on the primary key, or on the physical row position for tables without one
+    if metadata["key_columns"]:
+        keys = [quote_identifier(column) for column in metadata["key_columns"]]
+        key_values = [f"{key} AS __key_{index}" for index, key in enumerate(keys)]
+    else:
+        keys = ["ctid"]
+        key_values = ["ctid::text AS __key_0"]
+    projection = ", ".join([quote_identifier(column) for column in columns] + key_values)
+    return table, metadata, columns, keys, projection
+
+# Fetch one page of a table in a schema
+def fetch_table_data(schema_id, table_name, after=None, limit=None, columns=None):
+    """
+    Page through a table with keyset pagination, so every page costs the same however
+    deep into the table it is.
+    :param schema_id: ID of the schema that holds the table.
+    :param table_name: Name of the table.
+    :param after: Cursor returned as next_cursor by the previous page.
+    :param limit: Rows per page, capped at TABLE_PAGE_SIZE_MAX.
+    :param columns: Optional list of columns to return; defaults to all of them.
+    :return: Dictionary with the rows, next_cursor (None on the last page) and an
+             approximate_row_count taken from the planner statistics.
+    """
+    session = get_session()
+    table, metadata, columns, keys, projection = _table_query(session, schema_id, table_name, columns)
+    limit = min(max(int(limit or Config.TABLE_PAGE_SIZE), 1), Config.TABLE_PAGE_SIZE_MAX)
+
+    params = {"limit": limit + 1}
+    where = ""
+    if after:
+        values = _decode_cursor(after, len(keys))
+        placeholders = []
+        for index, value in enumerate(values):
+            params[f"after_{index}"] = value
+            placeholders.append(f"CAST(:after_{index} AS tid)" if keys == ["ctid"] else f":after_{index}")
+        where = f"WHERE ({', '.join(keys)}) > ({', '.join(placeholders)})"
+
+    fetch_sql = text(f"SELECT {projection} FROM {table} {where} ORDER BY {', '.join(keys)} LIMIT :limit")
+    result = session.execute(fetch_sql, params).fetchall()
+
+    # One extra row tells whether there is a next page
+    page = [dict(row._mapping) for row in result[:limit]]
+    rows = [{column: record[column] for column in columns} for record in page]
+    next_cursor = None
+    if len(result) > limit:
+        next_cursor = _encode_cursor([page[-1][f"__key_{index}"] for index in range(len(keys))])
+
+    return {
+        "schema_id": schema_id,
+        "table_name": table_name,
+        "columns": columns,
+        "rows": rows,
+        "page_size": limit,
+        "next_cursor": next_cursor,
+        "approximate_row_count": metadata["approximate_row_count"],
+    }
+
+# Stream a whole table as newline-delimited JSON
+def stream_table_data(schema_id, table_name, columns=None):
+    """
+    Export a table without holding it in memory: rows are read through a server-side
+    cursor TABLE_STREAM_CHUNK_SIZE at a time and encoded as NDJSON. The export holds a
+    connection while the client reads, so it stops after TABLE_EXPORT_MAX_ROWS rows or
+    TABLE_EXPORT_TIMEOUT_SECONDS; a cut-off export ends with an {"error": ...} line.
+    :param schema_id: ID of the schema that holds the table.
+    :param table_name: Name of the table.
+    :param columns: Optional list of columns to export; defaults to all of them.
+    :return: Generator of NDJSON text chunks, to be wrapped in a streaming response.
+    """
+    session = get_session()
+    table, _, columns, keys, _ = _table_query(session, schema_id, table_name, columns)
+    max_rows = Config.TABLE_EXPORT_MAX_ROWS
+    # One row past the cap tells a table that fits exactly from one that is cut off
+    fetch_sql = text(f"SELECT {', '.join(quote_identifier(column) for column in columns)} FROM {table} "
+                     f"ORDER BY {', '.join(keys)} LIMIT {max_rows + 1}")
+
+    # The generator outlives the request, so it uses its own connection
+    def generate():
+        deadline = time.monotonic() + Config.TABLE_EXPORT_TIMEOUT_SECONDS
+        exported = 0
+        with engine.connect() as connection:
+            connection.begin()
+            result = connection.execution_options(stream_results=True).execute(fetch_sql)
+            while True:
+                rows = result.fetchmany(Config.TABLE_STREAM_CHUNK_SIZE)
+                if not rows:
+                    return
+                if exported + len(rows) > max_rows:
+                    rows = rows[:max_rows - exported]
+                    error = f"The export was stopped after {max_rows} rows"
+                elif time.monotonic() > deadline:
+                    error = f"The export was stopped after {Config.TABLE_EXPORT_TIMEOUT_SECONDS} seconds"
+                else:
+                    error = None
+                exported += len(rows)
+                yield "".join(json.dumps(dict(row._mapping), default=str) + "\n" for row in rows)
+                if error:
+                    yield json.dumps({"error": error}) + "\n"
+                    return
+
+    return generate()
@@ -0,0 +1,466 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from sqlalchemy import text
+from app.core.config import Config
+from app.db.models.schema import Schema
+from app.db.session import engine, transaction
+from app.utils.sql_normalizer import quote_identifier
+import io
+import json
+import logging
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+
+ARCHIVE_FORMAT_VERSION = 1
+_SCHEMA_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,62}$")
+
+# Tables with their columns, constraints and standalone indexes. Run with search_path set
+# to the schema so that expressions referring to its own objects come back unqualified.
+_TABLES_SQL = """
+SELECT
+    c.relname AS name,
+    (
+        SELECT json_agg(json_build_object(
+            'name', a.attname,
+            'type', format_type(a.atttypid, a.atttypmod),
+            'nullable', NOT a.attnotnull,
+            'default', pg_get_expr(d.adbin, d.adrelid),
+            'identity', a.attidentity,
+            'generated', a.attgenerated
+        ) ORDER BY a.attnum)
+        FROM pg_attribute a
+        LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    ) AS columns,
+    (
+        SELECT json_agg(json_build_object(
+            'name', con.conname,
+            'type', con.contype,
+            'definition', pg_get_constraintdef(con.oid)
+        ) ORDER BY con.conname)
+        FROM pg_constraint con
+        WHERE con.conrelid = c.oid AND con.contype IN ('p', 'u', 'x', 'c', 'f')
+    ) AS constraints,
+    (
+        SELECT json_agg(json_build_object(
+            'name', ic.relname,
+            'definition', pg_get_indexdef(i.indexrelid)
+        ) ORDER BY ic.relname)
+        FROM pg_index i
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        WHERE i.indrelid = c.oid AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint con
+            WHERE con.conindid = i.indexrelid AND con.contype IN ('p', 'u', 'x')
+        )
+    ) AS indexes
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = :schema_name AND c.relkind = 'r'
+ORDER BY c.relname
+"""
+
+# Sequences, with the column that owns them (serial columns and identity columns)
+_SEQUENCES_SQL = """
+SELECT
+    s.relname AS name,
+    format_type(seq.seqtypid, NULL) AS type,
+    seq.seqstart AS start,
+    seq.seqincrement AS increment,
+    seq.seqmin AS min_value,
+    seq.seqmax AS max_value,
+    seq.seqcycle AS cycle,
+    ps.last_value,
+    owner.relname AS owner_table,
+    owner_column.attname AS owner_column,
+    dep.deptype = 'i' AS identity
+FROM pg_class s
+JOIN pg_namespace n ON n.oid = s.relnamespace
+JOIN pg_sequence seq ON seq.seqrelid = s.oid
+LEFT JOIN pg_sequences ps ON ps.schemaname = n.nspname AND ps.sequencename = s.relname
+LEFT JOIN pg_depend dep ON dep.objid = s.oid AND dep.classid = 'pg_class'::regclass
+    AND dep.refclassid = 'pg_class'::regclass AND dep.deptype IN ('a', 'i')
+LEFT JOIN pg_class owner ON owner.oid = dep.refobjid
+LEFT JOIN pg_attribute owner_column ON owner_column.attrelid = dep.refobjid AND owner_column.attnum = dep.refobjsubid
+WHERE n.nspname = :schema_name AND s.relkind = 'S'
+ORDER BY s.relname
+"""
+
+# Order in which constraints are restored: keys first, foreign keys once every table has its keys
+_CONSTRAINT_ORDER = {"p": 0, "u": 1, "x": 2, "c": 3, "f": 4}
+
+def _use_schema(connection, schema_name):
+    connection.execute(text("SELECT set_config('search_path', :search_path, true)"),
+                       {"search_path": quote_identifier(schema_name)})
+
+def _execute_ddl(connection, statement):
+    # Straight to the driver: definitions copied from the catalog may contain text that
+    # SQLAlchemy's text() would mistake for bind parameters (e.g. ':x' inside a literal)
+    with connection.connection.cursor() as cursor:
+        cursor.execute(statement)
+
+def _qualified(schema_name, name):
+    return f"{quote_identifier(schema_name)}.{quote_identifier(name)}"
+
+def _copy_columns(table):
+    # Stored generated columns are computed by the server and cannot be copied in
+    return [column["name"] for column in table["columns"] if column["generated"] != "s"]
+
+def _copy_statement(schema_name, table, direction):
+    columns = ", ".join(quote_identifier(column) for column in _copy_columns(table))
+    return f"COPY {_qualified(schema_name, table['name'])} ({columns}) {direction} WITH (FORMAT csv)"
+
+# Read the structure of a schema into a manifest
+def describe_schema(connection, schema_name):
+    """
+    Describe the tables and sequences of a schema, in a form that can be replayed
+    into a schema with a different name.
+    :param connection: A connection with an open transaction.
+    :param schema_name: Name of the schema to describe.
+    :return: Dictionary with "tables" and "sequences".
+    """
+    _use_schema(connection, schema_name)
+    tables = []
+    for row in connection.execute(text(_TABLES_SQL), {"schema_name": schema_name}):
+        tables.append({
+            "name": row.name,
+            "columns": row.columns or [],
+            "constraints": sorted(row.constraints or [], key=lambda c: (_CONSTRAINT_ORDER[c["type"]], c["name"])),
+            "indexes": [
+                {
+                    "name": index["name"],
+                    "unique": index["definition"].startswith("CREATE UNIQUE"),
+                    # Everything from USING on is independent of the schema and table names
+                    "using": index["definition"][index["definition"].index(" USING "):],
+                }
+                for index in row.indexes or []
+            ],
+        })
+    sequences = [
+        {
+            "name": row.name,
+            "type": row.type,
+            "start": row.start,
+            "increment": row.increment,
+            "min_value": row.min_value,
+            "max_value": row.max_value,
+            "cycle": row.cycle,
+            "last_value": row.last_value,
+            "owned_by": {"table": row.owner_table, "column": row.owner_column} if row.owner_table else None,
+            "identity": bool(row.identity),
+        }
+        for row in connection.execute(text(_SEQUENCES_SQL), {"schema_name": schema_name})
+    ]
+    return {"tables": tables, "sequences": sequences}
+
+def _column_definition(column):
+    parts = [quote_identifier(column["name"]), column["type"]]
+    if column["generated"] == "s":
+        parts.append(f"GENERATED ALWAYS AS ({column['default']}) STORED")
+    elif column["identity"]:
+        parts.append("GENERATED ALWAYS AS IDENTITY" if column["identity"] == "a" else "GENERATED BY DEFAULT AS IDENTITY")
+    elif column["default"] is not None:
+        parts.append(f"DEFAULT {column['default']}")
+    if not column["nullable"]:
+        parts.append("NOT NULL")
+    return " ".join(parts)
+
+# Create sequences and bare tables, without keys or indexes so loading stays fast
+def create_tables(connection, schema_name, manifest):
+    """
+    Create the manifest's sequences and tables in a schema. Constraints and indexes
+    are left for finish_schema, after the data is loaded.
+    :param connection: A connection with an open transaction.
+    :param schema_name: Name of the (existing) target schema.
+    :param manifest: Structure returned by describe_schema.
+    """
+    _use_schema(connection, schema_name)
+    for sequence in manifest["sequences"]:
+        # Identity sequences are created together with their column
+        if sequence["identity"]:
+            continue
+        _execute_ddl(connection, (
+            f"CREATE SEQUENCE {_qualified(schema_name, sequence['name'])} AS {sequence['type']} "
+            f"INCREMENT BY {sequence['increment']} MINVALUE {sequence['min_value']} "
+            f"MAXVALUE {sequence['max_value']} START WITH {sequence['start']}"
+            f"{' CYCLE' if sequence['cycle'] else ''}"
+        ))
+    for table in manifest["tables"]:
+        columns = ", ".join(_column_definition(column) for column in table["columns"])
+        _execute_ddl(connection, f"CREATE TABLE {_qualified(schema_name, table['name'])} ({columns})")
+
+# Add keys, indexes and sequence positions once the data is in place
+def finish_schema(connection, schema_name, manifest):
+    """
+    Restore constraints, indexes, sequence ownership and sequence positions, then
+    ANALYZE the tables so the planner and the catalog's row estimates are current.
+    :param connection: A connection with an open transaction.
+    :param schema_name: Name of the target schema.
+    :param manifest: Structure returned by describe_schema.
+    """
+    _use_schema(connection, schema_name)
+    constraints = [(table["name"], constraint) for table in manifest["tables"] for constraint in table["constraints"]]
+    for table_name, constraint in sorted(constraints, key=lambda item: _CONSTRAINT_ORDER[item[1]["type"]]):
+        _execute_ddl(connection, (
+            f"ALTER TABLE {_qualified(schema_name, table_name)} "
+            f"ADD CONSTRAINT {quote_identifier(constraint['name'])} {constraint['definition']}"
+        ))
+    for table in manifest["tables"]:
+        for index in table["indexes"]:
+            _execute_ddl(connection, (
+                f"CREATE {'UNIQUE ' if index['unique'] else ''}INDEX {quote_identifier(index['name'])} "
+                f"ON {_qualified(schema_name, table['name'])}{index['using']}"
+            ))
+
+    for sequence in manifest["sequences"]:
+        owner = sequence["owned_by"]
+        if sequence["identity"]:
+            sequence_name = connection.execute(
+                text("SELECT pg_get_serial_sequence(:table, :column)"),
+                {"table": _qualified(schema_name, owner["table"]), "column": owner["column"]},
+            ).scalar()
+        else:
+            sequence_name = _qualified(schema_name, sequence["name"])
+            if owner:
+                _execute_ddl(connection, (
+                    f"ALTER SEQUENCE {sequence_name} OWNED BY "
+                    f"{_qualified(schema_name, owner['table'])}.{quote_identifier(owner['column'])}"
+                ))
+        if sequence["last_value"] is not None:
+            connection.execute(text("SELECT setval(CAST(:sequence AS regclass), :value, true)"),
+                               {"sequence": sequence_name, "value": sequence["last_value"]})
+
+    for table in manifest["tables"]:
+        _execute_ddl(connection, f"ANALYZE {_qualified(schema_name, table['name'])}")
+
+# Write a schema's structure and data to a .tar.gz archive
+def export_schema(schema_id):
+    """
+    Export a schema as a gzip-compressed tar archive holding manifest.json and one CSV
+    file per table, written by COPY TO. Everything is read in one REPEATABLE READ
+    transaction, so the archive is a consistent snapshot. Table data is spooled to
+    temporary files, so memory use does not depend on the schema's size.
+    :param schema_id: ID of the schema to export.
+    :return: Tuple of (schema_name, file object positioned at the start of the archive).
+    """
+    start = time.perf_counter()
+    archive = tempfile.TemporaryFile()
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="REPEATABLE READ")
+        connection.begin()
+        schema_name = connection.execute(text("SELECT schema_name FROM schemas WHERE schema_id = :schema_id"),
+                                         {"schema_id": schema_id}).scalar()
+        if not schema_name:
+            raise ValueError("Schema not found")
+
+        manifest = describe_schema(connection, schema_name)
+        manifest.update({
+            "format_version": ARCHIVE_FORMAT_VERSION,
+            "schema_name": schema_name,
+            "exported_at": datetime.now(timezone.utc).isoformat(),
+        })
+        with tarfile.open(fileobj=archive, mode="w:gz") as tar, connection.connection.cursor() as cursor:
+            data_files = []
+            for index, table in enumerate(manifest["tables"]):
+                data = tempfile.TemporaryFile()
+                cursor.copy_expert(_copy_statement(schema_name, table, "TO STDOUT"), data)
+                table["data"] = f"data/{index}.csv"
+                table["rows"] = cursor.rowcount
+                data_files.append(data)
+
+            # The manifest goes first so the importer can read the archive as a stream
+            encoded = json.dumps(manifest, indent=2, default=str).encode("utf-8")
+            info = tarfile.TarInfo("manifest.json")
+            info.size = len(encoded)
+            tar.addfile(info, io.BytesIO(encoded))
+            for table, data in zip(manifest["tables"], data_files):
+                info = tarfile.TarInfo(table["data"])
+                info.size = data.tell()
+                data.seek(0)
+                tar.addfile(info, data)
+                data.close()
+
+    archive.seek(0)
+    logging.info(f"Exported schema {schema_name} ({len(manifest['tables'])} tables) "
+                 f"in {time.perf_counter() - start:.2f} s")
+    return schema_name, archive
+
+def _copy_in(schema_name, table, data):
+    start = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.copy_expert(_copy_statement(schema_name, table, "FROM STDIN"), data)
+            rows = cursor.rowcount
+        connection.commit()
+    finally:
+        connection.close()
+        data.close()
+    return {"table_name": table["name"], "rows_loaded": rows, "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+def _drop_imported_schema(schema_name, schema_id):
+    try:
+        with transaction() as session:
+            session.execute(text(f"DROP SCHEMA IF EXISTS {quote_identifier(schema_name)} CASCADE"))
+            session.query(Schema).filter(Schema.schema_id == schema_id).delete()
+    except Exception as e:
+        logging.error(f"Could not clean up partially imported schema {schema_name}: {e}")
+
+# Restore an exported archive as a new schema
+def import_schema(stream, professor_id, schema_name=None):
+    """
+    Restore a schema archive produced by export_schema under a new name, registered as
+    a Schema owned by the importing professor.
+    The tables are created and committed first, then loaded with one COPY per table on
+    SCHEMA_IMPORT_WORKERS parallel connections, and only then are keys, indexes and
+    foreign keys added. If any step fails the new schema is dropped again.
+    :param stream: Binary file-like object with the .tar.gz archive.
+    :param professor_id: ID of the professor who becomes the schema's creator.
+    :param schema_name: Name for the new schema; defaults to the name in the archive.
+    :return: Dictionary with the new schema and per-table load statistics.
+    """
+    start = time.perf_counter()
+    data_files = {}
+    try:
+        with tarfile.open(fileobj=stream, mode="r|gz") as tar:
+            manifest = None
+            for member in tar:
+                if member.name == "manifest.json":
+                    manifest = json.load(tar.extractfile(member))
+                elif member.isfile():
+                    # Spool each table to disk so the loads can run in parallel
+                    data = tempfile.TemporaryFile()
+                    shutil.copyfileobj(tar.extractfile(member), data)
+                    data.seek(0)
+                    data_files[member.name] = data
+    except (tarfile.TarError, EOFError, OSError, ValueError) as e:
+        for data in data_files.values():
+            data.close()
+        raise ValueError(f"Invalid schema archive: {e}")
+
+    if not manifest or manifest.get("format_version") != ARCHIVE_FORMAT_VERSION:
+        for data in data_files.values():
+            data.close()
+        raise ValueError("Invalid schema archive: missing or unsupported manifest.json")
+
+    schema_name = schema_name or manifest["schema_name"]
+    if not _SCHEMA_NAME_PATTERN.match(schema_name):
+        raise ValueError("schema_name must start with a letter or underscore and contain only letters, digits and underscores")
+
+    with transaction() as session:
+        exists = session.execute(text("SELECT 1 FROM pg_namespace WHERE nspname = :name"), {"name": schema_name}).first()
+        if exists or session.query(Schema).filter(Schema.schema_name == schema_name).first():
+            raise ValueError(f"Schema {schema_name} already exists")
+        new_schema = Schema(schema_name=schema_name, created_by=professor_id)
+        session.add(new_schema)
+        # Flush before create_tables moves search_path away from the application tables
+        session.flush()
+        session.execute(text(f"CREATE SCHEMA {quote_identifier(schema_name)}"))
+        create_tables(session.connection(), schema_name, manifest)
+    schema_id = new_schema.schema_id
+    created = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=Config.SCHEMA_IMPORT_WORKERS, thread_name_prefix="schema-import") as executor:
+            futures = [
+                executor.submit(_copy_in, schema_name, table, data_files.pop(table["data"]))
+                for table in manifest["tables"]
+            ]
+            tables = [future.result() for future in futures]
+        loaded = time.perf_counter()
+
+        with transaction() as session:
+            finish_schema(session.connection(), schema_name, manifest)
+    except Exception:
+        _drop_imported_schema(schema_name, schema_id)
+        raise
+    finally:
+        for data in data_files.values():
+            data.close()
+
+    finished = time.perf_counter()
+    logging.info(f"Imported schema {schema_name} ({len(tables)} tables) in {finished - start:.2f} s")
+    return {
+        "schema_id": schema_id,
+        "schema_name": schema_name,
+        "created_by": professor_id,
+        "tables": tables,
+        "rows_loaded": sum(table["rows_loaded"] for table in tables),
+        "timings_ms": {
+            "create": round((created - start) * 1000, 3),
+            "load": round((loaded - created) * 1000, 3),
+            "constraints_and_indexes": round((finished - loaded) * 1000, 3),
+        },
+    }
+
+# Copy a schema, structure and data, into a new schema without leaving the server
+def clone_schema(schema_id, schema_name, professor_id):
+    """
+    Clone a schema into a new one registered as a Schema owned by the given professor.
+    Tables are created bare, filled with INSERT ... SELECT, and only then get their keys,
+    indexes and foreign keys, with sequences recreated in the new schema so the clone
+    never draws ids from the original. Everything runs in one transaction, so a failed
+    clone leaves nothing behind.
+    :param schema_id: ID of the schema to clone.
+    :param schema_name: Name of the new schema.
+    :param professor_id: ID of the professor who becomes the clone's creator.
+    :return: Dictionary with the new schema and per-table copy statistics.
+    """
+    start = time.perf_counter()
+    if not schema_name or not _SCHEMA_NAME_PATTERN.match(schema_name):
+        raise ValueError("schema_name must start with a letter or underscore and contain only letters, digits and underscores")
+
+    with transaction() as session:
+        source = session.query(Schema).get(schema_id)
+        if not source:
+            raise ValueError("Schema not found")
+        source_name = source.schema_name
+
+        exists = session.execute(text("SELECT 1 FROM pg_namespace WHERE nspname = :name"), {"name": schema_name}).first()
+        if exists or session.query(Schema).filter(Schema.schema_name == schema_name).first():
+            raise ValueError(f"Schema {schema_name} already exists")
+        new_schema = Schema(schema_name=schema_name, created_by=professor_id)
+        session.add(new_schema)
+        # Flush before describe_schema moves search_path away from the application tables
+        session.flush()
+
+        connection = session.connection()
+        manifest = describe_schema(connection, source_name)
+        _execute_ddl(connection, f"CREATE SCHEMA {quote_identifier(schema_name)}")
+        create_tables(connection, schema_name, manifest)
+        created = time.perf_counter()
+
+        tables = []
+        for table in manifest["tables"]:
+            table_start = time.perf_counter()
+            columns = ", ".join(quote_identifier(column) for column in _copy_columns(table))
+            overriding = " OVERRIDING SYSTEM VALUE" if any(column["identity"] == "a" for column in table["columns"]) else ""
+            with connection.connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {_qualified(schema_name, table['name'])} ({columns}){overriding} "
+                    f"SELECT {columns} FROM {_qualified(source_name, table['name'])}"
+                )
+                rows = cursor.rowcount
+            tables.append({"table_name": table["name"], "rows_loaded": rows,
+                           "elapsed_ms": round((time.perf_counter() - table_start) * 1000, 3)})
+        loaded = time.perf_counter()
+
+        finish_schema(connection, schema_name, manifest)
+
+    finished = time.perf_counter()
+    logging.info(f"Cloned schema {source_name} into {schema_name} ({len(tables)} tables) in {finished - start:.2f} s")
+    return {
+        "schema_id": new_schema.schema_id,
+        "schema_name": schema_name,
+        "created_by": professor_id,
+        "source_schema_id": schema_id,
+        "tables": tables,
+        "rows_loaded": sum(table["rows_loaded"] for table in tables),
+        "timings_ms": {
+            "create": round((created - start) * 1000, 3),
+            "copy": round((loaded - created) * 1000, 3),
+            "constraints_and_indexes": round((finished - loaded) * 1000, 3),
+        },
+    }
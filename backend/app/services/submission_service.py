@@ -1,88 +1,99 @@
 from app.db.models.submission import Submission
 from app.db.models.task import Task
-from app.db.session import SessionLocal
+from app.db.models.assignment import Assignment
+from sqlalchemy import case, null
+from app.db.session import get_session, transaction
 from sqlalchemy.orm import joinedload
 from app.db.models.schema import Schema  # Import the Schema model
+from app.core.config import Config
+from datetime import datetime, timedelta, timezone
+
+# Feedback for submissions whose grading never finished
+INTERRUPTED_FEEDBACK = "Grading was interrupted. Please submit your query again."
+
 # Submit a task solution
 def create_submission(data):
-    session = SessionLocal()
-    try:
-        assignment_id = data.get("assignment_id")
-        submitted_query = data.get("submitted_query")
-        time_taken = data.get("time_taken")
+    assignment_id = data.get("assignment_id")
+    submitted_query = data.get("submitted_query")
+    time_taken = data.get("time_taken")
 
-        if not assignment_id or not submitted_query or time_taken is None:
-            raise ValueError("assignment_id, submitted_query, and time_taken are required")
+    if not assignment_id or not submitted_query or time_taken is None:
+        raise ValueError("assignment_id, submitted_query, and time_taken are required")
 
+    with transaction() as session:
         new_submission = Submission(
             assignment_id=assignment_id,
             submitted_query=submitted_query,
-            is_correct=False,  # Initially, correctness is not determined
+            is_correct=data.get("is_correct", False),  # Initially, correctness is not determined
             time_taken=time_taken,
+            status=data.get("status", "graded"),
+            feedback=data.get("feedback"),
         )
         session.add(new_submission)
-        session.commit()
-
-        return {
-            "submission_id": new_submission.submission_id,
-            "assignment_id": new_submission.assignment_id,
-            "submitted_query": new_submission.submitted_query,
-            "is_correct": new_submission.is_correct,
-            "time_taken": new_submission.time_taken,
-            "submitted_at": new_submission.submitted_at,
-        }
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+
+    return {
+        "submission_id": new_submission.submission_id,
+        "assignment_id": new_submission.assignment_id,
+        "submitted_query": new_submission.submitted_query,
+        "is_correct": new_submission.is_correct,
+        "time_taken": new_submission.time_taken,
+        "status": new_submission.status,
+        "feedback": new_submission.feedback,
+        "submitted_at": new_submission.submitted_at,
+    }
 
 # List all submissions for a task or student
 def list_submissions(task_id=None, student_id=None):
-    session = SessionLocal()
-    try:
-        query = session.query(Submission)
-        if task_id:
-            query = query.filter(Submission.assignment.has(task_id=task_id))
-        if student_id:
-            query = query.filter(Submission.assignment.has(student_id=student_id))
-
-        submissions = query.all()
-        return [
-            {
-                "submission_id": s.submission_id,
-                "assignment_id": s.assignment_id,
-                "submitted_query": s.submitted_query,
-                "is_correct": s.is_correct,
-                "submitted_at": s.submitted_at,
-            }
-            for s in submissions
-        ]
-    finally:
-        session.close()
+    session = get_session()
+    query = session.query(Submission)
+    if task_id:
+        query = query.filter(Submission.assignment.has(task_id=task_id))
+    if student_id:
+        query = query.filter(Submission.assignment.has(student_id=student_id))
+
+    submissions = query.all()
+    return [
+        {
+            "submission_id": s.submission_id,
+            "assignment_id": s.assignment_id,
+            "submitted_query": s.submitted_query,
+            "is_correct": s.is_correct,
+            "status": s.status,
+            "feedback": s.feedback,
+            "submitted_at": s.submitted_at,
+        }
+        for s in submissions
+    ]
 
 # Fetch submission details
 def get_submission_by_id(submission_id):
-    session = SessionLocal()
-    try:
-        submission = session.query(Submission).get(submission_id)
-        if not submission:
-            raise ValueError("Submission not found")
-
-        return {
-            "submission_id": submission.submission_id,
-            "assignment_id": submission.assignment_id,
-            "submitted_query": submission.submitted_query,
-            "is_correct": submission.is_correct,
-            "submitted_at": submission.submitted_at,
-        }
-    finally:
-        session.close()
+    session = get_session()
+    submission = session.query(Submission).get(submission_id)
+    if not submission:
+        raise ValueError("Submission not found")
+
+    result = {
+        "submission_id": submission.submission_id,
+        "assignment_id": submission.assignment_id,
+        "submitted_query": submission.submitted_query,
+        "is_correct": submission.is_correct,
+        "time_taken": submission.time_taken,
+        "status": submission.status,
+        "feedback": submission.feedback,
+        "submitted_at": submission.submitted_at,
+    }
+
+    # A submission pending for this long was most likely lost with the queue of a restarted
+    # process. It is only reported as failed: the row stays pending, so a verdict that still
+    # arrives wins and the startup sweep queues it again
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=Config.GRADING_PENDING_TIMEOUT_SECONDS)
+    if submission.status == "pending" and submission.submitted_at < cutoff.replace(tzinfo=None):
+        result.update(status="failed", is_correct=False, feedback=INTERRUPTED_FEEDBACK)
+    return result
 
 # Evaluate a submission
 def evaluate_submission(submission_id):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         submission = session.query(Submission).get(submission_id)
         if not submission:
             raise ValueError("Submission not found")
@@ -93,58 +104,106 @@ def evaluate_submission(submission_id):
 
         # Evaluate correctness
         submission.is_correct = submission.submitted_query.strip().lower() == task.correct_answer.strip().lower()
-        session.commit()
 
-        return {"is_correct": submission.is_correct}
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+    return {"is_correct": submission.is_correct}
 
 def update_submission_correctness(submission_id, is_correct):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         submission = session.query(Submission).get(submission_id)
         if not submission:
             raise ValueError("Submission not found")
 
         submission.is_correct = is_correct
-        session.commit()
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
 
+# Store the verdict of an asynchronous grading run
+def record_grading_result(submission_id, is_correct, feedback, status="graded"):
+    with transaction() as session:
+        submission = session.query(Submission).get(submission_id)
+        if not submission:
+            raise ValueError("Submission not found")
 
+        submission.is_correct = is_correct
+        submission.feedback = feedback
+        submission.status = status
+        # Time only counts towards the leaderboard for correct submissions
+        if not is_correct:
+            submission.time_taken = None
+
+
+# Fetch the submissions still waiting for a verdict
+def list_pending_submissions():
+    """
+    :return: List of (submission_id, assignment_id, submitted_query) tuples, oldest first.
+    """
+    session = get_session()
+    rows = (
+        session.query(Submission.submission_id, Submission.assignment_id, Submission.submitted_query)
+        .filter(Submission.status == "pending")
+        .order_by(Submission.submission_id)
+        .all()
+    )
+    return [(row.submission_id, row.assignment_id, row.submitted_query) for row in rows]
+
+# Fetch (submission_id, submitted_query) pairs for every submission of a task
+def list_task_submission_queries(task_id):
+    session = get_session()
+    rows = (
+        session.query(Submission.submission_id, Submission.submitted_query)
+        .join(Assignment, Submission.assignment_id == Assignment.assignment_id)
+        .filter(Assignment.task_id == task_id)
+        .all()
+    )
+    return [(row.submission_id, row.submitted_query) for row in rows]
+
+# Store many verdicts with a single UPDATE statement
+def bulk_update_verdicts(verdicts):
+    """
+    Update is_correct and feedback for many submissions at once. Like record_grading_result,
+    it clears time_taken of incorrect submissions so they drop off the leaderboard.
+    :param verdicts: Dictionary of submission_id -> {"is_correct": bool, "feedback": str}.
+    :return: Number of updated rows.
+    """
+    if not verdicts:
+        return 0
+    incorrect = [sid for sid, v in verdicts.items() if not v["is_correct"]]
+    with transaction() as session:
+        submission_id = Submission.submission_id
+        updated = (
+            session.query(Submission)
+            .filter(submission_id.in_(list(verdicts)))
+            .update({
+                Submission.is_correct: case({sid: v["is_correct"] for sid, v in verdicts.items()}, value=submission_id),
+                Submission.feedback: case({sid: v["feedback"] for sid, v in verdicts.items()}, value=submission_id),
+                Submission.time_taken: case((submission_id.in_(incorrect), null()), else_=Submission.time_taken),
+                Submission.status: "graded",
+            }, synchronize_session=False)
+        )
+    return updated
 
 def get_task_by_id(task_id):
-    session = SessionLocal()
-    try:
-        # Fetch the task and eagerly load the schema relationship
-        task = session.query(Task).options(joinedload(Task.schema)).filter(Task.task_id == task_id).first()
-        if not task:
-            return None
-
-        # Access the schema_name using the relationship
-        schema_name = task.schema.schema_name if task.schema else None
-
-        # Return the task details, including schema_name
-        return {
-            "task_id": task.task_id,
-            "task_title": task.task_title,
-            "task_description": task.task_description,
-            "course_id": task.course_id,
-            "session_id": task.session_id,
-            "schema_id": task.schema_id,
-            "schema_name": schema_name,  # Include schema_name
-            "correct_answer": task.correct_answer,
-            "difficulty": task.difficulty,
-            "tags": task.tags,
-            "deadline": str(task.deadline),
-            "created_at": str(task.created_at),
-            "published": task.published,
-        }
-    finally:
-        session.close()
\ No newline at end of file
+    session = get_session()
+    # Fetch the task and eagerly load the schema relationship
+    task = session.query(Task).options(joinedload(Task.schema)).filter(Task.task_id == task_id).first()
+    if not task:
+        return None
+
+    # Access the schema_name using the relationship
+    schema_name = task.schema.schema_name if task.schema else None
+
+    # Return the task details, including schema_name
+    return {
+        "task_id": task.task_id,
+        "task_title": task.task_title,
+        "task_description": task.task_description,
+        "course_id": task.course_id,
+        "session_id": task.session_id,
+        "schema_id": task.schema_id,
+        "schema_name": schema_name,  # Include schema_name
+        "correct_answer": task.correct_answer,
+        "difficulty": task.difficulty,
+        "tags": task.tags,
+        "deadline": str(task.deadline),
+        "created_at": str(task.created_at),
+        "published": task.published,
+        "reference_fingerprint": task.reference_fingerprint(),
+    }
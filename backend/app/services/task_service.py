@@ -1,12 +1,64 @@
 from app.db.models.task import Task
 from app.db.models.course import Course
-from app.db.session import SessionLocal
+from app.db.session import get_session, transaction, run_after_commit
 from app.db.models.schema import Schema
+from app.db.models.session import Session as CourseSession
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from sqlalchemy import any_, func, literal
 from sqlalchemy.orm import Session
+from app.core.config import Config
+from app.utils.query_executor import warm_reference_result, fingerprint_query, GradingBusy, BUSY_FEEDBACK
+from app.utils.result_cache import invalidate_task, reference_cache, get_schema_version
+from app.utils.response_cache import response_cache
+from app.utils.sql_normalizer import sql_hash
+import base64
+import json
 import logging
+import time
+
+# Run a reference answer once and summarize its result
+def _run_reference(schema_name, correct_answer):
+    """
+    Execute a reference answer and fingerprint its result.
+    :param schema_name: Name of the task's schema.
+    :param correct_answer: The reference SQL query.
+    :return: Tuple (fingerprint, schema version it was computed against, execution time in ms).
+    :raises ValueError: If the reference answer cannot be executed, or no grading connection is free.
+    """
+    # Capture the version before running so a concurrent schema change is never cached as current
+    version = get_schema_version(schema_name)
+    start = time.perf_counter()
+    try:
+        fingerprint = fingerprint_query(schema_name, correct_answer)
+    except GradingBusy:
+        raise ValueError(f"The reference answer could not be executed: {BUSY_FEEDBACK}")
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+    if "error" in fingerprint:
+        raise ValueError(f"The reference answer could not be executed: {fingerprint['error']}")
+    return fingerprint, version, elapsed_ms
+
+def _apply_reference(task, schema_name, reference):
+    # The fingerprint is also put in the reference cache once the surrounding transaction commits
+    fingerprint, version, elapsed_ms = reference
+    task.reference_row_count = fingerprint["row_count"]
+    task.reference_columns = fingerprint["columns"]
+    task.reference_digest = fingerprint["unordered_digest"]
+    task.reference_ordered_digest = fingerprint["ordered_digest"]
+    task.reference_execution_ms = elapsed_ms
+    run_after_commit(reference_cache.put, task.task_id, schema_name, version, sql_hash(task.correct_answer), fingerprint)
+
+# Run a task's reference answer and keep its result fingerprint on the task
+def _store_reference_fingerprint(task, schema_name):
+    """
+    :param task: Task with its correct_answer set; flushed, so it has a task_id.
+    :param schema_name: Name of the task's schema.
+    :raises ValueError: If the reference answer cannot be executed.
+    """
+    _apply_reference(task, schema_name, _run_reference(schema_name, task.correct_answer))
+
 # Create a new task
 def create_task(data):
-    session = SessionLocal()
     try:
         logging.info(f"Creating task with data: {data}")
         task_title = data.get("task_title")
@@ -23,55 +75,53 @@ def create_task(data):
         if not task_title or not task_description or not course_id or not session_id or not schema_id or not correct_answer:
             raise ValueError("Missing required fields for task creation")
 
-        # Check if the provided schema_id exists
-        schema_exists = session.query(Schema).filter(Schema.schema_id == schema_id).first()
-        if not schema_exists:
-            raise ValueError(f"Schema with ID {schema_id} does not exist.")
-
-        # Create the new task
-        new_task = Task(
-            task_title=task_title,
-            task_description=task_description,
-            course_id=course_id,
-            session_id=session_id,
-            schema_id=schema_id,
-            correct_answer=correct_answer,
-            difficulty=difficulty,
-            tags=tags,
-            deadline=deadline,
-        )
-
-        session.add(new_task)
-        session.commit()
+        with transaction() as session:
+            # Check if the provided schema_id exists
+            schema_exists = session.query(Schema).filter(Schema.schema_id == schema_id).first()
+            if not schema_exists:
+                raise ValueError(f"Schema with ID {schema_id} does not exist.")
+
+            # Create the new task
+            new_task = Task(
+                task_title=task_title,
+                task_description=task_description,
+                course_id=course_id,
+                session_id=session_id,
+                schema_id=schema_id,
+                correct_answer=correct_answer,
+                difficulty=difficulty,
+                tags=tags,
+                deadline=deadline,
+            )
+
+            session.add(new_task)
+            session.flush()
+            # Run the reference answer once: broken answers are rejected and the first submissions hit the cache
+            _store_reference_fingerprint(new_task, schema_exists.schema_name)
+            run_after_commit(response_cache.invalidate, "tasks")
         logging.info(f"Task created successfully with ID: {new_task.task_id}")
         return new_task.to_dict()
     except Exception as e:
-        session.rollback()
         logging.error(f"Error creating task: {e}")
         raise e
-    finally:
-        session.close()
 
 
 # Fetch task details by ID
 def get_task_by_id(task_id):
-    session = SessionLocal()
-    try:
-        task = session.query(Task).get(task_id)
-        if not task:
-            raise ValueError("Task not found")
-        return task.to_dict()
-    finally:
-        session.close()
+    session = get_session()
+    task = session.query(Task).get(task_id)
+    if not task:
+        raise ValueError("Task not found")
+    return task.to_dict()
 
 # Update task details
 def update_task(task_id, data):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         task = session.query(Task).get(task_id)
         if not task:
             raise ValueError("Task not found")
 
+        previous_answer = task.correct_answer
         task.task_title = data.get("task_title", task.task_title)
         task.task_description = data.get("task_description", task.task_description)
         task.correct_answer = data.get("correct_answer", task.correct_answer)
@@ -83,34 +133,56 @@ def update_task(task_id, data):
         if "published" in data:
             task.published = data["published"]
 
-        session.commit()
-        return task.to_dict()
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+        # A new reference answer is run once, and its cached result and verdicts are dropped;
+        # other edits leave a missing fingerprint to grading and backfill_reference_results
+        if task.correct_answer != previous_answer:
+            run_after_commit(invalidate_task, task_id)
+            _store_reference_fingerprint(task, task.schema.schema_name)
+        run_after_commit(response_cache.invalidate, "tasks", f"task:{task_id}")
+    return task.to_dict()
 
 # Delete a task
 def delete_task(task_id):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         task = session.query(Task).get(task_id)
         if not task:
             raise ValueError("Task not found")
 
         session.delete(task)
-        session.commit()
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+        run_after_commit(invalidate_task, task_id)
+        run_after_commit(response_cache.invalidate, "tasks", f"task:{task_id}")
+
+# Store the reference fingerprint of every task that has none
+def backfill_reference_results():
+    """
+    Run the reference answer of each task without a stored fingerprint, such as tasks
+    created before fingerprints were stored or whose schema has changed since. Each task
+    is saved in its own transaction; tasks whose reference answer fails are left as they are.
+    :return: Tuple (number of tasks updated, list of {"task_id", "error"} for the failures).
+    """
+    session = get_session()
+    task_ids = [task_id for (task_id,) in
+                session.query(Task.task_id).filter(Task.reference_row_count.is_(None)).order_by(Task.task_id)]
+    updated = 0
+    failures = []
+    for task_id in task_ids:
+        try:
+            with transaction() as session:
+                task = session.query(Task).get(task_id)
+                if task is None or task.reference_row_count is not None:
+                    continue
+                _store_reference_fingerprint(task, task.schema.schema_name)
+                run_after_commit(response_cache.invalidate, f"task:{task_id}")
+            updated += 1
+        except ValueError as e:
+            logging.warning(f"Could not backfill the reference result of task {task_id}: {e}")
+            failures.append({"task_id": task_id, "error": str(e)})
+    return updated, failures
 
 # Check if a professor owns a course
 def professor_owns_course(professor_id: int, course_id: int) -> bool:
     """Check if the professor owns the given course_id."""
-    session = SessionLocal()
+    session = get_session()
     try:
         return session.query(Course).filter(
             Course.course_id == course_id,
@@ -120,12 +192,9 @@ def professor_owns_course(professor_id: int, course_id: int) -> bool:
         session.rollback()
         print(f"Error checking course ownership: {str(e)}")
         return False
-    finally:
-        session.close()
 
 def publish_task(task_id):
-    session = SessionLocal()
-    try:
+    with transaction() as session:
         # Fetch the task by ID
         task = session.query(Task).get(task_id)
         if not task:
@@ -133,29 +202,247 @@ def publish_task(task_id):
 
         # Mark the task as published
         task.published = True
-        session.commit()
+        run_after_commit(response_cache.invalidate, "tasks", f"task:{task_id}")
+        # Tasks with a stored fingerprint are graded against it without running the reference
+        if task.reference_row_count is None:
+            run_after_commit(warm_reference_result, task.task_id, task.schema.schema_name, task.correct_answer)
+    return task.to_dict()
 
-        return task.to_dict()
-    except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+# Columns a task listing can return; correct_answer is never part of a listing
+LIST_FIELDS = ("task_id", "task_title", "task_description", "course_id", "session_id", "schema_id",
+               "difficulty", "tags", "deadline", "created_at", "published")
+
+def _encode_cursor(task_id):
+    return base64.urlsafe_b64encode(json.dumps([task_id]).encode("utf-8")).decode("ascii")
 
-def list_tasks(course_id=None, session_id=None, include_unpublished=False):
-    session = SessionLocal()
+def _decode_cursor(cursor):
     try:
-        query = session.query(Task)
-        if course_id:
-            query = query.filter(Task.course_id == course_id)
-        if session_id:
-            query = query.filter(Task.session_id == session_id)
-
-        # Filter out unpublished tasks unless explicitly requested
-        if not include_unpublished:
-            query = query.filter(Task.published == True)
-
-        tasks = query.all()
-        return [task.to_dict(hide_correct_answer=True) for task in tasks]
-    finally:
-        session.close()
\ No newline at end of file
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != 1 or not isinstance(values[0], int):
+        raise ValueError("Invalid cursor")
+    return values[0]
+
+# List tasks one page at a time
+def list_tasks(course_id=None, session_id=None, include_unpublished=False, difficulty=None, tags=None,
+               deadline_from=None, deadline_to=None, fields=None, after=None, limit=None):
+    """
+    List tasks in task_id order with keyset pagination. Every filter is applied in SQL
+    and only the requested columns are loaded.
+    :param course_id: Only tasks of this course.
+    :param session_id: Only tasks of this session.
+    :param include_unpublished: Whether unpublished tasks may be listed at all.
+    :param difficulty: List of difficulties to include.
+    :param tags: List of tags that must all be among a task's comma-separated tags.
+    :param deadline_from: Earliest deadline, inclusive (YYYY-MM-DD).
+    :param deadline_to: Latest deadline, inclusive (YYYY-MM-DD).
+    :param fields: Columns to return, a subset of LIST_FIELDS; defaults to all of them.
+    :param after: Cursor returned as next_cursor by the previous page.
+    :param limit: Tasks per page, capped at TASK_PAGE_SIZE_MAX.
+    :return: Dictionary with the tasks and next_cursor (None on the last page).
+    """
+    fields = list(fields or LIST_FIELDS)
+    unknown = [field for field in fields if field not in LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    limit = min(limit or Config.TASK_PAGE_SIZE, Config.TASK_PAGE_SIZE_MAX)
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+
+    session = get_session()
+    # task_id is always selected, it is the pagination key
+    columns = [getattr(Task, field) for field in dict.fromkeys(["task_id"] + fields)]
+    query = session.query(*columns)
+    if course_id:
+        query = query.filter(Task.course_id == course_id)
+    if session_id:
+        query = query.filter(Task.session_id == session_id)
+
+    # Filter out unpublished tasks unless explicitly requested
+    if not include_unpublished:
+        query = query.filter(Task.published == True)
+    if difficulty:
+        invalid = [value for value in difficulty if value not in ("easy", "medium", "hard")]
+        if invalid:
+            raise ValueError(f"Invalid difficulty: {', '.join(invalid)}")
+        query = query.filter(Task.difficulty.in_(difficulty))
+    if tags:
+        # Both sides are lowercased with spaces removed, so "Left Join" matches "left join, joins"
+        task_tags = func.string_to_array(func.replace(func.lower(Task.tags), " ", ""), ",")
+        for tag in tags:
+            query = query.filter(literal(tag.lower().replace(" ", "")) == any_(task_tags))
+    try:
+        if deadline_from:
+            query = query.filter(Task.deadline >= date.fromisoformat(deadline_from))
+        if deadline_to:
+            query = query.filter(Task.deadline <= date.fromisoformat(deadline_to))
+    except ValueError:
+        raise ValueError("deadline_from and deadline_to must be dates in YYYY-MM-DD format")
+    if after:
+        query = query.filter(Task.task_id > _decode_cursor(after))
+
+    # One extra row tells whether there is a next page
+    rows = query.order_by(Task.task_id).limit(limit + 1).all()
+    next_cursor = _encode_cursor(rows[limit - 1].task_id) if len(rows) > limit else None
+    tasks = []
+    for row in rows[:limit]:
+        task = {}
+        for field in fields:
+            value = getattr(row, field)
+            task[field] = str(value) if field in ("deadline", "created_at") else value
+        tasks.append(task)
+    return {"tasks": tasks, "next_cursor": next_cursor}
+
+TASK_IMPORT_FIELDS = ("task_title", "task_description", "course_id", "session_id", "schema_id", "difficulty",
+                      "deadline", "correct_answer")
+
+# Parse an uploaded list of tasks
+def parse_task_document(raw, file_format="json"):
+    """
+    Read a task import document: a list of task objects, or an object with a "tasks" list.
+    :param raw: Document text or bytes.
+    :param file_format: "json" or "yaml"; YAML needs the optional PyYAML package.
+    :return: List of task dictionaries.
+    """
+    if file_format == "yaml":
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML import requires the optional 'PyYAML' package")
+        try:
+            document = yaml.safe_load(raw)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML: {e}")
+    else:
+        try:
+            document = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"Invalid JSON: {e}")
+
+    if isinstance(document, dict):
+        document = document.get("tasks")
+    if not isinstance(document, list) or not document:
+        raise ValueError("Expected a non-empty list of tasks")
+    return document
+
+def _task_errors(data):
+    if not isinstance(data, dict):
+        return ["Each task must be an object"]
+    errors = [f"Missing required field: {field}" for field in TASK_IMPORT_FIELDS if not data.get(field)]
+    for field in ("course_id", "session_id", "schema_id"):
+        if data.get(field) and (isinstance(data[field], bool) or not isinstance(data[field], int)):
+            errors.append(f"{field} must be an integer")
+    if data.get("difficulty") and data["difficulty"] not in ("easy", "medium", "hard"):
+        errors.append("Invalid difficulty level. Choose from 'easy', 'medium', 'hard'")
+    if data.get("deadline"):
+        try:
+            date.fromisoformat(str(data["deadline"]))
+        except ValueError:
+            errors.append("deadline must be a date in YYYY-MM-DD format")
+    return errors
+
+# Create many tasks at once, verifying every reference answer first
+def import_tasks(tasks, professor_id):
+    """
+    Validate a list of tasks, run their reference answers in parallel on TASK_IMPORT_WORKERS
+    threads and insert them all in one transaction. Nothing is inserted if any task fails.
+    Course ownership, sessions and schemas are checked with one query each.
+    :param tasks: List of task dictionaries with the same fields as create_task.
+    :param professor_id: ID of the professor importing the tasks; they must own every course.
+    :return: Tuple (imported, report): whether the tasks were inserted, and a dictionary with
+             per-task diagnostics and the time spent in each phase.
+    """
+    if len(tasks) > Config.TASK_IMPORT_MAX_TASKS:
+        raise ValueError(f"At most {Config.TASK_IMPORT_MAX_TASKS} tasks can be imported at once")
+
+    start = time.perf_counter()
+    results = []
+    for index, data in enumerate(tasks):
+        errors = _task_errors(data)
+        title = data.get("task_title") if isinstance(data, dict) else None
+        results.append({"index": index, "task_title": title, "status": "invalid" if errors else "valid", "errors": errors})
+    valid = [index for index, result in enumerate(results) if not result["errors"]]
+
+    session = get_session()
+    course_ids = {tasks[index]["course_id"] for index in valid}
+    session_ids = {tasks[index]["session_id"] for index in valid}
+    schema_ids = {tasks[index]["schema_id"] for index in valid}
+    owned = {course_id for (course_id,) in session.query(Course.course_id).filter(
+        Course.course_id.in_(course_ids), Course.professor_id == professor_id)}
+    session_courses = dict(session.query(CourseSession.session_id, CourseSession.course_id).filter(
+        CourseSession.session_id.in_(session_ids)))
+    schema_names = dict(session.query(Schema.schema_id, Schema.schema_name).filter(Schema.schema_id.in_(schema_ids)))
+    for index in valid:
+        data, errors = tasks[index], results[index]["errors"]
+        if data["course_id"] not in owned:
+            errors.append("Unauthorized - You do not own this course")
+        if session_courses.get(data["session_id"]) != data["course_id"]:
+            errors.append(f"Session {data['session_id']} does not exist in course {data['course_id']}")
+        if data["schema_id"] not in schema_names:
+            errors.append(f"Schema with ID {data['schema_id']} does not exist.")
+    valid = [index for index in valid if not results[index]["errors"]]
+    validation_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    # Identical reference answers on the same schema run once
+    verify_start = time.perf_counter()
+    references = {}
+    with ThreadPoolExecutor(max_workers=Config.TASK_IMPORT_WORKERS, thread_name_prefix="task-import") as executor:
+        futures = {}
+        for index in valid:
+            key = (schema_names[tasks[index]["schema_id"]], tasks[index]["correct_answer"])
+            if key not in futures:
+                futures[key] = executor.submit(_run_reference, *key)
+        for key, future in futures.items():
+            try:
+                references[key] = future.result()
+            except ValueError as e:
+                references[key] = e
+    for index in valid:
+        reference = references[(schema_names[tasks[index]["schema_id"]], tasks[index]["correct_answer"])]
+        if isinstance(reference, ValueError):
+            results[index]["errors"].append(str(reference))
+        else:
+            fingerprint, _, elapsed_ms = reference
+            results[index]["reference"] = {"row_count": fingerprint["row_count"], "columns": fingerprint["columns"],
+                                           "execution_ms": elapsed_ms}
+    verification_ms = round((time.perf_counter() - verify_start) * 1000, 3)
+
+    report = {"tasks": results, "timings": {"validation_ms": validation_ms, "verification_ms": verification_ms}}
+    failed = [result for result in results if result["errors"]]
+    if failed:
+        for result in failed:
+            result["status"] = "invalid"
+        report["timings"]["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return False, report
+
+    insert_start = time.perf_counter()
+    with transaction() as session:
+        created = []
+        for data in tasks:
+            task = Task(
+                task_title=data["task_title"],
+                task_description=data["task_description"],
+                course_id=data["course_id"],
+                session_id=data["session_id"],
+                schema_id=data["schema_id"],
+                correct_answer=data["correct_answer"],
+                difficulty=data["difficulty"],
+                tags=data.get("tags"),
+                deadline=date.fromisoformat(str(data["deadline"])),
+            )
+            session.add(task)
+            created.append(task)
+        session.flush()
+        for data, task in zip(tasks, created):
+            schema_name = schema_names[data["schema_id"]]
+            _apply_reference(task, schema_name, references[(schema_name, data["correct_answer"])])
+        run_after_commit(response_cache.invalidate, "tasks")
+
+    for result, task in zip(results, created):
+        result["status"] = "created"
+        result["task_id"] = task.task_id
+    report["timings"]["insert_ms"] = round((time.perf_counter() - insert_start) * 1000, 3)
+    report["timings"]["total_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    logging.info(f"Imported {len(created)} tasks for professor {professor_id} in {report['timings']['total_ms']} ms")
+    return True, report
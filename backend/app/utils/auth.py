@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from sqlalchemy.exc import SQLAlchemyError
 from app.db.models.user import User  # Assuming a User model exists
-from app.db.session import SessionLocal
+from app.db.session import get_session
 
 auth_blueprint = Blueprint("auth", __name__)
 
@@ -12,14 +12,13 @@ def is_instructor(user_id):
     :param user_id: ID of the user to check.
     :return: True if the user is an instructor, False if not, or None if the user doesn't exist.
     """
-    session = SessionLocal()
+    session = get_session()
     try:
         user = session.query(User).filter(User.user_id == user_id).first()
         if not user:
             return None  # User not found
         return user.role == "instructor"
     except SQLAlchemyError as e:
+        session.rollback()
         print(f"Database error: {e}")  # Debugging/logging
-        return False
-    finally:
-        session.close()
\ No newline at end of file
+        return False
\ No newline at end of file
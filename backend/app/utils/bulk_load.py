@@ -0,0 +1,122 @@
+import json
+import time
+from psycopg2.extras import execute_values
+from app.core.config import Config
+
+def _copy_field(value):
+    # An unquoted empty field is NULL in CSV mode, a quoted one is the empty string
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+class TextStream:
+    """
+    File-like view over an iterator of text chunks, so COPY can pull data as it needs
+    it while only one chunk is held in memory.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+class RowStream(TextStream):
+    """TextStream that encodes an iterator of rows as CSV lines on demand."""
+
+    def __init__(self, rows):
+        super().__init__(self._encode(rows))
+        self.count = 0
+
+    def _encode(self, rows):
+        for row in rows:
+            self.count += 1
+            yield ",".join(_copy_field(value) for value in row) + "\n"
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Load rows with COPY ... FROM STDIN in CSV format.
+    :param cursor: A psycopg2 cursor inside the caller's transaction.
+    :param table: Schema-qualified table name.
+    :param columns: Column names (already quoted if needed), in the order of the values in each row.
+    :param rows: Iterable of value sequences; it is consumed lazily.
+    :return: Number of rows loaded.
+    """
+    stream = RowStream(rows)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", stream,
+                       size=Config.COPY_CHUNK_SIZE)
+    return stream.count
+
+def copy_text(cursor, table, columns, chunks):
+    """
+    Load text that is already encoded as CSV lines with COPY ... FROM STDIN.
+    :param cursor: A psycopg2 cursor inside the caller's transaction.
+    :param table: Schema-qualified table name.
+    :param columns: Column names (already quoted if needed), in the order of the fields in each line.
+    :param chunks: Iterable of strings made of whole CSV lines; it is consumed lazily.
+    """
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", TextStream(chunks),
+                       size=Config.COPY_CHUNK_SIZE)
+
+def insert_rows(cursor, table, columns, rows):
+    """
+    Load rows with multi-row INSERT statements of BULK_INSERT_PAGE_SIZE rows each.
+    :param cursor: A psycopg2 cursor inside the caller's transaction.
+    :param table: Schema-qualified table name.
+    :param columns: Column names, in the order of the values in each row.
+    :param rows: List of value sequences.
+    :return: Number of rows loaded.
+    """
+    rows = [[json.dumps(value) if isinstance(value, (dict, list)) else value for value in row] for row in rows]
+    execute_values(cursor, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s", rows,
+                   page_size=Config.BULK_INSERT_PAGE_SIZE)
+    return len(rows)
+
+# Load a list of row dictionaries as fast as the batch size allows
+def load_rows(connection, table, rows):
+    """
+    Insert row dictionaries into a table. Rows are grouped by their set of keys; each
+    group is sent with batched INSERTs, or with COPY once it reaches COPY_THRESHOLD rows.
+    :param connection: The DBAPI connection of the caller's transaction.
+    :param table: Schema-qualified table name.
+    :param rows: List of dictionaries mapping column names to values.
+    :return: Dictionary with rows_loaded, method, elapsed_ms and rows_per_second.
+    """
+    start = time.perf_counter()
+    groups = {}
+    for row in rows:
+        if not row:
+            raise ValueError("Every row must contain at least one column")
+        # Key order does not matter, each group uses the columns of its first row
+        groups.setdefault(frozenset(row), (tuple(row), []))[1].append(row)
+
+    loaded = 0
+    methods = set()
+    with connection.cursor() as cursor:
+        for columns, group in groups.values():
+            values = ([row[column] for column in columns] for row in group)
+            if len(group) >= Config.COPY_THRESHOLD:
+                loaded += copy_rows(cursor, table, columns, values)
+                methods.add("copy")
+            else:
+                loaded += insert_rows(cursor, table, columns, list(values))
+                methods.add("insert")
+
+    elapsed = time.perf_counter() - start
+    return {
+        "rows_loaded": loaded,
+        "method": "+".join(sorted(methods)) or "none",
+        "elapsed_ms": round(elapsed * 1000, 3),
+        "rows_per_second": round(loaded / elapsed, 1) if elapsed > 0 else None,
+    }
@@ -0,0 +1,60 @@
+from flask import g, has_request_context
+from sqlalchemy import bindparam, text
+from app.db.session import engine
+
+_SELECT_SQL = text("SELECT cache_key, version FROM cache_versions WHERE cache_key IN :keys").bindparams(
+    bindparam("keys", expanding=True))
+_BUMP_SQL = text("""
+    INSERT INTO cache_versions (cache_key, version) VALUES (:key, 1)
+    ON CONFLICT (cache_key) DO UPDATE SET version = cache_versions.version + 1
+""")
+
+def _request_memo():
+    # Versions read during a request are reused for the rest of it; a key the request bumps
+    # maps to None and is read again every time
+    if not has_request_context():
+        return None
+    if "cache_versions" not in g:
+        g.cache_versions = {}
+    return g.cache_versions
+
+# Read the current versions of cached value families
+def get_versions(keys):
+    """
+    Look up version counters in the database, so that every worker process agrees on them.
+    Within a request each counter is read once, so cache hits do not pay a round trip each.
+    :param keys: Counter names, e.g. "schema:shop".
+    :return: Dictionary mapping each key to its version; keys never bumped are at 0.
+    """
+    keys = list(keys)
+    memo = _request_memo()
+    versions = {key: memo[key] for key in keys if memo and memo.get(key) is not None}
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        # Its own short connection, as grading threads have no request session
+        with engine.connect() as connection:
+            found = dict(connection.execute(_SELECT_SQL, {"keys": missing}).fetchall())
+        for key in missing:
+            versions[key] = found.get(key, 0)
+            if memo is not None and key not in memo:
+                memo[key] = versions[key]
+    return versions
+
+# Move version counters forward so values cached under the old versions are no longer served
+def bump_versions(keys, session=None):
+    """
+    :param keys: Counter names to increment.
+    :param session: Session of an open transaction to bump in, so the new versions commit
+                    together with the change they announce; defaults to a transaction of its own.
+    """
+    params = [{"key": key} for key in keys]
+    if not params:
+        return
+    memo = _request_memo()
+    if memo is not None:
+        memo.update((param["key"], None) for param in params)
+    if session is not None:
+        session.execute(_BUMP_SQL, params)
+    else:
+        with engine.begin() as connection:
+            connection.execute(_BUMP_SQL, params)
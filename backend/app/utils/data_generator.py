@@ -0,0 +1,231 @@
+import re
+import secrets
+from datetime import date, datetime, timezone
+from app.core.config import Config
+
+GENERATORS = ("sequence", "integer", "float", "normal", "categorical", "zipf", "date", "timestamp", "text", "reference")
+# ISO forms that NumPy parses the same way as Python; compact forms like 20240101 are read differently
+_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+_TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?)?(Z|[+-]\d{2}:\d{2})?")
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ValueError("Data generation requires the optional 'numpy' package")
+    return numpy
+
+def _quote(value):
+    # Same CSV encoding as bulk_load: unquoted empty means NULL
+    if value is None:
+        return ""
+    return '"' + str(value).replace('"', '""') + '"'
+
+def _number(column, options, key, default=None):
+    value = options.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Column {column}: '{key}' must be a number")
+    return value
+
+def _integer(column, options, key, default=None):
+    value = options.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"Column {column}: '{key}' must be an integer")
+    return value
+
+def _parse_instant(column, value, key, as_date):
+    pattern = _DATE_PATTERN if as_date else _TIMESTAMP_PATTERN
+    try:
+        if not pattern.fullmatch(value):
+            raise ValueError(value)
+        return date.fromisoformat(value) if as_date else datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        raise ValueError(f"Column {column}: '{key}' must be an ISO {'date (YYYY-MM-DD)' if as_date else 'timestamp'}")
+
+# Check a generation spec and fill in defaults
+def validate_spec(spec, table_columns):
+    """
+    Validate a data generation spec against the columns of the target table.
+    :param spec: Dictionary with "rows", an optional "seed" and "columns", mapping column
+                 names to generator options ({"generator": ..., "null_fraction": ..., ...}).
+    :param table_columns: Names of the target table's columns.
+    :return: The normalized spec, with the seed that will be used.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("The generation spec must be an object")
+    rows = spec.get("rows")
+    if isinstance(rows, bool) or not isinstance(rows, int) or rows < 1:
+        raise ValueError("'rows' must be a positive integer")
+    if rows > Config.DATA_GENERATOR_MAX_ROWS:
+        raise ValueError(f"At most {Config.DATA_GENERATOR_MAX_ROWS} rows can be generated at once")
+    seed = spec.get("seed")
+    if seed is None:
+        seed = secrets.randbits(32)
+    elif isinstance(seed, bool) or not isinstance(seed, int) or seed < 0:
+        raise ValueError("'seed' must be a non-negative integer")
+
+    columns = spec.get("columns")
+    if not isinstance(columns, dict) or not columns:
+        raise ValueError("'columns' must map at least one column name to a generator")
+    normalized = {}
+    for column, options in columns.items():
+        if column not in table_columns:
+            raise ValueError(f"Unknown column: {column}")
+        if not isinstance(options, dict) or options.get("generator") not in GENERATORS:
+            raise ValueError(f"Column {column}: 'generator' must be one of {', '.join(GENERATORS)}")
+        generator = options["generator"]
+        null_fraction = _number(column, options, "null_fraction", 0)
+        if not 0 <= null_fraction < 1:
+            raise ValueError(f"Column {column}: 'null_fraction' must be in [0, 1)")
+
+        options = dict(options)
+        if generator == "sequence":
+            _integer(column, options, "start", 1)
+            _integer(column, options, "step", 1)
+        elif generator in ("integer", "float"):
+            bound = _integer if generator == "integer" else _number
+            if bound(column, options, "min") > bound(column, options, "max"):
+                raise ValueError(f"Column {column}: 'min' must not be greater than 'max'")
+            if "decimals" in options and _integer(column, options, "decimals") < 0:
+                raise ValueError(f"Column {column}: 'decimals' must not be negative")
+        elif generator == "normal":
+            _number(column, options, "mean")
+            if _number(column, options, "stddev") < 0:
+                raise ValueError(f"Column {column}: 'stddev' must not be negative")
+            if "decimals" in options and _integer(column, options, "decimals") < 0:
+                raise ValueError(f"Column {column}: 'decimals' must not be negative")
+        elif generator == "categorical":
+            values = options.get("values")
+            if not isinstance(values, list) or not values:
+                raise ValueError(f"Column {column}: 'values' must be a non-empty list")
+            weights = options.get("weights")
+            if weights is not None:
+                if (not isinstance(weights, list) or len(weights) != len(values)
+                        or any(isinstance(w, bool) or not isinstance(w, (int, float)) or w < 0 for w in weights)
+                        or sum(weights) <= 0):
+                    raise ValueError(f"Column {column}: 'weights' must be one non-negative number per value")
+        elif generator == "zipf" or (generator == "reference" and options.get("distribution") == "zipf"):
+            if _number(column, options, "a", 2) <= 1:
+                raise ValueError(f"Column {column}: the Zipf exponent 'a' must be greater than 1")
+        if generator == "zipf" and _integer(column, options, "max", 1000) < 1:
+            raise ValueError(f"Column {column}: 'max' must be at least 1")
+        if generator in ("date", "timestamp"):
+            as_date = generator == "date"
+            start = _parse_instant(column, options.get("start"), "start", as_date)
+            end = _parse_instant(column, options.get("end"), "end", as_date)
+            if not as_date:
+                if (start.tzinfo is None) != (end.tzinfo is None):
+                    raise ValueError(f"Column {column}: 'start' and 'end' must both have a time zone or neither")
+                # NumPy has no time zones: aware bounds are drawn in UTC and written with its offset
+                options["utc"] = start.tzinfo is not None
+                if options["utc"]:
+                    start = start.astimezone(timezone.utc).replace(tzinfo=None)
+                    end = end.astimezone(timezone.utc).replace(tzinfo=None)
+            if start > end:
+                raise ValueError(f"Column {column}: 'start' must not be after 'end'")
+            options["start"], options["end"] = start.isoformat(), end.isoformat()
+        if generator == "text" and not isinstance(options.get("prefix", ""), str):
+            raise ValueError(f"Column {column}: 'prefix' must be a string")
+        if generator == "reference":
+            if not isinstance(options.get("table"), str) or not isinstance(options.get("column"), str):
+                raise ValueError(f"Column {column}: a reference needs the referenced 'table' and 'column'")
+            if options.get("distribution", "uniform") not in ("uniform", "zipf"):
+                raise ValueError(f"Column {column}: 'distribution' must be 'uniform' or 'zipf'")
+        normalized[column] = options
+
+    return {"rows": rows, "seed": seed, "columns": normalized}
+
+def _encode_strings(np, values):
+    return np.char.add(np.char.add('"', np.char.replace(values.astype(str), '"', '""')), '"')
+
+def _zipf_ranks(np, rng, a, size, count):
+    # Rank 0 is the most frequent; draws beyond the range wrap around instead of piling up on the last rank
+    return (rng.zipf(a, size) - 1) % count
+
+def _generate_column(np, rng, options, offset, size, keys):
+    generator = options["generator"]
+    if generator == "sequence":
+        return (options.get("start", 1) + np.arange(offset, offset + size, dtype=np.int64) * options.get("step", 1)).astype(str)
+    if generator == "integer":
+        return rng.integers(options["min"], options["max"], size, endpoint=True).astype(str)
+    if generator in ("float", "normal"):
+        if generator == "float":
+            values = rng.uniform(options["min"], options["max"], size)
+        else:
+            values = rng.normal(options["mean"], options["stddev"], size)
+        if "decimals" in options:
+            values = np.round(values, int(options["decimals"]))
+        return values.astype(str)
+    if generator == "categorical":
+        encoded = np.array([_quote(value) for value in options["values"]])
+        weights = options.get("weights")
+        probabilities = np.asarray(weights, dtype=float) / sum(weights) if weights else None
+        return encoded[rng.choice(len(encoded), size, p=probabilities)]
+    if generator == "zipf":
+        return (_zipf_ranks(np, rng, options.get("a", 2), size, options.get("max", 1000)) + 1).astype(str)
+    if generator in ("date", "timestamp"):
+        unit = "D" if generator == "date" else "s"
+        start = np.datetime64(options["start"], unit).astype(np.int64)
+        end = np.datetime64(options["end"], unit).astype(np.int64)
+        values = rng.integers(start, end, size, endpoint=True).astype(f"datetime64[{unit}]").astype(str)
+        return np.char.add(values, "+00:00") if options.get("utc") else values
+    if generator == "text":
+        numbers = np.arange(offset + 1, offset + size + 1, dtype=np.int64).astype(str)
+        return _encode_strings(np, np.char.add(options.get("prefix", ""), numbers))
+    # reference: keys is either a dense (low, high) integer range or an array of encoded key values
+    count = keys[1] - keys[0] + 1 if isinstance(keys, tuple) else len(keys)
+    if options.get("distribution") == "zipf":
+        indexes = _zipf_ranks(np, rng, options.get("a", 2), size, count)
+    else:
+        indexes = rng.integers(0, count, size)
+    return (indexes + keys[0]).astype(str) if isinstance(keys, tuple) else keys[indexes]
+
+def encode_keys(values):
+    """
+    Turn the key values of a referenced table into the CSV-encoded array a reference
+    column samples from.
+    :param values: List of distinct key values.
+    :return: NumPy array of encoded values.
+    """
+    np = _numpy()
+    if all(isinstance(value, int) and not isinstance(value, bool) for value in values):
+        return np.array(values, dtype=np.int64).astype(str)
+    return np.array([_quote(value) for value in values])
+
+def _join_lines(np, fields):
+    # Each column is a fixed-width UCS-4 array padded with NUL code points, which CSV values
+    # never contain. Laying the columns and separators side by side and keeping the non-padding
+    # code points yields the block's text in row order, without a Python loop over rows.
+    size = len(fields[0])
+    parts = []
+    for index, values in enumerate(fields):
+        parts.append(np.ascontiguousarray(values).view(np.uint32).reshape(size, -1))
+        separator = "\n" if index == len(fields) - 1 else ","
+        parts.append(np.full((size, 1), ord(separator), dtype=np.uint32))
+    grid = np.concatenate(parts, axis=1)
+    return grid[grid != 0].tobytes().decode("utf-32-le")
+
+# Produce the CSV text of a generated table block by block
+def generate_blocks(spec, reference_keys):
+    """
+    Generate rows for a validated spec in blocks of DATA_GENERATOR_BLOCK_ROWS, each column
+    drawn with one vectorized NumPy call per block and the block's text assembled in NumPy
+    as well. The same seed gives the same data.
+    :param spec: Spec returned by validate_spec.
+    :param reference_keys: Maps (table, column) of every reference to a dense (low, high)
+                           integer range or to an array from encode_keys.
+    :return: Generator of CSV text chunks, one per block, in the order of spec["columns"].
+    """
+    np = _numpy()
+    rng = np.random.default_rng(spec["seed"])
+    for offset in range(0, spec["rows"], Config.DATA_GENERATOR_BLOCK_ROWS):
+        size = min(Config.DATA_GENERATOR_BLOCK_ROWS, spec["rows"] - offset)
+        fields = []
+        for options in spec["columns"].values():
+            keys = reference_keys.get((options.get("table"), options.get("column")))
+            values = _generate_column(np, rng, options, offset, size, keys)
+            null_fraction = options.get("null_fraction", 0)
+            if null_fraction:
+                values = np.where(rng.random(size) < null_fraction, "", values)
+            fields.append(values)
+        yield _join_lines(np, fields)
@@ -0,0 +1,186 @@
+import codecs
+import csv
+import json
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+from app.core.config import Config
+
+SUPPORTED_FORMATS = ("csv", "jsonl", "parquet")
+
+# Candidate column types from most to least specific; TEXT accepts anything
+_TYPE_ORDER = ("BOOLEAN", "BIGINT", "DOUBLE PRECISION", "NUMERIC", "DATE", "TIMESTAMP", "TIMESTAMPTZ", "JSONB", "TEXT")
+_BIGINT_RANGE = (-2 ** 63, 2 ** 63 - 1)
+_DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def detect_format(filename, declared=None):
+    """
+    Work out the format of an uploaded dataset.
+    :param filename: Name of the uploaded file.
+    :param declared: Format given by the client, which wins over the file extension.
+    :return: One of SUPPORTED_FORMATS.
+    """
+    if declared:
+        file_format = declared.lower()
+    elif filename and "." in filename:
+        file_format = filename.rsplit(".", 1)[-1].lower()
+    else:
+        file_format = ""
+    if file_format in ("ndjson", "jsonlines"):
+        file_format = "jsonl"
+    if file_format not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported dataset format '{file_format}', expected one of {', '.join(SUPPORTED_FORMATS)}")
+    return file_format
+
+def _string_candidates(value):
+    candidates = {"TEXT"}
+    if value.lower() in ("true", "false", "t", "f"):
+        candidates.add("BOOLEAN")
+    try:
+        number = Decimal(value)
+        if number.is_finite():
+            candidates.add("NUMERIC")
+            if number == number.to_integral_value() and re.fullmatch(r"[+-]?\d+", value.strip()):
+                if _BIGINT_RANGE[0] <= int(number) <= _BIGINT_RANGE[1]:
+                    candidates.add("BIGINT")
+    except InvalidOperation:
+        pass
+    if _DATE_PATTERN.match(value):
+        try:
+            date.fromisoformat(value)
+            candidates.add("DATE")
+        except ValueError:
+            pass
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+            candidates.add("TIMESTAMPTZ" if parsed.tzinfo else "TIMESTAMP")
+        except ValueError:
+            pass
+    return candidates
+
+def _value_candidates(value):
+    if isinstance(value, bool):
+        return {"BOOLEAN", "TEXT"}
+    if isinstance(value, int):
+        if _BIGINT_RANGE[0] <= value <= _BIGINT_RANGE[1]:
+            return {"BIGINT", "DOUBLE PRECISION", "NUMERIC", "TEXT"}
+        return {"NUMERIC", "TEXT"}
+    if isinstance(value, float):
+        return {"DOUBLE PRECISION", "NUMERIC", "TEXT"}
+    if isinstance(value, (dict, list)):
+        return {"JSONB", "TEXT"}
+    return _string_candidates(str(value))
+
+# Pick the most specific type that fits every sampled value of each column
+def infer_types(columns, sample_rows):
+    """
+    Infer Postgres column types from a sample of rows.
+    :param columns: Column names.
+    :param sample_rows: List of value lists; None values are ignored.
+    :return: List of SQL type names, TEXT when nothing narrower fits.
+    """
+    types = []
+    for index in range(len(columns)):
+        candidates = None
+        for row in sample_rows:
+            value = row[index]
+            if value is None:
+                continue
+            fits = _value_candidates(value)
+            candidates = fits if candidates is None else candidates & fits
+        types.append(next((t for t in _TYPE_ORDER if candidates and t in candidates), "TEXT"))
+    return types
+
+def _read_csv(stream, delimiter):
+    reader = csv.reader(codecs.getreader("utf-8-sig")(stream), delimiter=delimiter)
+    columns = next(reader, None)
+    if not columns:
+        raise ValueError("The CSV file is empty or has no header row")
+
+    def rows():
+        for line_number, row in enumerate(reader, start=2):
+            if len(row) != len(columns):
+                raise ValueError(f"Line {line_number} has {len(row)} fields, expected {len(columns)}")
+            # CSV cannot tell an empty string from a missing value; load both as NULL
+            yield [value if value != "" else None for value in row]
+
+    return columns, rows()
+
+def _read_jsonl(stream):
+    lines = (line for line in codecs.getreader("utf-8")(stream) if line.strip())
+    records = (json.loads(line) for line in lines)
+    sample = list(islice(records, Config.IMPORT_SAMPLE_ROWS))
+    columns = []
+    for record in sample:
+        if not isinstance(record, dict):
+            raise ValueError("Every JSON Lines record must be an object")
+        columns.extend(key for key in record if key not in columns)
+    if not columns:
+        raise ValueError("The JSON Lines file has no records")
+
+    def rows():
+        for record in chain(sample, records):
+            unknown = set(record) - set(columns)
+            if unknown:
+                raise ValueError(f"Record has columns not seen in the first {len(sample)} records: {', '.join(sorted(unknown))}")
+            yield [record.get(column) for column in columns]
+
+    return columns, rows()
+
+def _arrow_type(arrow_type):
+    import pyarrow.types as pat
+    if pat.is_boolean(arrow_type):
+        return "BOOLEAN"
+    if pat.is_integer(arrow_type):
+        return "BIGINT"
+    if pat.is_floating(arrow_type):
+        return "DOUBLE PRECISION"
+    if pat.is_decimal(arrow_type):
+        return "NUMERIC"
+    if pat.is_date(arrow_type):
+        return "DATE"
+    if pat.is_timestamp(arrow_type):
+        return "TIMESTAMPTZ" if arrow_type.tz else "TIMESTAMP"
+    if pat.is_list(arrow_type) or pat.is_struct(arrow_type) or pat.is_map(arrow_type):
+        return "JSONB"
+    return "TEXT"
+
+def _read_parquet(stream):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet import requires the optional 'pyarrow' package")
+    parquet_file = pq.ParquetFile(stream)
+    schema = parquet_file.schema_arrow
+    columns = list(schema.names)
+    types = [_arrow_type(field.type) for field in schema]
+
+    def rows():
+        for batch in parquet_file.iter_batches(batch_size=Config.IMPORT_SAMPLE_ROWS):
+            for record in batch.to_pylist():
+                yield [record[column] for column in columns]
+
+    return columns, types, rows()
+
+# Open an uploaded dataset for streaming
+def open_dataset(stream, file_format, delimiter=","):
+    """
+    Read a dataset's columns and infer their types without loading the whole file.
+    Types come from the file's own schema for Parquet and from the first
+    IMPORT_SAMPLE_ROWS rows otherwise.
+    :param stream: Binary file-like object.
+    :param file_format: One of SUPPORTED_FORMATS.
+    :param delimiter: Field delimiter for CSV files.
+    :return: Tuple of (columns, types, rows) where rows lazily yields value lists.
+    """
+    if file_format == "parquet":
+        return _read_parquet(stream)
+
+    if file_format == "csv":
+        columns, rows = _read_csv(stream, delimiter)
+    else:
+        columns, rows = _read_jsonl(stream)
+    sample = list(islice(rows, Config.IMPORT_SAMPLE_ROWS))
+    return columns, infer_types(columns, sample), chain(sample, rows)
@@ -0,0 +1,51 @@
+import threading
+from collections import Counter, defaultdict
+
+class Metrics:
+    """Thread-safe, in-process counters and timings exposed through GET /metrics."""
+
+    def __init__(self):
+        self._counters = defaultdict(Counter)
+        self._timings = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        self._lock = threading.Lock()
+
+    def increment(self, name, key="total", amount=1):
+        """
+        Increment a counter.
+        :param name: Counter name, e.g. "query_limit_hits".
+        :param key: Sub-key such as a task ID; counters without one use "total".
+        :param amount: Amount to add.
+        """
+        with self._lock:
+            self._counters[name][str(key)] += amount
+
+    def observe(self, name, value_ms, key="total"):
+        """
+        Record a duration.
+        :param name: Timing name, e.g. "pool_checkout_wait".
+        :param value_ms: Duration in milliseconds.
+        :param key: Sub-key such as a pool label.
+        """
+        with self._lock:
+            timing = self._timings[(name, str(key))]
+            timing["count"] += 1
+            timing["total_ms"] += value_ms
+            timing["max_ms"] = max(timing["max_ms"], value_ms)
+
+    def get(self, name, key="total"):
+        with self._lock:
+            return self._counters[name][str(key)]
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {name: dict(values) for name, values in self._counters.items()}
+            for (name, key), timing in self._timings.items():
+                average = timing["total_ms"] / timing["count"] if timing["count"] else 0.0
+                snapshot.setdefault(name, {})[key] = {
+                    "count": timing["count"],
+                    "avg_ms": round(average, 3),
+                    "max_ms": round(timing["max_ms"], 3),
+                }
+            return snapshot
+
+metrics = Metrics()
@@ -1,11 +1,118 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError, ProgrammingError
+from sqlalchemy import event, text
+from sqlalchemy.exc import SQLAlchemyError, ProgrammingError, TimeoutError as PoolTimeout
 from app.core.config import Config
+from app.db.session import grading_engine
+from app.utils.result_cache import reference_cache, verdict_cache, get_schema_version, get_schema_versions
+from app.utils.sql_normalizer import sql_hash, quote_identifier, split_sql
+from app.utils.metrics import metrics
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import zip_longest
 from flask import jsonify
 import logging
+import queue
+import re
+import secrets
+import threading
 
-# Database engine
-engine = create_engine(Config.DATABASE_URL)
+# Number of differing rows returned by a server-side comparison
+DIFF_SAMPLE_SIZE = 5
+# Rows fetched per round trip when streaming a result set
+FETCH_CHUNK_SIZE = 1000
+# Feedback for unexpected failures; such verdicts are never memoized
+INTERNAL_ERROR_FEEDBACK = "An internal error occurred during validation."
+# Feedback when no grading connection became free in time; such verdicts are never memoized
+BUSY_FEEDBACK = "The grading servers are busy right now. Please try again in a moment."
+# Row digests are 128-bit; the multiset digest is their sum modulo 2**128
+_DIGEST_MODULUS = 1 << 128
+
+# Threads that run reference queries concurrently with the submitted query
+_reference_executor = ThreadPoolExecutor(max_workers=Config.GRADING_WORKERS, thread_name_prefix="reference")
+
+class QueryExecutionError(Exception):
+    """Raised while running or streaming a query; the message is what the student gets feedback on."""
+
+class QueryLimitExceeded(QueryExecutionError):
+    """Raised when a graded query runs past its statement timeout, row cap or byte budget."""
+
+class GradingBusy(Exception):
+    """Raised when the grading pool had no free connection within the pool timeout; worth retrying later."""
+
+# Check out a grading connection, reporting an exhausted pool as GradingBusy
+@contextmanager
+def _grading_connection():
+    try:
+        connection = grading_engine.connect()
+    except PoolTimeout as e:
+        metrics.increment("grading_pool_timeouts", "grading")
+        raise GradingBusy(str(e))
+    with connection:
+        yield connection
+
+# Resource limits for graded queries of a task
+def get_query_limits(difficulty):
+    """
+    Look up the grading limits for a task difficulty.
+    :param difficulty: "easy", "medium" or "hard"; unknown values use the medium limits.
+    :return: Dictionary with statement_timeout_ms, max_rows and max_bytes.
+    """
+    return Config.GRADING_LIMITS.get(difficulty) or Config.GRADING_LIMITS["medium"]
+
+def _is_statement_timeout(error):
+    # 57014 is query_canceled, raised when statement_timeout fires
+    return getattr(getattr(error, "orig", None), "pgcode", None) == "57014"
+
+# Keep the settings memo of _prepare_connection honest across checkouts
+def _track_settings(pooled_engine):
+    """
+    Forget the settings remembered on a pooled connection when its last checkout may have
+    changed them behind _prepare_connection's back: the checkout never went through it, or
+    it ran SQL that can commit its own SET (see _distrust_settings).
+    :param pooled_engine: The engine whose pool to watch.
+    """
+    @event.listens_for(pooled_engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["settings_trusted"] = False
+
+    @event.listens_for(pooled_engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        if not connection_record.info.pop("settings_trusted", False):
+            connection_record.info.pop("grading_settings", None)
+
+_track_settings(grading_engine)
+
+def _distrust_settings(connection, query):
+    # A single statement runs in the transaction that is rolled back, which undoes any SET in it;
+    # several statements may include a COMMIT that makes one stick
+    if any(kind == "code" and ";" in text for kind, text in split_sql(strip_trailing_semicolons(query))):
+        connection.connection.info["settings_trusted"] = False
+
+def _prepare_connection(connection, schema_name, limits=None):
+    """
+    Point a grading connection at the task's schema, apply the statement timeout and open
+    the transaction the queries run in. The settings are made at session level and
+    remembered on the pooled connection, so a checkout that finds them already in place
+    (the usual case while a class works on the same task) skips the round trip. The memo
+    is dropped when a checkout may have changed the settings itself (see _track_settings).
+    :param connection: A connection without an open transaction.
+    :param schema_name: Name of the schema where queries should run.
+    :param limits: Optional grading limits (see get_query_limits); without them no timeout applies.
+    """
+    settings = (quote_identifier(schema_name), str(limits["statement_timeout_ms"]) if limits else "0")
+    info = connection.connection.info
+    info["settings_trusted"] = True
+    if info.get("grading_settings") != settings:
+        connection.execute(
+            text("SELECT set_config('search_path', :search_path, false), set_config('statement_timeout', :timeout, false)"),
+            {"search_path": settings[0], "timeout": settings[1]},
+        )
+        # Committed, as the transaction of the graded queries is always rolled back
+        connection.commit()
+        info["grading_settings"] = settings
+    connection.begin()
 
 # Execute a SQL query in a specific schema
 def execute_query(schema_name, query):
@@ -16,13 +123,14 @@ def execute_query(schema_name, query):
     :return: Query results as a list of dictionaries or an error message.
     """
     try:
-        with engine.connect() as connection:
+        with _grading_connection() as connection:
             # Switch to the specific schema
-            connection.execute(text("SET search_path TO :schema_name"), {"schema_name": schema_name})
+            _prepare_connection(connection, schema_name)
+            _distrust_settings(connection, query)
             # Execute the query
             result = connection.execute(text(query))
             # Fetch all rows and return as a list of dictionaries
-            return [dict(row) for row in result.fetchall()]
+            return [dict(row._mapping) for row in result.fetchall()]
     except ProgrammingError as pe:
         logging.error(f"Query failed: {pe}")
         return {"error": f"Query failed: {str(pe)}"}
@@ -30,45 +138,636 @@ def execute_query(schema_name, query):
         logging.error(f"Database error: {e}")
         return {"error": f"Database error: {str(e)}"}
 
+def _error_message(error):
+    if isinstance(error, ProgrammingError):
+        return f"Query failed: {str(error)}"
+    return f"Database error: {str(error)}"
+
+# Run a query on an open connection and return a result that is fetched in chunks
+def open_stream(connection, schema_name, query, limits=None):
+    """
+    Execute a query on the given connection inside a transaction that is rolled back
+    when the connection is closed, using a server-side cursor when the query is a
+    single row-returning statement.
+    :param connection: An open SQLAlchemy connection.
+    :param schema_name: Name of the schema where the query should be executed.
+    :param query: The SQL query to execute.
+    :param limits: Optional grading limits (see get_query_limits).
+    :return: A SQLAlchemy result to be consumed with iter_row_hashes.
+    """
+    try:
+        _prepare_connection(connection, schema_name, limits)
+        _distrust_settings(connection, query)
+        if is_single_select(query):
+            connection = connection.execution_options(stream_results=True)
+        result = connection.execute(text(query))
+    except SQLAlchemyError as e:
+        if limits and _is_statement_timeout(e):
+            raise QueryLimitExceeded(f"statement timeout of {limits['statement_timeout_ms']} ms")
+        logging.error(f"Query failed: {e}")
+        raise QueryExecutionError(_error_message(e))
+    if not result.returns_rows:
+        raise QueryExecutionError("Query failed: the query does not return any rows")
+    return result
+
+def _canonical_value(value):
+    # Numbers compare by value across int/float/Decimal, like == on fetched rows does
+    if value is None:
+        return "\x00"
+    if isinstance(value, bool):
+        return f"b:{value}"
+    if isinstance(value, (int, float, Decimal)):
+        try:
+            number = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+            return f"n:{number.normalize()}"
+        except InvalidOperation:
+            return f"n:{value}"
+    if isinstance(value, (bytes, memoryview)):
+        return f"x:{bytes(value).hex()}"
+    return f"s:{value}"
+
+def encode_row(row):
+    return "\x1f".join(_canonical_value(value) for value in row).encode("utf-8", "surrogatepass")
+
+def hash_row(row):
+    """
+    Hash one result row into a 16-byte digest.
+    :param row: A sequence of column values.
+    :return: The row digest.
+    """
+    return blake2b(encode_row(row), digest_size=16).digest()
+
+def iter_row_hashes(result, limits=None):
+    """
+    Yield the digest of each row, fetching FETCH_CHUNK_SIZE rows per round trip.
+    :param result: A result returned by open_stream.
+    :param limits: Optional grading limits; max_rows and max_bytes are enforced while reading.
+    :raises QueryLimitExceeded: If the result is larger than the limits allow.
+    """
+    row_count = 0
+    byte_count = 0
+    try:
+        while True:
+            rows = result.fetchmany(FETCH_CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                encoded = encode_row(row)
+                if limits:
+                    row_count += 1
+                    byte_count += len(encoded)
+                    if row_count > limits["max_rows"]:
+                        raise QueryLimitExceeded(f"more than {limits['max_rows']} rows")
+                    if byte_count > limits["max_bytes"]:
+                        raise QueryLimitExceeded(f"more than {limits['max_bytes']} bytes of results")
+                yield blake2b(encoded, digest_size=16).digest()
+    except SQLAlchemyError as e:
+        if limits and _is_statement_timeout(e):
+            raise QueryLimitExceeded(f"statement timeout of {limits['statement_timeout_ms']} ms")
+        logging.error(f"Query failed: {e}")
+        raise QueryExecutionError(_error_message(e))
+
+class ResultFingerprint:
+    """Constant-size summary of a result set: columns, row count, ordered and multiset digests."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.row_count = 0
+        self._ordered = blake2b(digest_size=16)
+        self._unordered = 0
+
+    def add(self, row_hash):
+        self.row_count += 1
+        self._ordered.update(row_hash)
+        self._unordered = (self._unordered + int.from_bytes(row_hash, "big")) % _DIGEST_MODULUS
+
+    def to_dict(self):
+        return {
+            "columns": self.columns,
+            "row_count": self.row_count,
+            "ordered_digest": self._ordered.hexdigest(),
+            "unordered_digest": f"{self._unordered:032x}",
+        }
+
+# Fingerprint a query's result set without materializing it
+def fingerprint_query(schema_name, query, max_rows=None, limits=None, expected_columns=None):
+    """
+    Stream a query's result set and summarize it.
+    :param schema_name: Name of the schema where the query should be executed.
+    :param query: The SQL query to execute.
+    :param max_rows: Stop reading once more than this many rows were seen.
+    :param limits: Optional grading limits (see get_query_limits).
+    :param expected_columns: Stop before reading any row if the result has other columns.
+    :return: Fingerprint dictionary (see ResultFingerprint) or an error message.
+    :raises QueryLimitExceeded: If the query runs past its limits.
+    """
+    try:
+        with _grading_connection() as connection:
+            result = open_stream(connection, schema_name, query, limits)
+            fingerprint = ResultFingerprint(result.keys())
+            if expected_columns is not None and fingerprint.columns != list(expected_columns):
+                return fingerprint.to_dict()
+            for row_hash in iter_row_hashes(result, limits):
+                fingerprint.add(row_hash)
+                if max_rows is not None and fingerprint.row_count > max_rows:
+                    break
+            return fingerprint.to_dict()
+    except QueryLimitExceeded:
+        raise
+    except QueryExecutionError as e:
+        return {"error": str(e)}
+    except SQLAlchemyError as e:
+        logging.error(f"Database error: {e}")
+        return {"error": f"Database error: {str(e)}"}
+
+def fingerprints_match(submitted, reference, ordered):
+    if submitted["columns"] != reference["columns"] or submitted["row_count"] != reference["row_count"]:
+        return False
+    key = "ordered_digest" if ordered else "unordered_digest"
+    return submitted[key] == reference[key]
+
+# Fetch the fingerprint of a task's reference answer, served from the cache when possible
+def get_reference_result(task_id, schema_name, correct_answer):
+    """
+    Return the fingerprint of a task's reference answer.
+    :param task_id: ID of the task the reference answer belongs to.
+    :param schema_name: Name of the schema where the query should be executed.
+    :param correct_answer: The correct SQL query.
+    :return: Fingerprint dictionary or an error message.
+    """
+    # Capture the version before running so a concurrent schema change is never cached as current
+    version = get_schema_version(schema_name)
+    answer_hash = sql_hash(correct_answer)
+    cached = reference_cache.get(task_id, schema_name, version, answer_hash)
+    if cached is not None:
+        return cached
+
+    result = fingerprint_query(schema_name, correct_answer)
+    if "error" not in result:
+        reference_cache.put(task_id, schema_name, version, answer_hash, result)
+    return result
+
+# Fill the reference cache for a task ahead of the first submission
+def warm_reference_result(task_id, schema_name, correct_answer):
+    result = get_reference_result(task_id, schema_name, correct_answer)
+    if "error" in result:
+        logging.warning(f"Reference answer for task {task_id} failed: {result['error']}")
+
+def strip_trailing_semicolons(query):
+    return query.strip().rstrip(";").strip()
+
+# Check whether a query is a single row-returning statement
+def is_single_select(query):
+    statement = strip_trailing_semicolons(query)
+    if ";" in statement:
+        return False
+    return re.match(r"(select|with|values|table)\b", statement, re.IGNORECASE) is not None
+
+# Check whether the order of the rows is part of the expected answer
+def is_order_sensitive(query):
+    """
+    Only an ORDER BY of the outermost query orders the result; the ones in subqueries,
+    window definitions and ordered aggregates sit inside parentheses.
+    :param query: The SQL query to inspect.
+    :return: True if the query has a top-level ORDER BY.
+    """
+    # Literals and comments are blanked out so they can neither match nor unbalance parentheses
+    code = "".join(text if kind == "code" else " ? " if kind == "quoted" else " " for kind, text in split_sql(query))
+    depth = 0
+    for token in re.finditer(r"[()]|\border\s+by\b", code, re.IGNORECASE):
+        if token.group(0) == "(":
+            depth += 1
+        elif token.group(0) == ")":
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            return True
+    return False
+
+# Check whether a query can be embedded as a subquery for server-side comparison
+def can_compare_in_database(query):
+    """
+    A query can be wrapped when it is a single row-returning statement without a top-level ORDER BY.
+    :param query: The SQL query to inspect.
+    :return: True if the query can be used inside a CTE.
+    """
+    return is_single_select(query) and not is_order_sensitive(query)
+
+# Compare two queries inside Postgres with a symmetric EXCEPT ALL
+def compare_in_database(schema_name, submitted_query, correct_answer, limits=None):
+    """
+    Compare the multisets of rows returned by both queries without fetching them.
+    :param schema_name: Name of the schema where the queries will be executed.
+    :param submitted_query: The SQL query submitted by the student.
+    :param correct_answer: The correct SQL query.
+    :param limits: Optional grading limits; the statement timeout applies to the comparison,
+                   the row cap and byte budget to the submitted query's result.
+    :return: A validation dictionary, or None if the comparison could not be run and
+             the caller should fall back to comparing in Python.
+    :raises QueryLimitExceeded: If the comparison runs past the statement timeout or the
+                                submitted result is larger than the limits allow.
+    """
+    submitted = strip_trailing_semicolons(submitted_query)
+    reference = strip_trailing_semicolons(correct_answer)
+    # A CTE shadows tables of the same name in the queries after it, so a fixed name would
+    # let a table called "submitted" in the reference answer read the student's rows
+    suffix = secrets.token_hex(8)
+    submitted_name, reference_name = f"submitted_{suffix}", f"reference_{suffix}"
+    # Reading one row past the cap is enough to tell that the result is too large
+    submitted_source = f"SELECT * FROM ({submitted}) AS s LIMIT {limits['max_rows'] + 1}" if limits else submitted
+    try:
+        with _grading_connection() as connection:
+            _prepare_connection(connection, schema_name, limits)
+
+            # Column names are part of the result, EXCEPT ALL only checks positions and types
+            submitted_columns = list(connection.execute(text(f"SELECT * FROM ({submitted}) AS submitted LIMIT 0")).keys())
+            reference_columns = list(connection.execute(text(f"SELECT * FROM ({reference}) AS reference LIMIT 0")).keys())
+            if submitted_columns != reference_columns:
+                return {
+                    "is_correct": False,
+                    "feedback": "The columns returned by your query do not match the expected columns.",
+                }
+
+            comparison = connection.execute(text(f"""
+                WITH {submitted_name} AS ({submitted_source}), {reference_name} AS ({reference})
+                SELECT
+                    (SELECT count(*) FROM {submitted_name}) AS submitted_rows,
+                    (SELECT coalesce(sum(octet_length(r::text)), 0) FROM {submitted_name} AS r) AS submitted_bytes,
+                    (SELECT count(*) FROM {reference_name}) AS reference_rows,
+                    (SELECT coalesce(jsonb_agg(to_jsonb(d)), '[]'::jsonb) FROM (
+                        SELECT * FROM (SELECT * FROM {submitted_name} EXCEPT ALL SELECT * FROM {reference_name}) AS extra
+                        LIMIT {DIFF_SAMPLE_SIZE}) AS d) AS unexpected_rows,
+                    (SELECT coalesce(jsonb_agg(to_jsonb(d)), '[]'::jsonb) FROM (
+                        SELECT * FROM (SELECT * FROM {reference_name} EXCEPT ALL SELECT * FROM {submitted_name}) AS missing
+                        LIMIT {DIFF_SAMPLE_SIZE}) AS d) AS missing_rows
+            """)).fetchone()
+    except SQLAlchemyError as e:
+        if limits and _is_statement_timeout(e):
+            raise QueryLimitExceeded(f"statement timeout of {limits['statement_timeout_ms']} ms")
+        # Errors (syntax, incompatible column types, ...) are reported by the Python path
+        logging.info(f"Server-side comparison unavailable, falling back: {e}")
+        return None
+
+    if limits and comparison.submitted_rows > limits["max_rows"]:
+        raise QueryLimitExceeded(f"more than {limits['max_rows']} rows")
+    if limits and comparison.submitted_bytes > limits["max_bytes"]:
+        raise QueryLimitExceeded(f"more than {limits['max_bytes']} bytes of results")
+
+    if (comparison.submitted_rows == comparison.reference_rows
+            and not comparison.unexpected_rows and not comparison.missing_rows):
+        return {"is_correct": True, "feedback": "Your query is correct!"}
+
+    feedback = "The results do not match. Please review your query."
+    if comparison.submitted_rows != comparison.reference_rows:
+        feedback = (f"The results do not match: your query returned {comparison.submitted_rows} rows, "
+                    f"expected {comparison.reference_rows}. Please review your query.")
+    return {
+        "is_correct": False,
+        "feedback": feedback,
+        "differences": {
+            "unexpected_rows": comparison.unexpected_rows,
+            "missing_rows": comparison.missing_rows,
+        },
+    }
+
+class ReferenceStream:
+    """
+    Runs a reference query on its own pooled connection in a background thread and hands
+    the row hashes over in chunks, so it executes while the submitted query does.
+    """
+
+    def __init__(self, schema_name, query):
+        self._chunks = queue.Queue(maxsize=4)
+        self._cancelled = threading.Event()
+        self._connection = None
+        self._connection_lock = threading.Lock()
+        _reference_executor.submit(self._run, schema_name, query)
+
+    def _put(self, item):
+        # Gives up once the consumer has cancelled, so the thread never blocks on a full queue
+        while not self._cancelled.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, schema_name, query):
+        try:
+            with _grading_connection() as connection:
+                with self._connection_lock:
+                    if self._cancelled.is_set():
+                        return
+                    self._connection = connection.connection
+                try:
+                    result = open_stream(connection, schema_name, query)
+                    if not self._put(("columns", list(result.keys()))):
+                        return
+                    batch = []
+                    for row_hash in iter_row_hashes(result):
+                        batch.append(row_hash)
+                        if len(batch) == FETCH_CHUNK_SIZE:
+                            if not self._put(("rows", batch)):
+                                return
+                            batch = []
+                    if batch and not self._put(("rows", batch)):
+                        return
+                    self._put(("end", None))
+                finally:
+                    # Forget the connection before it goes back to the pool so cancel() cannot hit its next user
+                    with self._connection_lock:
+                        self._connection = None
+        except (QueryExecutionError, GradingBusy) as e:
+            if not self._cancelled.is_set():
+                self._put(("error", e))
+        except Exception as e:
+            logging.error(f"Reference query failed: {e}")
+            self._put(("error", QueryExecutionError(f"Database error: {str(e)}")))
+
+    def _get(self):
+        kind, payload = self._chunks.get()
+        if kind == "error":
+            raise payload
+        return kind, payload
+
+    def columns(self):
+        return self._get()[1]
+
+    def hashes(self):
+        while True:
+            kind, payload = self._get()
+            if kind == "end":
+                return
+            yield from payload
+
+    def cancel(self):
+        """Stop reading and cancel the reference query if it is still running on the server."""
+        self._cancelled.set()
+        with self._connection_lock:
+            if self._connection is not None:
+                try:
+                    self._connection.cancel()
+                except Exception as e:
+                    logging.warning(f"Could not cancel reference query: {e}")
+
+# Stream both result sets side by side and stop at the first detectable mismatch
+def compare_streams(schema_name, submitted_query, correct_answer, ordered, limits=None):
+    """
+    Compare two result sets in Python with constant memory.
+    The reference query runs concurrently on a second pooled connection and is cancelled
+    as soon as the outcome is known, e.g. when the submitted query fails to parse.
+    Order-sensitive comparisons stop at the first differing row; order-insensitive ones
+    compare multiset digests once both streams are exhausted. Both stop as soon as one
+    stream ends before the other.
+    :param schema_name: Name of the schema where the queries will be executed.
+    :param submitted_query: The SQL query submitted by the student.
+    :param correct_answer: The correct SQL query.
+    :param ordered: Whether the row order must match.
+    :param limits: Optional grading limits, applied to the submitted query only.
+    :return: Tuple (is_correct, reference fingerprint). The fingerprint is None unless
+             the reference result was read to the end.
+    :raises QueryExecutionError: If either query fails.
+    """
+    reference_stream = ReferenceStream(schema_name, correct_answer)
+    try:
+        with _grading_connection() as submitted_connection:
+            submitted_result = open_stream(submitted_connection, schema_name, submitted_query, limits)
+
+            submitted = ResultFingerprint(submitted_result.keys())
+            reference = ResultFingerprint(reference_stream.columns())
+            if submitted.columns != reference.columns:
+                return False, None
+
+            for submitted_hash, reference_hash in zip_longest(iter_row_hashes(submitted_result, limits),
+                                                              reference_stream.hashes()):
+                if submitted_hash is None:
+                    return False, None
+                if reference_hash is None:
+                    return False, reference.to_dict()
+                submitted.add(submitted_hash)
+                reference.add(reference_hash)
+                if ordered and submitted_hash != reference_hash:
+                    return False, None
+
+            reference_fingerprint = reference.to_dict()
+            return fingerprints_match(submitted.to_dict(), reference_fingerprint, ordered), reference_fingerprint
+    finally:
+        # No-op once the reference was read to the end
+        reference_stream.cancel()
+
+# Ask the planner for a query's plan without running it
+def explain_plan(schema_name, query):
+    """
+    Run EXPLAIN (FORMAT JSON) on a query.
+    :param schema_name: Name of the schema where the query would be executed.
+    :param query: The SQL query to plan.
+    :return: The root node of the JSON plan.
+    :raises QueryExecutionError: If the query cannot be planned.
+    """
+    try:
+        with _grading_connection() as connection:
+            _prepare_connection(connection, schema_name)
+            _distrust_settings(connection, query)
+            plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {strip_trailing_semicolons(query)}")).scalar()
+    except SQLAlchemyError as e:
+        logging.error(f"Query failed: {e}")
+        raise QueryExecutionError(_error_message(e))
+    return plan[0]["Plan"]
+
+# Ask the planner for a query's estimated cost without running it
+def explain_query(schema_name, query):
+    """
+    Estimate the cost of a query from its plan.
+    :param schema_name: Name of the schema where the query would be executed.
+    :param query: The SQL query to plan.
+    :return: Dictionary with the plan's total_cost and plan_rows.
+    :raises QueryExecutionError: If the query cannot be planned.
+    """
+    root = explain_plan(schema_name, query)
+    return {"total_cost": root["Total Cost"], "plan_rows": root["Plan Rows"]}
+
+# The schema and plan versions and the answer text are part of the key, so edits, DDL/DML
+# and new indexes start fresh
+@lru_cache(maxsize=1024)
+def _reference_plan(schema_name, schema_version, plan_version, correct_answer):
+    return explain_query(schema_name, correct_answer)
+
+# Reject a submission whose plan is far more expensive than the reference answer's
+def check_admission(schema_name, submitted_query, correct_answer, schema_version=None, plan_version=None):
+    """
+    Compare the planner estimates of the submitted query against thresholds derived
+    from the reference answer's plan.
+    :param schema_name: Name of the schema where the queries will be executed.
+    :param submitted_query: The SQL query submitted by the student.
+    :param correct_answer: The correct SQL query.
+    :param schema_version: Current version of the schema, if the caller has already read it.
+    :param plan_version: Current plan version of the schema, if the caller has already read it.
+    :return: A rejection verdict, or None if the query may run.
+    :raises QueryExecutionError: If the submitted query cannot be planned.
+    """
+    if schema_version is None or plan_version is None:
+        schema_version, plan_version = get_schema_versions(schema_name)
+    try:
+        reference_plan = _reference_plan(schema_name, schema_version, plan_version, correct_answer)
+    except QueryExecutionError as e:
+        # A broken reference answer is reported by the regular grading path
+        logging.warning(f"Could not plan reference answer, skipping admission check: {e}")
+        return None
+    max_cost = max(reference_plan["total_cost"] * Config.ADMISSION_COST_FACTOR, Config.ADMISSION_MIN_COST)
+    max_rows = max(reference_plan["plan_rows"] * Config.ADMISSION_ROWS_FACTOR, Config.ADMISSION_MIN_ROWS)
+
+    submitted_plan = explain_query(schema_name, submitted_query)
+    if submitted_plan["total_cost"] > max_cost or submitted_plan["plan_rows"] > max_rows:
+        logging.info(f"Rejected query before execution: plan {submitted_plan}, limits cost={max_cost} rows={max_rows}")
+        return {
+            "is_correct": False,
+            "feedback": (f"Your query was not run because the planner estimates it to be far more expensive "
+                         f"than needed (cost {submitted_plan['total_cost']:.0f}, about {submitted_plan['plan_rows']} rows). "
+                         f"Check your joins and filters."),
+            "admission_rejected": True,
+        }
+    return None
+
+# Tell apart verdicts about the query from failures of the grading run
+def is_transient(verdict):
+    """
+    Tell whether a verdict says more about the server than about the query: limit hits
+    depend on load, and busy pools and internal errors may not happen again.
+    :param verdict: A validation dictionary returned by validate_query.
+    :return: True if the query should be graded again rather than the verdict kept.
+    """
+    return bool(verdict.get("limit_exceeded") or verdict.get("busy") or verdict["feedback"] == INTERNAL_ERROR_FEEDBACK)
+
 # Validate a student's query against the correct answer
-def validate_query(submitted_query, correct_answer, schema_name):
+def validate_query(submitted_query, correct_answer, schema_name, task_id=None, difficulty=None,
+                   reference_fingerprint=None, refresh=False):
     """
     Compare the results of the submitted query with the correct answer.
+    When a task_id is given, verdicts are memoized per reference answer and normalized
+    query text, so whitespace, comment and keyword-case variants of a graded query skip
+    the database.
+    :param submitted_query: The SQL query submitted by the student.
+    :param correct_answer: The correct SQL query.
+    :param schema_name: Name of the schema where the queries will be executed.
+    :param task_id: ID of the task, used to reuse cached reference results and verdicts.
+    :param difficulty: Task difficulty, selects the resource limits for the submitted query.
+    :param reference_fingerprint: Fingerprint of the reference answer stored on the task, if any.
+    :param refresh: Grade even if a verdict is cached, and cache the new one.
+    :return: A dictionary with validation status and feedback.
+    """
+    if task_id is None:
+        return _grade_query(submitted_query, correct_answer, schema_name, None, difficulty, reference_fingerprint)
+
+    # Read once, before grading, so a concurrent schema change is never cached as current
+    version, plan_version = get_schema_versions(schema_name)
+    answer_hash = sql_hash(correct_answer)
+    query_hash = sql_hash(submitted_query)
+    if not refresh:
+        cached = verdict_cache.get(task_id, schema_name, version, answer_hash, query_hash)
+        if cached is not None:
+            metrics.increment("verdict_cache_hits", task_id)
+            return cached
+        metrics.increment("verdict_cache_misses", task_id)
+
+    verdict = _grade_query(submitted_query, correct_answer, schema_name, task_id, difficulty, reference_fingerprint,
+                           version, plan_version)
+    # Admission rejections follow the plans, which new indexes change without a new schema version
+    if isinstance(verdict, dict) and not is_transient(verdict) and not verdict.get("admission_rejected"):
+        verdict_cache.put(task_id, schema_name, version, answer_hash, query_hash, verdict)
+    return verdict
+
+def _grade_query(submitted_query, correct_answer, schema_name, task_id, difficulty, reference_fingerprint=None,
+                 schema_version=None, plan_version=None):
+    """
+    Run the comparison behind validate_query.
+    A cached or stored reference fingerprint is compared against the streamed submission,
+    which stops early on a column or row-count mismatch; otherwise
+    single-statement queries without ORDER BY are compared inside Postgres, and everything
+    else falls back to streaming both results side by side.
     :param submitted_query: The SQL query submitted by the student.
     :param correct_answer: The correct SQL query.
     :param schema_name: Name of the schema where the queries will be executed.
+    :param task_id: ID of the task, used to reuse the cached reference result.
+    :param difficulty: Task difficulty, selects the resource limits for the submitted query.
+    :param reference_fingerprint: Fingerprint of the reference answer stored on the task, if any.
+    :param schema_version: Version of the schema read before grading; required with a task_id.
+    :param plan_version: Plan version of the schema read with schema_version, for the admission check.
     :return: A dictionary with validation status and feedback.
     """
+    limits = get_query_limits(difficulty)
     try:
-        # Execute both queries
-        submitted_result = execute_query(schema_name, submitted_query)
-        correct_result = execute_query(schema_name, correct_answer)
+        if Config.ADMISSION_CHECK and is_single_select(submitted_query):
+            rejection = check_admission(schema_name, submitted_query, correct_answer, schema_version, plan_version)
+            if rejection is not None:
+                metrics.increment("admission_rejections", task_id if task_id is not None else "adhoc")
+                return rejection
 
-        # Check for execution errors
-        if "error" in submitted_result:
-            return {
-                "is_correct": False,
-                "feedback": generate_feedback(submitted_result["error"]),
-            }
-        if "error" in correct_result:
-            return {
-                "is_correct": False,
-                "feedback": generate_feedback(correct_result["error"]),
-            }
+        ordered = is_order_sensitive(correct_answer)
+        answer_hash = sql_hash(correct_answer)
+        reference = reference_cache.get(task_id, schema_name, schema_version, answer_hash) if task_id is not None else None
+        reference = reference or reference_fingerprint
+
+        if reference is not None:
+            submitted = fingerprint_query(schema_name, submitted_query, max_rows=reference["row_count"], limits=limits,
+                                          expected_columns=reference["columns"])
+            if "error" in submitted:
+                raise QueryExecutionError(submitted["error"])
+            if submitted["columns"] != reference["columns"]:
+                return {
+                    "is_correct": False,
+                    "feedback": "The columns returned by your query do not match the expected columns.",
+                }
+            if submitted["row_count"] != reference["row_count"]:
+                # Reading stops one row past the expected count, so only the direction is known
+                return {
+                    "is_correct": False,
+                    "feedback": (f"The results do not match: your query returned "
+                                 f"{'more' if submitted['row_count'] > reference['row_count'] else 'fewer'} "
+                                 f"rows than expected. Please review your query."),
+                }
+            is_correct = fingerprints_match(submitted, reference, ordered)
+        else:
+            if (Config.SERVER_SIDE_COMPARE
+                    and can_compare_in_database(submitted_query) and can_compare_in_database(correct_answer)):
+                verdict = compare_in_database(schema_name, submitted_query, correct_answer, limits)
+                if verdict is not None:
+                    return verdict
+
+            is_correct, reference = compare_streams(schema_name, submitted_query, correct_answer, ordered, limits)
+            if task_id is not None and reference is not None:
+                reference_cache.put(task_id, schema_name, schema_version, answer_hash, reference)
 
         # Compare results
-        if submitted_result == correct_result:
+        if is_correct:
             return {"is_correct": True, "feedback": "Your query is correct!"}
         else:
             return {
                 "is_correct": False,
                 "feedback": "The results do not match. Please review your query.",
             }
+    except QueryLimitExceeded as le:
+        metrics.increment("query_limit_hits", task_id if task_id is not None else "adhoc")
+        logging.info(f"Query for task {task_id} exceeded limits: {le}")
+        return {
+            "is_correct": False,
+            "feedback": f"Your query exceeded the limits for this task ({le}). Try a more selective query.",
+            "limit_exceeded": True,
+        }
+    except GradingBusy as be:
+        metrics.increment("grading_busy", task_id if task_id is not None else "adhoc")
+        logging.warning(f"No grading connection for task {task_id}: {be}")
+        return {"is_correct": False, "feedback": BUSY_FEEDBACK, "busy": True}
+    except QueryExecutionError as qe:
+        # Check for execution errors
+        return {
+            "is_correct": False,
+            "feedback": generate_feedback(str(qe)),
+        }
     except ValueError as ve:
         return jsonify({"error": str(ve)}), 400
     except Exception as e:
         logging.error(f"Validation error: {e}")
-        return {"is_correct": False, "feedback": "An internal error occurred during validation."}
+        return {"is_correct": False, "feedback": INTERNAL_ERROR_FEEDBACK}
 
 # Generate feedback if the query fails
 def generate_feedback(error):
@@ -86,4 +785,4 @@ def generate_feedback(error):
     elif "permission denied" in error.lower():
         return "You do not have the necessary permissions to execute this query."
     else:
-        return f"An error occurred while executing your query: {error}"
\ No newline at end of file
+        return f"An error occurred while executing your query: {error}"
@@ -0,0 +1,248 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from hashlib import blake2b
+from flask import request, make_response
+from flask_jwt_extended import get_jwt_identity
+from app.core.config import Config
+from app.utils.cache_versions import get_versions, bump_versions
+
+class MemoryBackend:
+    """Per-process LRU of responses with a tag index for freeing invalidated entries."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, etag, body, tags)
+        self._tags = {}  # tag -> set of keys
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, etag, body, tags, ttl_seconds):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl_seconds, etag, body, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+class SQLiteBackend:
+    """
+    Responses in a local SQLite file, so every worker process on the host shares the
+    entries and sees the invalidations of the others.
+    """
+
+    # Expired and surplus entries are pruned once every this many writes
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY, etag TEXT NOT NULL, body BLOB NOT NULL, expires_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS response_tags (
+                    tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key));
+                CREATE INDEX IF NOT EXISTS response_tags_key ON response_tags (key);
+            """)
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT etag, body FROM responses WHERE key = ? AND expires_at >= ?", (key, time.time())
+        ).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def set(self, key, etag, body, tags, ttl_seconds):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM response_tags WHERE key = ?", (key,))
+            connection.execute("INSERT OR REPLACE INTO responses (key, etag, body, expires_at) VALUES (?, ?, ?, ?)",
+                               (key, etag, body, time.time() + ttl_seconds))
+            connection.executemany("INSERT OR IGNORE INTO response_tags (tag, key) VALUES (?, ?)",
+                                   [(tag, key) for tag in tags])
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                self._prune(connection)
+
+    def _prune(self, connection):
+        connection.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+        connection.execute("""
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)
+        """, (self.max_entries,))
+        connection.execute("DELETE FROM response_tags WHERE key NOT IN (SELECT key FROM responses)")
+
+    def invalidate(self, tags):
+        tags = list(tags)
+        placeholders = ", ".join("?" for _ in tags)
+        with self._connect() as connection:
+            connection.execute(f"""
+                DELETE FROM responses WHERE key IN (SELECT key FROM response_tags WHERE tag IN ({placeholders}))
+            """, tags)
+            connection.execute(f"DELETE FROM response_tags WHERE tag IN ({placeholders})", tags)
+
+    def size(self):
+        return self._connect().execute("SELECT count(*) FROM responses").fetchone()[0]
+
+class ResponseCache:
+    """
+    Cache of successful JSON GET responses keyed by endpoint, arguments and role (and the
+    user for per-user endpoints). Entries carry tags that the service write paths invalidate,
+    and every cached response has an ETag so clients can revalidate with If-None-Match.
+    Each tag has a version counter in the database that is part of the key, so an
+    invalidation in one worker process retires the entries of every process.
+    """
+
+    def __init__(self, backend, ttl_seconds):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def cached(self, tags, per_user=False):
+        """
+        Decorate a GET route, below @jwt_required.
+        :param tags: List of tags, or a function of the route's keyword arguments returning one.
+        :param per_user: Key entries by user as well as by role, for responses that depend on who asks.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return view(*args, **kwargs)
+
+                identity = get_jwt_identity()
+                try:
+                    identity = json.loads(identity)
+                except (TypeError, json.JSONDecodeError):
+                    pass
+                entry_tags = tags(**kwargs) if callable(tags) else tags
+                try:
+                    versions = get_versions(_version_key(tag) for tag in entry_tags)
+                    parts = [request.endpoint, identity.get("role") if isinstance(identity, dict) else None,
+                             identity.get("user_id") if per_user and isinstance(identity, dict) else None,
+                             sorted(kwargs.items()), sorted(request.args.items(multi=True)), sorted(versions.items())]
+                    key = blake2b(json.dumps(parts, default=str).encode("utf-8"), digest_size=16).hexdigest()
+                    entry = self.backend.get(key)
+                except Exception as e:
+                    # The cache must never take a read endpoint down with it
+                    logging.warning(f"Response cache lookup failed: {e}")
+                    return view(*args, **kwargs)
+                if entry is not None:
+                    self._count("hits")
+                    etag, body = entry
+                    return self._respond(etag, body)
+
+                self._count("misses")
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.mimetype != "application/json":
+                    return response
+                body = response.get_data()
+                etag = blake2b(body, digest_size=16).hexdigest()
+                try:
+                    self.backend.set(key, etag, body, entry_tags, self.ttl_seconds)
+                except Exception as e:
+                    logging.warning(f"Response cache store failed: {e}")
+                return self._respond(etag, body)
+            return wrapper
+        return decorator
+
+    def _respond(self, etag, body):
+        if request.if_none_match.contains(etag):
+            self._count("not_modified")
+            response = make_response("", 304)
+        else:
+            response = make_response(body, 200)
+            response.mimetype = "application/json"
+        response.set_etag(etag)
+        # Clients may keep the body but must revalidate before reusing it
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    def invalidate(self, *tags):
+        """Retire every cached response carrying any of the tags, in all worker processes."""
+        if self.backend is None or not tags:
+            return
+        try:
+            self.backend.invalidate(tags)
+            bump_versions(_version_key(tag) for tag in tags)
+        except Exception as e:
+            logging.error(f"Response cache invalidation failed for {tags}: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "backend": Config.RESPONSE_CACHE_BACKEND,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+        if self.backend is not None:
+            stats["entries"] = self.backend.size()
+        return stats
+
+def _version_key(tag):
+    return f"response:{tag}"
+
+def _create_backend():
+    if Config.RESPONSE_CACHE_BACKEND == "memory":
+        return MemoryBackend(Config.RESPONSE_CACHE_MAX_ENTRIES)
+    if Config.RESPONSE_CACHE_BACKEND == "sqlite":
+        return SQLiteBackend(Config.RESPONSE_CACHE_PATH, Config.RESPONSE_CACHE_MAX_ENTRIES)
+    return None
+
+response_cache = ResponseCache(_create_backend(), Config.RESPONSE_CACHE_TTL_SECONDS)
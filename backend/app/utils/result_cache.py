@@ -0,0 +1,212 @@
+import sys
+import threading
+import time
+import logging
+from collections import OrderedDict
+from app.core.config import Config
+from app.utils.cache_versions import get_versions, bump_versions
+
+# Content version per schema, bumped whenever DDL/DML touches the schema. The counters live in
+# the database, so a change handled by one worker process retires the entries of all of them;
+# the in-memory caches below only ever serve entries stored under the current version.
+def get_schema_version(schema_name):
+    """
+    Get the current content version of a schema.
+    :param schema_name: Name of the schema.
+    :return: Integer version, starting at 0.
+    """
+    key = f"schema:{schema_name}"
+    return get_versions([key])[key]
+
+def bump_schema_version(schema_name, session=None):
+    """
+    Mark a schema's content as changed so results cached for the old version are no longer served.
+    :param schema_name: Name of the schema.
+    :param session: Session of the transaction making the change; the bump commits with it.
+    """
+    bump_versions([f"schema:{schema_name}"], session)
+
+def get_schema_versions(schema_name):
+    """
+    Get the content and plan versions of a schema with a single lookup. The plan version
+    also moves when indexes are added, which changes plans but not results.
+    :param schema_name: Name of the schema.
+    :return: Tuple (schema version, plan version).
+    """
+    versions = get_versions([f"schema:{schema_name}", f"plans:{schema_name}"])
+    return versions[f"schema:{schema_name}"], versions[f"plans:{schema_name}"]
+
+def bump_plan_version(schema_name):
+    bump_versions([f"plans:{schema_name}"])
+
+# Rough in-memory footprint of a cached value (fingerprint dictionaries, lists, scalars)
+def estimate_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+class ReferenceResultCache:
+    """
+    LRU cache of reference-answer results keyed by (task_id, schema_name, schema version,
+    answer hash), bounded by the estimated size of the cached values rather than the number
+    of entries. The answer hash keeps a grading run that started before the reference answer
+    was edited from storing the old answer's result as the current one.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (result, size)
+        self._lock = threading.Lock()
+
+    def get(self, task_id, schema_name, version, answer_hash):
+        key = (task_id, schema_name, version, answer_hash)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, task_id, schema_name, version, answer_hash, result):
+        """
+        Store the result of the reference answer with the given sql_hash, computed against
+        the given schema version. Results larger than the whole budget are not cached.
+        """
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            logging.info(f"Reference result for task {task_id} ({size} bytes) exceeds cache budget, not cached")
+            return
+        key = (task_id, schema_name, version, answer_hash)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def invalidate_task(self, task_id):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == task_id]:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+    def invalidate_schema(self, schema_name):
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == schema_name]:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+class VerdictCache:
+    """
+    LRU cache of grading verdicts keyed by (task_id, schema_name, schema version, reference
+    answer hash, normalized query hash). Verdicts are tiny, so the bound is a number of entries.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, task_id, schema_name, version, answer_hash, query_hash):
+        key = (task_id, schema_name, version, answer_hash, query_hash)
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return dict(verdict)
+
+    def put(self, task_id, schema_name, version, answer_hash, query_hash, verdict):
+        key = (task_id, schema_name, version, answer_hash, query_hash)
+        with self._lock:
+            self._entries[key] = dict(verdict)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_task(self, task_id):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == task_id]:
+                del self._entries[key]
+
+    def invalidate_schema(self, schema_name):
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == schema_name]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+class CatalogCache:
+    """
+    Introspected structure (tables, columns, keys, row estimates) per schema. Entries are
+    only served for the schema version they were read at, so DDL through the API retires
+    them; the TTL catches changes made behind the API's back.
+    """
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # schema_name -> (version, expires_at, catalog)
+        self._lock = threading.Lock()
+
+    def get(self, schema_name, version):
+        with self._lock:
+            entry = self._entries.get(schema_name)
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[2]
+
+    def put(self, schema_name, version, catalog):
+        with self._lock:
+            self._entries[schema_name] = (version, time.monotonic() + self.ttl_seconds, catalog)
+
+    def invalidate_schema(self, schema_name):
+        with self._lock:
+            self._entries.pop(schema_name, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+reference_cache = ReferenceResultCache(Config.REFERENCE_CACHE_MAX_BYTES)
+verdict_cache = VerdictCache(Config.VERDICT_CACHE_MAX_ENTRIES)
+catalog_cache = CatalogCache(Config.CATALOG_CACHE_TTL_SECONDS)
+
+# Called when a task's reference answer changes or the task is deleted
+def invalidate_task(task_id):
+    reference_cache.invalidate_task(task_id)
+    verdict_cache.invalidate_task(task_id)
+
+# Called by schema_service once DDL/DML on a schema has committed, after bump_schema_version;
+# frees this process's entries for the old version (other processes age theirs out)
+def invalidate_schema(schema_name):
+    reference_cache.invalidate_schema(schema_name)
+    verdict_cache.invalidate_schema(schema_name)
+    catalog_cache.invalidate_schema(schema_name)
@@ -0,0 +1,115 @@
+import hashlib
+import re
+
+_DOLLAR_TAG = re.compile(r"\$[A-Za-z_]?[A-Za-z0-9_]*\$")
+
+def _is_identifier_char(sql, index):
+    return index >= 0 and (sql[index].isalnum() or sql[index] == "_")
+
+# Split SQL into code, quoted and comment segments
+def split_sql(sql):
+    """
+    Split a SQL string so that quoted text is never rewritten by the normalizer.
+    :param sql: The SQL text.
+    :return: List of (kind, text) tuples where kind is "code", "quoted" or "comment".
+             Quoted covers string literals, quoted identifiers and dollar-quoted bodies.
+    """
+    segments = []
+    code_start = 0
+    i = 0
+    length = len(sql)
+
+    def flush(end):
+        if end > code_start:
+            segments.append(("code", sql[code_start:end]))
+
+    while i < length:
+        char = sql[i]
+        if char in ("'", '"'):
+            # E'...' strings take backslash escapes, so \' does not end them
+            start = i
+            escapes = char == "'" and i > 0 and sql[i - 1] in "eE" and not _is_identifier_char(sql, i - 2)
+            if escapes:
+                start = i - 1
+            end = i + 1
+            while end < length:
+                if escapes and sql[end] == "\\":
+                    end += 2
+                    continue
+                if sql[end] == char:
+                    # A doubled quote is an escaped quote inside the literal
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            flush(start)
+            segments.append(("quoted", sql[start:end + 1]))
+            i = code_start = end + 1
+        elif char == "$" and _DOLLAR_TAG.match(sql, i) and not _is_identifier_char(sql, i - 1):
+            tag = _DOLLAR_TAG.match(sql, i).group(0)
+            end = sql.find(tag, i + len(tag))
+            end = length if end == -1 else end + len(tag)
+            flush(i)
+            segments.append(("quoted", sql[i:end]))
+            i = code_start = end
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = length if end == -1 else end
+            flush(i)
+            segments.append(("comment", sql[i:end]))
+            i = code_start = end
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            end = length if end == -1 else end + 2
+            flush(i)
+            segments.append(("comment", sql[i:end]))
+            i = code_start = end
+        else:
+            i += 1
+    flush(length)
+    return segments
+
+def _normalize_code(code):
+    code = re.sub(r"\s+", " ", code.lower())
+    return re.sub(r" ?([,()]) ?", r"\1", code)
+
+# Canonicalize a query so that trivially different submissions compare equal
+def normalize_sql(sql):
+    """
+    Drop comments and trailing semicolons, lowercase keywords and unquoted identifiers
+    (Postgres folds those anyway) and collapse whitespace. Quoted text is kept verbatim.
+    :param sql: The SQL text.
+    :return: The normalized SQL text.
+    """
+    parts = []
+    code = []
+    for kind, text in split_sql(sql):
+        if kind == "quoted":
+            parts.append(_normalize_code("".join(code)))
+            parts.append(text)
+            code = []
+        else:
+            # A comment becomes a separator so the tokens around it do not merge
+            code.append(text if kind == "code" else " ")
+    parts.append(_normalize_code("".join(code)))
+    normalized = "".join(parts).strip()
+    while normalized.endswith(";"):
+        normalized = normalized[:-1].rstrip()
+    return normalized
+
+def sql_hash(sql):
+    """
+    Hash of the normalized query, used as a grouping and cache key.
+    :param sql: The SQL text.
+    :return: Hex digest.
+    """
+    return hashlib.sha256(normalize_sql(sql).encode("utf-8")).hexdigest()
+
+def quote_identifier(name):
+    """
+    Quote an identifier (schema, table or column name) for use in generated SQL.
+    :param name: The raw name.
+    :return: The name in double quotes, with embedded quotes doubled.
+    """
+    return '"' + name.replace('"', '""') + '"'
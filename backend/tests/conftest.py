@@ -0,0 +1,5 @@
+import os
+
+# The engines are created at import time; the tests below never connect through them
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "test")
@@ -0,0 +1,64 @@
+import pytest
+from app.utils.data_generator import generate_blocks, validate_spec
+
+COLUMNS = ["id", "amount", "price", "created_on", "created_at"]
+
+def _spec(**columns):
+    return {"rows": 5, "seed": 7, "columns": columns}
+
+def _rows(spec):
+    return "".join(generate_blocks(validate_spec(spec, COLUMNS), {})).splitlines()
+
+@pytest.mark.parametrize("options, message", [
+    ({"generator": "integer", "min": 1.5, "max": 3}, "'min' must be an integer"),
+    ({"generator": "sequence", "start": 1.0}, "'start' must be an integer"),
+    ({"generator": "sequence", "step": 0.5}, "'step' must be an integer"),
+    ({"generator": "integer", "min": 5, "max": 1}, "'min' must not be greater than 'max'"),
+    ({"generator": "float", "min": 0, "max": 1, "decimals": 1.5}, "'decimals' must be an integer"),
+    ({"generator": "date", "start": "20240101", "end": "2024-12-31"}, "ISO date"),
+    ({"generator": "date", "start": "2024-1-1", "end": "2024-12-31"}, "ISO date"),
+    ({"generator": "timestamp", "start": "2024-01-01T00:00:00", "end": "2024-01-02T00:00:00+02:00"},
+     "both have a time zone or neither"),
+    ({"generator": "timestamp", "start": "2024-01-02", "end": "2024-01-01"}, "'start' must not be after 'end'"),
+])
+def test_validate_spec_rejects(options, message):
+    with pytest.raises(ValueError, match=message):
+        validate_spec(_spec(id=options), COLUMNS)
+
+def test_validate_spec_checks_rows_and_columns():
+    with pytest.raises(ValueError, match="'rows'"):
+        validate_spec({"rows": 0, "columns": {"id": {"generator": "sequence"}}}, COLUMNS)
+    with pytest.raises(ValueError, match="Unknown column"):
+        validate_spec(_spec(missing={"generator": "sequence"}), COLUMNS)
+
+def test_generated_values_match_the_column_types():
+    rows = _rows(_spec(
+        id={"generator": "sequence", "start": 10, "step": 2},
+        amount={"generator": "integer", "min": 1, "max": 3},
+        created_on={"generator": "date", "start": "2024-01-01", "end": "2024-01-31"},
+        created_at={"generator": "timestamp", "start": "2024-01-01T00:00:00+02:00", "end": "2024-01-01T06:00:00+02:00"},
+    ))
+    fields = [row.split(",") for row in rows]
+    assert [int(row[0]) for row in fields] == [10, 12, 14, 16, 18]
+    assert all(row[1] in ("1", "2", "3") for row in fields)
+    assert all(row[2].startswith("2024-01-") and len(row[2]) == 10 for row in fields)
+    # Aware bounds are drawn in UTC: 22:00 on the previous day up to 04:00
+    assert all(row[3].endswith("+00:00") and ("T22" <= row[3][10:13] or row[3][10:13] <= "T04") for row in fields)
+
+def test_same_seed_gives_same_data():
+    spec = _spec(id={"generator": "zipf", "a": 1.5, "max": 50},
+                 price={"generator": "normal", "mean": 10, "stddev": 2, "decimals": 2})
+    assert _rows(spec) == _rows(spec)
+
+def test_block_text_keeps_unicode_and_empty_fields():
+    rows = _rows(_spec(
+        id={"generator": "sequence"},
+        amount={"generator": "integer", "min": 1, "max": 3, "null_fraction": 0.99},
+        price={"generator": "categorical", "values": ["crème brûlée", "日本", 'say "hi"']},
+    ))
+    assert len(rows) == 5
+    for number, row in enumerate(rows, start=1):
+        sequence, amount, price = row.split(",", 2)
+        assert sequence == str(number)
+        assert amount in ("", "1", "2", "3")
+        assert price in ('"crème brûlée"', '"日本"', '"say ""hi"""')
@@ -0,0 +1,14 @@
+from app.utils.dataset_reader import infer_types
+
+def test_infer_types_picks_the_narrowest_type_that_fits_every_value():
+    columns = ["flag", "count", "ratio", "amount", "day", "at", "at_tz", "data", "mixed", "empty"]
+    rows = [
+        [True, 1, 0.5, "1.25", "2024-01-31", "2024-01-31T10:00:00", "2024-01-31T10:00:00+02:00", {"a": 1}, "1", None],
+        ["false", "2", 3, "7", "2024-02-01", "2024-02-01 11:30:00", "2024-02-01T11:30:00Z", [1], "x", None],
+    ]
+    assert infer_types(columns, rows) == [
+        "BOOLEAN", "BIGINT", "DOUBLE PRECISION", "NUMERIC", "DATE", "TIMESTAMP", "TIMESTAMPTZ", "JSONB", "TEXT", "TEXT",
+    ]
+
+def test_infer_types_falls_back_for_out_of_range_integers():
+    assert infer_types(["big"], [[2 ** 63], ["1"]]) == ["NUMERIC"]
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine
+from app.db.session import Base, db_session
+from app.db import models  # noqa: F401  (registers every model with Base.metadata)
+from app.db.models.regrade_job import RegradeJob
+from app.services import grading_service
+from app.utils.query_executor import INTERNAL_ERROR_FEEDBACK
+
+TASK = {"task_id": 1, "correct_answer": "SELECT 1", "schema_name": "shop", "difficulty": "easy",
+        "reference_fingerprint": None}
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    db_session.remove()
+    db_session.configure(bind=engine)
+    yield db_session()
+    db_session.remove()
+    engine.dispose()
+
+def test_regrade_keeps_previous_verdicts_on_transient_failures(session, monkeypatch):
+    verdicts = {
+        "select 1": {"is_correct": True, "feedback": "Your query is correct!"},
+        "select 2": {"is_correct": False, "feedback": "Your query exceeded the limits", "limit_exceeded": True},
+        "select 3": {"is_correct": False, "feedback": INTERNAL_ERROR_FEEDBACK},
+    }
+    stored = {}
+    monkeypatch.setattr(grading_service, "list_task_submission_queries",
+                        lambda task_id: [(10, "SELECT 1"), (11, "select  1"), (12, "SELECT 2"), (13, "SELECT 3")])
+    monkeypatch.setattr(grading_service, "validate_query", lambda query, *args, **kwargs: verdicts[query.lower()])
+    monkeypatch.setattr(grading_service, "bulk_update_verdicts", lambda new: stored.update(new) or len(new))
+
+    session.add(RegradeJob(job_id="job", task_id=1))
+    session.commit()
+    grading_service._run_regrade("job", TASK)
+
+    assert sorted(stored) == [10, 11]
+    job = grading_service.get_regrade_job("job")
+    assert job["status"] == "completed"
+    assert job["distinct_queries"] == 3 and job["graded_queries"] == 3
+    assert job["updated_submissions"] == 2
+    assert job["failed_submission_ids"] == [12, 13]
+
+def test_finished_jobs_expire(session, monkeypatch):
+    old = datetime.now(timezone.utc) - timedelta(seconds=grading_service.Config.REGRADE_JOB_TTL_SECONDS + 60)
+    session.add(RegradeJob(job_id="old", task_id=1, status="completed", started_at=old, finished_at=old))
+    session.add(RegradeJob(job_id="recent", task_id=1, status="completed",
+                           started_at=datetime.now(timezone.utc), finished_at=datetime.now(timezone.utc)))
+    session.commit()
+    monkeypatch.setattr(grading_service, "get_task_by_id", lambda task_id: TASK)
+    monkeypatch.setattr(grading_service, "_run_regrade", lambda job_id, task: None)
+
+    job = grading_service.start_regrade(1)
+    assert job["status"] == "running"
+    assert grading_service.get_regrade_job("old") is None
+    assert grading_service.get_regrade_job("recent") is not None
+
+def test_queued_submission_is_retried_while_the_grading_pool_is_busy(monkeypatch):
+    busy = {"is_correct": False, "feedback": "busy", "busy": True}
+    results = [busy, busy, {"is_correct": True, "feedback": "Your query is correct!"}]
+    recorded = []
+    monkeypatch.setattr(grading_service.Config, "GRADING_BUSY_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(grading_service, "validate_query", lambda *args, **kwargs: results.pop(0))
+    monkeypatch.setattr(grading_service, "record_grading_result", lambda *args, **kwargs: recorded.append((args, kwargs)))
+    queue = grading_service.GradingQueue(1, 1)
+
+    queue._slots.acquire()
+    queue._grade(5, "SELECT 1", TASK)
+    assert recorded == [((5, True, "Your query is correct!"), {"status": "graded"})]
+
+    monkeypatch.setattr(grading_service, "validate_query", lambda *args, **kwargs: busy)
+    queue._slots.acquire()
+    queue._grade(6, "SELECT 1", TASK)
+    assert recorded[1] == ((6, False, "busy"), {"status": "failed"})
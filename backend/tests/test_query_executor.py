@@ -0,0 +1,97 @@
+import pytest
+from sqlalchemy import create_engine, event
+from app.utils import query_executor
+from app.utils.result_cache import VerdictCache
+from app.utils.query_executor import _prepare_connection, can_compare_in_database, is_order_sensitive
+
+@pytest.fixture
+def grading_engine(tmp_path):
+    """SQLite stand-in for the grading pool that records every set_config call."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'grading.db'}", pool_size=1, max_overflow=0)
+    calls = []
+
+    @event.listens_for(engine, "connect")
+    def register(dbapi_connection, _):
+        dbapi_connection.create_function("set_config", 3, lambda name, value, local: calls.append((name, value)) or value)
+
+    engine.set_config_calls = calls
+    yield engine
+    engine.dispose()
+
+def test_settings_are_sent_only_when_they_change(grading_engine):
+    limits = {"statement_timeout_ms": 2000}
+    for _ in range(3):
+        with grading_engine.connect() as connection:
+            _prepare_connection(connection, "shop", limits)
+            assert connection.in_transaction()
+    assert grading_engine.set_config_calls == [("search_path", '"shop"'), ("statement_timeout", "2000")]
+
+    with grading_engine.connect() as connection:
+        _prepare_connection(connection, "library", limits)
+    with grading_engine.connect() as connection:
+        _prepare_connection(connection, "library")
+    assert grading_engine.set_config_calls[2:] == [
+        ("search_path", '"library"'), ("statement_timeout", "2000"),
+        ("search_path", '"library"'), ("statement_timeout", "0"),
+    ]
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT * FROM t ORDER BY a", True),
+    ("SELECT a FROM t UNION SELECT b FROM u order\n  by 1;", True),
+    ("SELECT a, rank() OVER (ORDER BY b) FROM t", False),
+    ("SELECT * FROM (SELECT * FROM t ORDER BY a LIMIT 3) AS top", False),
+    ("WITH top AS (SELECT * FROM t ORDER BY a) SELECT * FROM top", False),
+    ("SELECT string_agg(name, ',' ORDER BY name) FROM t", False),
+    ("SELECT a FROM t -- ORDER BY a\n", False),
+    ("SELECT a FROM t /* ORDER BY a */", False),
+    ("SELECT 'order by a', ')' FROM t", False),
+    ("SELECT \"order by\" FROM t ORDER BY 1", True),
+])
+def test_is_order_sensitive_only_counts_top_level_order_by(query, expected):
+    assert is_order_sensitive(query) is expected
+    assert can_compare_in_database(query) is not expected
+
+def test_exhausted_grading_pool_gives_a_busy_verdict(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'busy.db'}", pool_size=1, max_overflow=0, pool_timeout=0.1)
+    monkeypatch.setattr(query_executor, "grading_engine", engine)
+    with engine.connect():
+        verdict = query_executor.validate_query("SELECT 1", "SELECT 1", "shop")
+    engine.dispose()
+    assert verdict == {"is_correct": False, "feedback": query_executor.BUSY_FEEDBACK, "busy": True}
+    assert query_executor.is_transient(verdict)
+
+def test_admission_rejections_are_not_memoized(monkeypatch):
+    rejection = {"is_correct": False, "feedback": "too expensive", "admission_rejected": True}
+    verdicts = [rejection, {"is_correct": True, "feedback": "Your query is correct!"}]
+    monkeypatch.setattr(query_executor, "get_schema_versions", lambda schema_name: (0, 0))
+    monkeypatch.setattr(query_executor, "verdict_cache", VerdictCache(10))
+    monkeypatch.setattr(query_executor, "_grade_query", lambda *args: verdicts.pop(0))
+
+    assert query_executor.validate_query("SELECT 1", "SELECT 1", "shop", task_id=1) == rejection
+    # Once an index makes the query cheap enough, it is graded rather than rejected from the memo
+    assert query_executor.validate_query("SELECT 1", "SELECT 1", "shop", task_id=1)["is_correct"] is True
+    assert query_executor.validate_query("SELECT 1", "SELECT 1", "shop", task_id=1)["is_correct"] is True
+
+def test_settings_are_sent_again_after_a_checkout_that_may_have_changed_them(grading_engine, monkeypatch):
+    query_executor._track_settings(grading_engine)
+    monkeypatch.setattr(query_executor, "grading_engine", grading_engine)
+    with grading_engine.connect() as connection:
+        _prepare_connection(connection, "shop")
+    with grading_engine.connect() as connection:
+        _prepare_connection(connection, "shop")
+    assert len(grading_engine.set_config_calls) == 2
+
+    # A checkout that bypasses _prepare_connection could have run SET itself
+    with grading_engine.connect() as connection:
+        connection.exec_driver_sql("SELECT 1")
+    with grading_engine.connect() as connection:
+        _prepare_connection(connection, "shop")
+    assert len(grading_engine.set_config_calls) == 4
+
+    # Several statements can COMMIT a SET, a single one is rolled back with its transaction
+    query_executor.execute_query("shop", "SELECT 1")
+    query_executor.execute_query("shop", "SELECT ';'; ")
+    assert len(grading_engine.set_config_calls) == 4
+    query_executor.execute_query("shop", "SET search_path TO public; COMMIT; SELECT 1")
+    query_executor.execute_query("shop", "SELECT 1")
+    assert len(grading_engine.set_config_calls) == 6
@@ -0,0 +1,54 @@
+import json
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+from sqlalchemy import create_engine
+from app.db.models.cache_version import CacheVersion
+from app.utils import cache_versions
+from app.utils.response_cache import MemoryBackend, ResponseCache
+
+@pytest.fixture(autouse=True)
+def versions_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'versions.db'}")
+    CacheVersion.__table__.create(engine)
+    monkeypatch.setattr(cache_versions, "engine", engine)
+    yield engine
+    engine.dispose()
+
+def _worker(courses):
+    """One worker process: its own app and in-memory cache in front of the shared course list."""
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret-key-of-sufficient-length"
+    JWTManager(app)
+    cache = ResponseCache(MemoryBackend(100), ttl_seconds=60)
+
+    @app.route("/courses")
+    @jwt_required()
+    @cache.cached(["courses"])
+    def list_courses():
+        return jsonify(list(courses))
+
+    with app.app_context():
+        token = create_access_token(identity=json.dumps({"user_id": 1, "role": "professor"}))
+    return app.test_client(), {"Authorization": f"Bearer {token}"}, cache
+
+def test_cached_response_and_etag():
+    client, headers, cache = _worker(["SQL 101"])
+    first = client.get("/courses", headers=headers)
+    second = client.get("/courses", headers=headers)
+    assert first.get_json() == second.get_json() == ["SQL 101"]
+    assert cache.hits == 1 and cache.misses == 1
+
+    revalidated = client.get("/courses", headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+def test_invalidation_reaches_other_workers():
+    courses = ["SQL 101"]
+    client_a, headers_a, cache_a = _worker(courses)
+    client_b, headers_b, _ = _worker(courses)
+    assert client_b.get("/courses", headers=headers_b).get_json() == ["SQL 101"]
+
+    # Worker A handles the write and invalidates; worker B must not serve its cached copy
+    courses.append("SQL 201")
+    cache_a.invalidate("courses")
+    assert client_b.get("/courses", headers=headers_b).get_json() == ["SQL 101", "SQL 201"]
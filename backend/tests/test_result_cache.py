@@ -0,0 +1,57 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, event
+from app.db.models.cache_version import CacheVersion
+from app.utils import cache_versions
+from app.utils.result_cache import ReferenceResultCache, VerdictCache
+
+FINGERPRINT = {"columns": ["id"], "row_count": 1, "unordered_digest": "a", "ordered_digest": "b"}
+
+@pytest.fixture
+def versions_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'versions.db'}")
+    CacheVersion.__table__.create(engine)
+    monkeypatch.setattr(cache_versions, "engine", engine)
+    yield engine
+    engine.dispose()
+
+def test_reference_result_is_keyed_by_answer():
+    cache = ReferenceResultCache(1024 * 1024)
+    # A grade that started before the answer was edited stores the old answer's result late
+    cache.put(1, "shop", 0, "old-answer", FINGERPRINT)
+    assert cache.get(1, "shop", 0, "new-answer") is None
+    assert cache.get(1, "shop", 0, "old-answer") == FINGERPRINT
+
+def test_verdict_is_keyed_by_answer():
+    cache = VerdictCache(10)
+    cache.put(1, "shop", 0, "old-answer", "query", {"is_correct": True, "feedback": "Your query is correct!"})
+    assert cache.get(1, "shop", 0, "new-answer", "query") is None
+    assert cache.get(1, "shop", 0, "old-answer", "query")["is_correct"] is True
+
+def test_versions_are_shared_through_the_database(versions_engine):
+    assert cache_versions.get_versions(["schema:shop"]) == {"schema:shop": 0}
+    cache_versions.bump_versions(["schema:shop", "tag:tasks"])
+    cache_versions.bump_versions(["schema:shop"])
+    assert cache_versions.get_versions(["schema:shop", "tag:tasks", "tag:courses"]) == {
+        "schema:shop": 2, "tag:tasks": 1, "tag:courses": 0,
+    }
+
+def test_versions_are_read_once_per_request(versions_engine):
+    statements = []
+    event.listen(versions_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    app = Flask(__name__)
+
+    with app.test_request_context():
+        assert cache_versions.get_versions(["schema:shop", "tag:tasks"]) == {"schema:shop": 0, "tag:tasks": 0}
+        assert cache_versions.get_versions(["tag:tasks"]) == {"tag:tasks": 0}
+        assert len(statements) == 1
+
+        # A key the request bumps is read again, so it never serves the version it replaced
+        cache_versions.bump_versions(["tag:tasks"])
+        assert cache_versions.get_versions(["schema:shop", "tag:tasks"]) == {"schema:shop": 0, "tag:tasks": 1}
+        cache_versions.get_versions(["tag:tasks"])
+        assert len(statements) == 4
+
+    with app.test_request_context():
+        cache_versions.get_versions(["schema:shop"])
+    assert len(statements) == 5
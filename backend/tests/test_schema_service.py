@@ -0,0 +1,102 @@
+import json
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from app.services import schema_service
+
+COLUMNS = ["id", "name"]
+
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    """A three-row SQLite table standing in for a schema table, with the catalog lookup stubbed out."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'data.db'}")
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT)"))
+        connection.execute(text("INSERT INTO people VALUES (1, 'Ada'), (2, 'Edgar'), (3, 'Grace')"))
+    session = sessionmaker(bind=engine)()
+
+    def table_query(session, schema_id, table_name, columns):
+        metadata = {"columns": COLUMNS, "key_columns": ["id"], "approximate_row_count": 3}
+        columns = columns or COLUMNS
+        return "people", metadata, columns, ["id"], ", ".join(columns + ["id AS __key_0"])
+
+    monkeypatch.setattr(schema_service, "_table_query", table_query)
+    monkeypatch.setattr(schema_service, "get_session", lambda: session)
+    monkeypatch.setattr(schema_service, "engine", engine)
+    yield
+    session.close()
+    engine.dispose()
+
+def test_fetch_table_data_pages_through_rows(table):
+    first = schema_service.fetch_table_data(1, "people", limit=2)
+    assert first["rows"] == [{"id": 1, "name": "Ada"}, {"id": 2, "name": "Edgar"}]
+    assert first["next_cursor"] is not None
+
+    second = schema_service.fetch_table_data(1, "people", after=first["next_cursor"], limit=2)
+    assert second["rows"] == [{"id": 3, "name": "Grace"}]
+    assert second["next_cursor"] is None
+
+def test_fetch_table_data_projects_columns(table):
+    page = schema_service.fetch_table_data(1, "people", columns=["name"])
+    assert page["rows"] == [{"name": "Ada"}, {"name": "Edgar"}, {"name": "Grace"}]
+
+def test_stream_table_data_emits_ndjson(table):
+    lines = "".join(schema_service.stream_table_data(1, "people")).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"id": 1, "name": "Ada"}, {"id": 2, "name": "Edgar"}, {"id": 3, "name": "Grace"},
+    ]
+
+@pytest.mark.parametrize("max_rows, expected", [
+    (3, [{"id": 1, "name": "Ada"}, {"id": 2, "name": "Edgar"}, {"id": 3, "name": "Grace"}]),
+    (2, [{"id": 1, "name": "Ada"}, {"id": 2, "name": "Edgar"}, {"error": "The export was stopped after 2 rows"}]),
+])
+def test_stream_table_data_is_capped(table, monkeypatch, max_rows, expected):
+    monkeypatch.setattr(schema_service.Config, "TABLE_EXPORT_MAX_ROWS", max_rows)
+    monkeypatch.setattr(schema_service.Config, "TABLE_STREAM_CHUNK_SIZE", 2)
+    lines = "".join(schema_service.stream_table_data(1, "people")).splitlines()
+    assert [json.loads(line) for line in lines] == expected
+
+def test_table_metadata_reports_the_catalog_types(monkeypatch):
+    catalog = {"tables": {"people": {"columns": [{"name": "id", "type": "integer", "nullable": False},
+                                                 {"name": "born", "type": "date", "nullable": True}],
+                                     "primary_key": ["id"], "approximate_row_count": None}}}
+    monkeypatch.setattr(schema_service, "get_schema_catalog", lambda schema_name, session: catalog)
+    metadata = schema_service._table_metadata(None, "shop", "People")
+    assert metadata["columns"] == ["id", "born"]
+    assert metadata["column_types"] == {"id": "integer", "born": "date"}
+
+def test_match_columns_folds_case_like_unquoted_names():
+    assert schema_service._match_columns(["id", "name"], ["ID", "Name"]) == ["id", "name"]
+    # A column created quoted keeps its exact match
+    assert schema_service._match_columns(["Name", "name"], ["Name", "name"]) == ["Name", "name"]
+    with pytest.raises(ValueError, match="several columns"):
+        schema_service._match_columns(["Name", "name"], ["NAME"])
+    with pytest.raises(ValueError, match="Unknown column: email"):
+        schema_service._match_columns(["id", "name"], ["email"])
+
+def test_validate_batch_tracks_the_schema_through_the_batch():
+    operations = [
+        {"op": "create_table", "table": "orders", "columns": [{"name": "id", "type": "integer"}], "primary_key": ["id"]},
+        {"op": "add_column", "table": "Orders", "column": "total", "type": "numeric(10, 2)"},
+        {"op": "insert_rows", "table": "orders", "rows": [{"id": 1, "TOTAL": 9.5}]},
+        {"op": "drop_column", "table": "people", "column": "name"},
+        {"op": "create_index", "table": "people", "columns": ["id"]},
+    ]
+    assert schema_service._validate_batch(operations, {"people": {"id", "name"}}) == []
+
+def test_validate_batch_reports_every_problem():
+    errors = schema_service._validate_batch([
+        {"op": "rename_table", "table": "people"},
+        {"op": "create_table", "table": "people", "columns": [{"name": "id", "type": "integer; drop"}]},
+        {"op": "drop_column", "table": "people", "column": "missing"},
+        {"op": "insert_rows", "table": "nowhere", "rows": [{"id": 1}]},
+        {"op": "insert_rows", "table": "people", "rows": [{"age": 3}]},
+    ], {"people": {"id", "name"}})
+    assert errors == [
+        "Operation 0: 'op' must be one of " + ", ".join(schema_service.BATCH_OPERATIONS),
+        "Operation 1 (create_table): table people already exists",
+        "Operation 1 (create_table): 'integer; drop' is not a valid column type",
+        "Operation 2 (drop_column): column missing does not exist",
+        "Operation 3 (insert_rows): table nowhere does not exist",
+        "Operation 4 (insert_rows): unknown columns age",
+    ]
@@ -0,0 +1,30 @@
+import pytest
+from app.utils.sql_normalizer import normalize_sql, quote_identifier, split_sql, sql_hash
+
+def test_escape_strings_keep_their_backslash_escaped_quotes():
+    sql = r"SELECT E'it\'s', 'KEEP' FROM T"
+    assert split_sql(sql) == [("code", "SELECT "), ("quoted", r"E'it\'s'"), ("code", ", "),
+                              ("quoted", "'KEEP'"), ("code", " FROM T")]
+    assert normalize_sql(sql) == r"select E'it\'s','KEEP' from t"
+
+def test_escape_prefix_needs_a_word_boundary():
+    # "name'x'" is not an escape string; only a standalone E/e prefix is
+    assert split_sql(r"SELECT name'a\'")[1] == ("quoted", r"'a\'")
+    assert normalize_sql(r"SELECT e'\\' , 'X'") == r"select e'\\','X'"
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT 'It''s' AS \"Col\"", "select 'It''s' as \"Col\""),
+    ("SELECT $body$ KEEP 'this' $body$, $$X$$", "select $body$ KEEP 'this' $body$,$$X$$"),
+    ("SELECT a -- Comment\nFROM  T /* Block */ WHERE b", "select a from t where b"),
+    ("  SELECT\n\tA ,  B\nFROM T ( X ) ;; ", "select a,b from t(x)"),
+])
+def test_normalize_sql(sql, expected):
+    assert normalize_sql(sql) == expected
+
+def test_sql_hash_groups_trivially_different_queries():
+    assert sql_hash("SELECT a FROM t;") == sql_hash("select  A\nfrom T -- done")
+    assert sql_hash("SELECT 'A' FROM t") != sql_hash("SELECT 'a' FROM t")
+    assert sql_hash(r"SELECT E'\'', 'A'") != sql_hash(r"SELECT E'\'', 'a'")
+
+def test_quote_identifier():
+    assert quote_identifier('we"ird') == '"we""ird"'
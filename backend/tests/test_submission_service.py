@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine
+from app.db.session import Base, db_session
+from app.db import models  # noqa: F401  (registers every model with Base.metadata)
+from app.db.models.submission import Submission
+from app.services import submission_service
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    Base.metadata.create_all(engine)
+    db_session.remove()
+    db_session.configure(bind=engine)
+    yield db_session()
+    db_session.remove()
+    engine.dispose()
+
+def _pending(session, age_seconds):
+    submitted_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=age_seconds)
+    submission = Submission(assignment_id=1, submitted_query="SELECT 1", is_correct=False, time_taken=30,
+                            status="pending", submitted_at=submitted_at)
+    session.add(submission)
+    session.commit()
+    return submission.submission_id
+
+def test_recent_pending_submission_stays_pending(session):
+    submission_id = _pending(session, 5)
+    assert submission_service.get_submission_by_id(submission_id)["status"] == "pending"
+
+def test_stale_pending_submission_is_reported_failed(session):
+    submission_id = _pending(session, submission_service.Config.GRADING_PENDING_TIMEOUT_SECONDS + 60)
+    submission = submission_service.get_submission_by_id(submission_id)
+    assert submission["status"] == "failed"
+    assert submission["feedback"] == submission_service.INTERRUPTED_FEEDBACK
+    # Reading it writes nothing, so a late verdict still lands and the startup sweep still sees it
+    assert submission_service.list_pending_submissions() == [(submission_id, 1, "SELECT 1")]
+    submission_service.record_grading_result(submission_id, True, "Your query is correct!")
+    assert submission_service.get_submission_by_id(submission_id)["status"] == "graded"
+
+def test_bulk_update_clears_time_of_incorrect_submissions(session):
+    first, second = _pending(session, 5), _pending(session, 5)
+    updated = submission_service.bulk_update_verdicts({
+        first: {"is_correct": True, "feedback": "Your query is correct!"},
+        second: {"is_correct": False, "feedback": "The results do not match."},
+    })
+    assert updated == 2
+    session.expire_all()
+    assert session.get(Submission, first).time_taken == 30
+    assert session.get(Submission, second).time_taken is None
+    assert session.get(Submission, second).status == "graded"
@@ -0,0 +1,49 @@
+from datetime import date
+import pytest
+from sqlalchemy import create_engine
+from app.db.session import Base, db_session
+from app.db import models  # noqa: F401  (registers every model with Base.metadata)
+from app.db.models.schema import Schema
+from app.db.models.task import Task
+from app.services import task_service
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    Base.metadata.create_all(engine)
+    db_session.remove()
+    db_session.configure(bind=engine)
+    monkeypatch.setattr(task_service.response_cache, "backend", None)
+    monkeypatch.setattr(task_service, "get_schema_version", lambda schema_name: 0)
+    yield db_session()
+    db_session.remove()
+    engine.dispose()
+
+def _add_task(session):
+    session.add(Schema(schema_id=1, schema_name="shop", created_by=1))
+    # A task saved before reference fingerprints were stored
+    task = Task(task_id=1, task_title="Orders", task_description="List the orders", course_id=1, session_id=1,
+                schema_id=1, correct_answer="SELECT * FROM orders", deadline=date(2026, 12, 1))
+    session.add(task)
+    session.commit()
+    return task
+
+def test_update_without_new_answer_does_not_run_the_reference(session, monkeypatch):
+    _add_task(session)
+    monkeypatch.setattr(task_service, "fingerprint_query", lambda *args: {"error": "relation does not exist"})
+
+    updated = task_service.update_task(1, {"task_title": "All orders", "published": True})
+    assert updated["task_title"] == "All orders" and updated["published"] is True
+    assert updated["reference_result"] is None
+
+    with pytest.raises(ValueError, match="could not be executed"):
+        task_service.update_task(1, {"correct_answer": "SELECT * FROM missing"})
+
+def test_backfill_stores_fingerprints(session, monkeypatch):
+    _add_task(session)
+    monkeypatch.setattr(task_service, "fingerprint_query", lambda *args: {
+        "columns": ["order_id"], "row_count": 3, "unordered_digest": "a", "ordered_digest": "b"})
+
+    assert task_service.backfill_reference_results() == (1, [])
+    assert session.get(Task, 1).reference_row_count == 3
+    assert task_service.backfill_reference_results() == (0, [])
@@ -0,0 +1,16 @@
+from sqlalchemy import create_engine, inspect, text
+from app.db.upgrade import upgrade_database
+
+def test_upgrade_adds_missing_columns_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    with engine.begin() as connection:
+        # The tasks table as created before the reference fingerprint columns existed
+        connection.execute(text("CREATE TABLE tasks (task_id INTEGER PRIMARY KEY, task_title VARCHAR(255))"))
+        connection.execute(text("INSERT INTO tasks VALUES (1, 'Join orders')"))
+
+    added = upgrade_database(engine)
+    assert "tasks.reference_row_count" in added
+    columns = {column["name"] for column in inspect(engine).get_columns("tasks")}
+    assert {"reference_row_count", "reference_columns", "reference_digest"} <= columns
+    assert upgrade_database(engine) == []
+    engine.dispose()
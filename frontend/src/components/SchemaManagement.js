@@ -9,6 +9,8 @@ function SchemaManagement() {
   const [tables, setTables] = useState([]);
   const [selectedTable, setSelectedTable] = useState("");
   const [tableData, setTableData] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [approximateRowCount, setApproximateRowCount] = useState(null);
   const [columns, setColumns] = useState([{ name: "", type: "" }]);
   const [rows, setRows] = useState([{ name: "", age: "" }]);
   const [sqlQuery, setSqlQuery] = useState("");
@@ -37,16 +39,23 @@ function SchemaManagement() {
       setTables(response.data.tables || []);
       setSelectedTable(""); // Reset selected table
       setTableData([]); // Reset table data
+      setNextCursor(null);
     } catch (error) {
       console.error("Error fetching tables:", error);
     }
   };
 
-  const fetchTableData = async (tableName) => {
+  // Loads the first page, or appends the next one when a cursor is given
+  const fetchTableData = async (tableName, after = null) => {
     setSelectedTable(tableName);
     try {
-      const response = await api.get(`/schemas/${selectedSchema}/tables/${tableName}/data`);
-      setTableData(response.data.rows || []);
+      const response = await api.get(`/schemas/${selectedSchema}/tables/${tableName}/data`, {
+        params: after ? { after } : {},
+      });
+      const rows = response.data.rows || [];
+      setTableData((previous) => (after ? [...previous, ...rows] : rows));
+      setNextCursor(response.data.next_cursor || null);
+      setApproximateRowCount(response.data.approximate_row_count);
     } catch (error) {
       console.error("Error fetching table data:", error);
     }
@@ -236,6 +245,11 @@ function SchemaManagement() {
 
           {/* Display Table Data */}
           <h4>Table Data</h4>
+          {approximateRowCount != null && (
+            <p>
+              Showing {tableData.length} of about {approximateRowCount} rows
+            </p>
+          )}
           {tableData.length > 0 ? (
             <table>
               <thead>
@@ -258,6 +272,9 @@ function SchemaManagement() {
           ) : (
             <p>No data available.</p>
           )}
+          {nextCursor && (
+            <button onClick={() => fetchTableData(selectedTable, nextCursor)}>Load More</button>
+          )}
         </div>
       )}
     </div>
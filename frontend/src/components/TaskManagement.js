@@ -30,8 +30,15 @@ function TaskManagement() {
 
   const fetchTasks = async () => {
     try {
-      const response = await api.get("/tasks");
-      setTasks(response.data.tasks);
+      // The listing is paginated; follow next_cursor until the last page
+      let allTasks = [];
+      let after = null;
+      do {
+        const response = await api.get("/tasks", { params: after ? { after } : {} });
+        allTasks = allTasks.concat(response.data.tasks);
+        after = response.data.next_cursor;
+      } while (after);
+      setTasks(allTasks);
     } catch (error) {
       console.error("Error fetching tasks:", error);
     }
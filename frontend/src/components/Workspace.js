@@ -4,6 +4,9 @@ import '../Styles/Workspace.css';
 import api from '../services/api'; // Axios instance for API calls
 import { Bar } from 'react-chartjs-2'; // For leaderboard visualization
 
+// How long to wait for a queued submission to be graded
+const VERDICT_TIMEOUT_MS = 2 * 60 * 1000;
+
 function Workspace() {
   const [tasks, setTasks] = useState([]);
   const [selectedTask, setSelectedTask] = useState(null);
@@ -20,8 +23,17 @@ function Workspace() {
 
   const fetchTasks = async () => {
     try {
-      const response = await api.get('/tasks?published=true'); // Fetch only published tasks
-      setTasks(response.data.tasks);
+      // Fetch only published tasks, with just the fields shown here, page by page
+      let allTasks = [];
+      let after = null;
+      do {
+        const params = { published: true, fields: 'task_id,task_title,task_description' };
+        if (after) params.after = after;
+        const response = await api.get('/tasks', { params });
+        allTasks = allTasks.concat(response.data.tasks);
+        after = response.data.next_cursor;
+      } while (after);
+      setTasks(allTasks);
     } catch (error) {
       console.error('Error fetching tasks:', error);
     }
@@ -58,8 +70,10 @@ function Workspace() {
       console.log('Submitting payload:', payload); // Debugging: Log the payload
   
       const response = await api.post('/submissions', payload);
-  
-      const { is_correct, feedback } = response.data;
+
+      // Grading runs in the background; poll until the verdict is available
+      setFeedback({ is_correct: false, message: 'Grading your query...' });
+      const { is_correct, feedback } = await waitForVerdict(response.data.submission.submission_id);
       setFeedback({ is_correct, message: feedback });
   
       if (is_correct) {
@@ -74,6 +88,25 @@ function Workspace() {
     }
   };
 
+  // Polls with a growing delay and gives up after VERDICT_TIMEOUT_MS
+  const waitForVerdict = async (submissionId) => {
+    const deadline = Date.now() + VERDICT_TIMEOUT_MS;
+    let delay = 500;
+    while (Date.now() < deadline) {
+      const response = await api.get(`/submissions/${submissionId}`);
+      const { status, is_correct, feedback } = response.data.submission;
+      if (status !== 'pending') {
+        return { is_correct, feedback };
+      }
+      await new Promise((resolve) => setTimeout(resolve, Math.min(delay, deadline - Date.now())));
+      delay = Math.min(delay * 2, 5000);
+    }
+    return {
+      is_correct: false,
+      feedback: 'Your query is taking too long to grade. Please try submitting it again in a moment.',
+    };
+  };
+
   const fetchLeaderboard = async () => {
     try {
       const response = await api.get(`/leaderboard?task_id=${selectedTask.task_id}`); // Fetch leaderboard for the selected task